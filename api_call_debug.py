@@ -1,8 +1,9 @@
 import replicate
 import os
-import requests
 from pathlib import Path
 
+from downloader import DownloadError, download_file
+
 def generate_audio_with_debug(description: str, duration: int = 1):
     """
     Generate audio using the deployed Replicate model with debug info
@@ -41,32 +42,23 @@ def generate_audio_with_debug(description: str, duration: int = 1):
         print(f"\n=== RESPONSE ===")
         print(f"Model output URL: {output}")
         
-        # The output is a URL to the generated audio file
+        # The output is a list of URLs, one per prompt
+        if isinstance(output, list):
+            output = output[0] if output else None
         if output and isinstance(output, str):
             print(f"\n=== DOWNLOADING AUDIO ===")
             print(f"Download URL: {output}")
             
-            # Download the audio file
-            response = requests.get(output)
-            print(f"Download status code: {response.status_code}")
-            
-            if response.status_code == 200:
-                # Create output directory if it doesn't exist
-                output_dir = Path("generated_audio")
-                output_dir.mkdir(exist_ok=True)
-                
-                # Save the audio file
-                filename = f"generated_audio_{duration}s.wav"
-                output_path = output_dir / filename
-                
-                with open(output_path, "wb") as f:
-                    f.write(response.content)
-                
-                print(f"Audio file saved to: {output_path.absolute()}")
-                return str(output_path)
-            else:
-                print(f"Failed to download audio file: {response.status_code}")
+            # Stream the audio file to disk, resuming if the connection drops
+            output_path = Path("generated_audio") / f"generated_audio_{duration}s.wav"
+            try:
+                download_file(output, output_path)
+            except DownloadError as e:
+                print(f"Failed to download audio file: {e}")
                 return None
+            
+            print(f"Audio file saved to: {output_path.absolute()}")
+            return str(output_path)
         else:
             print("No output received from model")
             return None
@@ -0,0 +1,270 @@
+# --- batching.py -------------------------------------------------------------
+"""Request coalescing and ordering in front of the diffusion sampler.
+
+Concurrent `predict` calls submit their prompts here. A single worker
+gathers whatever arrives within a short window, merges compatible
+requests into one batched sampler run, and hands each caller back its
+own slice of the results.
+
+Waiting requests are not served first come, first served. Each one
+carries a `priority` (seconds of penalty for its class) and an estimated
+`cost` in seconds. The next batch is built around the request with the
+lowest rank:
+
+    rank = priority + cost - aging * seconds waited
+
+With equal ranks the oldest request goes first. That is shortest job
+first within a class, and aging keeps long or low-priority jobs from
+starving. Without priorities or costs it is plain FIFO.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+
+from tracing import NULL_TRACE, TraceGroup
+
+
+@dataclass
+class _Pending:
+    key: object
+    prompts: list
+    durations: list
+    seeds: list
+    sample_rate: int
+    future: asyncio.Future = field(repr=False)
+    on_step: object = field(default=None, repr=False)
+    trace: object = field(default=None, repr=False)
+    priority: float = 0.0
+    cost: float = 0.0
+    submitted: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def longest(self):
+        return max(self.durations) * self.sample_rate
+
+
+class MicroBatcher:
+    """Coalesce concurrent generation requests into batched sampler runs.
+
+    `run_batch(key, prompts, durations, seeds, callback, trace)` does the
+    actual work and must return one result per prompt, in order. It is
+    called on a worker thread, at most `concurrency` batches at a time.
+    Only requests with equal `key` share a batch. `callback` is the
+    sampler step callback, or None when no request in the batch asked for
+    one. `trace` records stage spans into every traced request in the
+    batch.
+
+    Limits:
+      max_wait_ms        how long the first request of a batch waits for company
+      max_batch_size     most prompts per sampler run
+      max_total_samples  cap on batch items x longest item, in audio samples
+                         (every item is padded to the longest one)
+      concurrency        batches in flight; more than one only helps when
+                         `run_batch` hands work to parallel workers
+      aging              seconds of rank a request gains per second it waits
+    """
+
+    def __init__(self, run_batch, sample_rate, max_wait_ms=25,
+                 max_batch_size=8, max_total_samples=None, concurrency=1,
+                 aging=1.0):
+        self.run_batch = run_batch
+        self.sample_rate = sample_rate
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_total_samples = max_total_samples
+        self.concurrency = concurrency
+        self.aging = aging
+        self._loop = None
+        self._pending = []
+        self._arrival = None
+        self._slots = None
+        self._tasks = set()
+        self._in_flight = {}
+        self._worker = None
+
+    @classmethod
+    def from_env(cls, run_batch, sample_rate, sample_size, concurrency=1):
+        """Build a batcher configured by MICROBATCH_* environment variables."""
+        return cls(
+            run_batch,
+            sample_rate,
+            concurrency=concurrency,
+            max_wait_ms=float(os.getenv("MICROBATCH_MAX_WAIT_MS", 25)),
+            max_batch_size=int(os.getenv("MICROBATCH_MAX_BATCH_SIZE", 8)),
+            max_total_samples=int(os.getenv("MICROBATCH_MAX_TOTAL_SAMPLES",
+                                            8 * sample_size)),
+            aging=float(os.getenv("MICROBATCH_AGING", 1.0)),
+        )
+
+    async def submit(self, key, prompts, durations, seeds, on_step=None,
+                     trace=None, priority=0.0, cost=0.0):
+        """Queue a request and wait for its results.
+
+        `on_step(info, rows)` is called from the sampler thread after every
+        step with the k-diffusion callback dict and the slice of batch rows
+        that belong to this request. An `on_step.steps` set of step indices
+        says it only needs those steps, so a CPU worker relays no others.
+        With a `RequestTrace`, the time spent waiting for a batch is
+        recorded as the "queue" span. `priority` and `cost` set the
+        request's rank (see the module docstring).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio primitives belong to one loop, and scripts may call
+            # asyncio.run once per request
+            self._loop = loop
+            self._pending, self._in_flight, self._worker = [], {}, None
+            self._arrival = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future = loop.create_future()
+        self._pending.append(_Pending(key, prompts, durations, seeds,
+                                      self.sample_rate, future, on_step,
+                                      trace, priority, cost))
+        self._arrival.set()
+        return await future
+
+    def _rank(self, req, now):
+        return req.priority + req.cost - self.aging * (now - req.submitted)
+
+    def backlog(self, priority=0.0, cost=0.0):
+        """Estimated seconds before a request of this rank would start.
+
+        Counts the cost of every waiting request that ranks ahead of it
+        and what is left of the batches in flight, spread over the
+        concurrent slots. Batching usually makes the real wait shorter.
+        """
+        now = time.perf_counter()
+        rank = priority + cost
+        ahead = sum(req.cost for req in self._pending
+                    if not req.future.done() and self._rank(req, now) <= rank)
+        running = sum(max(cost - (now - start), 0.0)
+                      for start, cost in self._in_flight.values())
+        return (ahead + running) / self.concurrency
+
+    def _fits(self, batch, candidate):
+        if candidate.key != batch[0].key:
+            return False
+        items = sum(len(p.prompts) for p in batch) + len(candidate.prompts)
+        if items > self.max_batch_size:
+            return False
+        if self.max_total_samples is not None:
+            longest = max(candidate.longest, *(p.longest for p in batch))
+            if items * longest > self.max_total_samples:
+                return False
+        return True
+
+    async def _take(self, batch, timeout=None):
+        """Remove and return the best-ranked request that fits `batch`.
+
+        Waits up to `timeout` seconds (forever when None) for one to
+        arrive; returns None when none does.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            # Callers that gave up no longer need their work done
+            self._pending = [req for req in self._pending if not req.future.done()]
+            now = time.perf_counter()
+            fits = [req for req in self._pending if not batch or self._fits(batch, req)]
+            if fits:
+                best = min(fits, key=lambda req: (self._rank(req, now), req.submitted))
+                self._pending.remove(best)
+                return best
+
+            self._arrival.clear()
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._arrival.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._take([])]
+        deadline = loop.time() + self.max_wait
+
+        while sum(len(p.prompts) for p in batch) < self.max_batch_size:
+            candidate = await self._take(batch, max(deadline - loop.time(), 0))
+            if candidate is None:
+                break
+            batch.append(candidate)
+        return batch
+
+    @staticmethod
+    def _step_callback(batch):
+        listeners = []
+        start = 0
+        for req in batch:
+            end = start + len(req.prompts)
+            if req.on_step is not None:
+                listeners.append((req.on_step, slice(start, end)))
+            start = end
+        if not listeners:
+            return None
+
+        def callback(info):
+            for on_step, rows in listeners:
+                on_step(info, rows)
+        steps = [getattr(on_step, "steps", None) for on_step, _ in listeners]
+        if None not in steps:
+            callback.steps = frozenset().union(*steps)
+        return callback
+
+    @staticmethod
+    def _trace(batch, batch_size):
+        now = time.perf_counter()
+        traces = [req.trace for req in batch if req.trace is not None]
+        for req in batch:
+            if req.trace is not None:
+                req.trace.add("queue", req.submitted, now - req.submitted)
+        if not traces:
+            return NULL_TRACE
+        return TraceGroup(traces, batch_size=batch_size)
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first, so requests keep gathering into
+            # the next batch while every slot is busy
+            await self._slots.acquire()
+            batch = await self._collect()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        prompts = [p for req in batch for p in req.prompts]
+        durations = [d for req in batch for d in req.durations]
+        seeds = [s for req in batch for s in req.seeds]
+        # A batch costs about as much as its most expensive request
+        token = object()
+        self._in_flight[token] = (time.perf_counter(), max(req.cost for req in batch))
+        try:
+            results = await loop.run_in_executor(
+                None, self.run_batch, batch[0].key, prompts, durations,
+                seeds, self._step_callback(batch),
+                self._trace(batch, len(prompts))
+            )
+        except Exception as e:
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_exception(e)
+            return
+        finally:
+            del self._in_flight[token]
+            self._slots.release()
+
+        # Route each caller its own slice
+        start = 0
+        for req in batch:
+            end = start + len(req.prompts)
+            if not req.future.done():
+                req.future.set_result(results[start:end])
+            start = end
@@ -0,0 +1,76 @@
+# --- buckets.py --------------------------------------------------------------
+"""Duration buckets: a small, fixed set of sampler shapes.
+
+Sampling at `duration * sample_rate` gives a different latent length for
+every requested duration. Each new shape is a new compiled graph, a new
+autotune, and differently sized allocations that fragment the caching
+allocator. Instead, the sampler runs at the smallest bucket that fits,
+and the decoded waveform is trimmed back to the requested duration.
+
+Buckets are given in seconds by DURATION_BUCKETS and converted to latent
+frames. Longer requests, such as long-form segments beyond the last
+edge, are rounded up to a multiple of `granule` frames. An empty
+DURATION_BUCKETS samples at the exact length.
+
+Padding costs sampler time: every step runs over the whole bucket, so a
+request just past an edge pays for up to the next edge, e.g. a 3 s clip
+sampled at 5 s costs about 5/3 of its own length. The default edges are
+therefore dense at the short end, where the relative padding is largest.
+Each edge is one more shape to warm up under COMPILE (see
+compilation.py), but the short ones are cheap.
+
+Each bucket keeps one noise buffer on the device, in the model's dtype.
+It is filled in place for every run, so steady-state serving allocates
+no new noise tensors. A process runs one sampler at a time, so one
+buffer per length is enough.
+"""
+
+import bisect
+import math
+import os
+
+import torch
+
+from sampling import make_noise
+
+DEFAULT_EDGES = "2,5,10,20,30,45,60,90,120"
+
+
+class DurationBuckets:
+    def __init__(self, edges, sample_rate, downsampling_ratio=1, granule=32):
+        self.edges = sorted(edges)
+        self.sample_rate = sample_rate
+        self.ratio = downsampling_ratio
+        self.granule = granule if self.edges else 1
+        self.lengths = [self.frames(int(e * sample_rate)) for e in self.edges]
+        self._buffers = {}
+
+    @classmethod
+    def from_env(cls, model, sample_rate):
+        """Buckets from DURATION_BUCKETS (seconds, comma-separated) for `model`."""
+        raw = os.getenv("DURATION_BUCKETS", DEFAULT_EDGES)
+        edges = [float(e) for e in raw.split(",") if e.strip()]
+        ratio = getattr(model.pretransform, "downsampling_ratio", 1)
+        return cls(edges, sample_rate, ratio)
+
+    def frames(self, samples):
+        """Latent frames that cover `samples` audio samples."""
+        return math.ceil(samples / self.ratio)
+
+    def latent_length(self, samples):
+        """Latent length of the bucket that `samples` audio samples fall into."""
+        frames = self.frames(samples)
+        i = bisect.bisect_left(self.lengths, frames)
+        if i < len(self.lengths):
+            return self.lengths[i]
+        return math.ceil(frames / self.granule) * self.granule
+
+    def noise(self, model, seeds, length, device):
+        """`make_noise` written into this length's reusable buffer."""
+        dtype = next(model.model.parameters()).dtype
+        buffer = self._buffers.get(length)
+        if buffer is None or buffer.shape[0] < len(seeds) or buffer.dtype != dtype:
+            rows = max(len(seeds), buffer.shape[0] if buffer is not None else 0)
+            buffer = torch.empty(rows, model.io_channels, length, dtype=dtype, device=device)
+            self._buffers[length] = buffer
+        return make_noise(model, seeds, length, device, out=buffer)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Bulk generation from a manifest, with a durable journal for resuming.
+
+The manifest is a CSV file with a header row, or a JSONL file with one
+object per line. Each row is one prediction input: `description` (or
+`prompt`), plus optional `duration`, `seed` and any other model input.
+An optional `id` column names the output file. It defaults to the row
+number. Values are converted to the model's input types (see
+client_cache.INPUT_TYPES), so CSV cells such as "0.01" or "true" work.
+
+Items run on a fixed pool of `parallel` workers that share one
+ReplicateClient. Each state change is appended to the journal and
+fsynced before the run moves on:
+
+- "submitted" with the prediction id, as soon as the prediction exists
+- "succeeded" with the prediction id and output URL, before the download
+- "done" with the output path, once the file is on disk
+- "failed" with the error, plus the prediction id and output URL if known
+
+Re-running with the same journal skips items that are already done. An
+item whose prediction was started or finished by an earlier run is
+re-attached to it rather than resubmitted: a known output URL is
+downloaded again, and if it has expired the prediction is asked for a
+fresh one. Other failed items are tried again. A row whose input changed
+since it was journaled counts as new.
+
+At the end the run reports throughput, latency percentiles (submission
+to file on disk) and every failure.
+"""
+
+import asyncio
+import csv
+import json
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from client_cache import INPUT_TYPES, GenerationCache
+from downloader import DownloadError
+from replicate_client import (MODEL_VERSION, PredictionTimeout, ReplicateClient,
+                              ReplicateError, final_output)
+
+# File extension per output_format, where it differs (opus comes in Ogg)
+EXTENSIONS = {"opus": "ogg"}
+BOOLEANS = {"true": True, "1": True, "yes": True,
+            "false": False, "0": False, "no": False}
+
+
+@dataclass
+class Item:
+    id: str
+    input: dict
+
+    @property
+    def filename(self):
+        name = re.sub(r"[^\w.-]", "_", self.id)
+        fmt = self.input.get("output_format", "wav")
+        return f"{name}.{EXTENSIONS.get(fmt, fmt)}"
+
+
+def coerce(field, value):
+    """`value` as the type the model takes for input `field`.
+
+    CSV cells are all strings; JSONL values are converted the same way,
+    so "0.01", 0 and "true" all reach the model as its own types.
+    """
+    kind = INPUT_TYPES.get(field)
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        parsed = BOOLEANS.get(str(value).strip().lower())
+        if parsed is None:
+            raise ValueError(f"expected true or false, got {value!r}")
+        return parsed
+    if kind in (int, float):
+        return kind(value)
+    return value
+
+
+def load_manifest(path, duration=8):
+    """Read a CSV or JSONL manifest into a list of Items."""
+    path = Path(path)
+    with open(path, newline="") as f:
+        if path.suffix in (".jsonl", ".ndjson"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items, seen = [], set()
+    for n, row in enumerate(rows):
+        row = {k.strip(): v for k, v in row.items() if v not in (None, "")}
+        item_id = str(row.pop("id", f"{n:06d}"))
+        if "prompt" in row:
+            row["description"] = row.pop("prompt")
+        if "description" not in row:
+            raise ValueError(f"{path}: row {n + 1} has no description or prompt")
+        if item_id in seen:
+            raise ValueError(f"{path}: duplicate id {item_id!r}")
+        seen.add(item_id)
+        for field, value in row.items():
+            try:
+                row[field] = coerce(field, value)
+            except ValueError as e:
+                raise ValueError(f"{path}: row {n + 1} has an invalid {field}: {e}") from None
+        row.setdefault("duration", duration)
+        items.append(Item(item_id, row))
+    return items
+
+
+class Journal:
+    """Append-only JSONL log of item states; the last entry per id wins."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.state = {}
+        torn = False
+        if self.path.exists():
+            text = self.path.read_text()
+            for line in text.splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                self.state[entry["id"]] = entry
+            torn = bool(text) and not text.endswith("\n")
+        self._file = open(self.path, "a")
+        if torn:
+            self._file.write("\n")
+
+    def record(self, item_id, status, **fields):
+        entry = {"id": item_id, "status": status, "time": time.time(), **fields}
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.state[item_id] = entry
+
+    def done(self, item):
+        entry = self.state.get(item.id)
+        return (entry is not None and entry["status"] == "done"
+                and entry.get("input") == item.input and Path(entry["path"]).exists())
+
+    def attached(self, item):
+        """The prediction id and output URL an earlier run journaled for `item`.
+
+        Either is None when unknown. Only unfinished items with the same
+        input have them.
+        """
+        entry = self.state.get(item.id)
+        if not entry or entry["status"] == "done" or entry.get("input") != item.input:
+            return None, None
+        return entry.get("prediction"), entry.get("output")
+
+    def close(self):
+        self._file.close()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+async def run_manifest(items, output_dir, journal, parallel=8, timeout=None,
+                       cache=None, version=MODEL_VERSION, **client_options):
+    """Generate every item not yet done in `journal`; returns a summary dict."""
+    output_dir = Path(output_dir)
+    todo = [item for item in items if not journal.done(item)]
+    queue = asyncio.Queue()
+    for item in todo:
+        queue.put_nowait(item)
+
+    latencies, audio_seconds, failures = [], [], []
+    counts = {"done": 0, "cached": 0, "reattached": 0}
+
+    async def generate(client, item):
+        path = output_dir / item.filename
+        if cache is not None and cache.fetch(version, item.input, path):
+            counts["cached"] += 1
+            return path, None
+
+        def submitted(prediction):
+            journal.record(item.id, "submitted", prediction=prediction["id"], input=item.input)
+
+        previous, url = journal.attached(item)
+        if url is not None:
+            try:
+                path = await fetch(client, item, path, url)
+                counts["reattached"] += 1
+                return path, previous
+            except DownloadError:
+                pass  # The URL expired; the prediction hands out a fresh one
+        try:
+            output = await client.run(version, item.input, timeout,
+                                      prediction_id=previous, on_created=submitted)
+            counts["reattached"] += previous is not None
+        except PredictionTimeout:
+            raise
+        except ReplicateError:
+            if previous is None:
+                raise
+            # The earlier prediction is gone, failed or was cancelled: start over
+            output = await client.run(version, item.input, timeout, on_created=submitted)
+        url = final_output(output)
+        prediction = journal.state[item.id]["prediction"]
+        journal.record(item.id, "succeeded", prediction=prediction, output=url,
+                       input=item.input)
+        return await fetch(client, item, path, url), prediction
+
+    async def fetch(client, item, path, url):
+        await client.download(url, path)
+        if cache is not None:
+            cache.put(version, item.input, path)
+        return path
+
+    async def worker(client):
+        while not queue.empty():
+            item = queue.get_nowait()
+            start = time.monotonic()
+            try:
+                path, prediction = await generate(client, item)
+            except Exception as e:
+                failures.append((item, e))
+                # A paid prediction is kept for the next run to re-attach to
+                prediction, url = journal.attached(item)
+                journal.record(item.id, "failed", error=str(e) or type(e).__name__,
+                               prediction=prediction, output=url, input=item.input)
+                continue
+            seconds = time.monotonic() - start
+            latencies.append(seconds)
+            audio_seconds.append(item.input["duration"])
+            counts["done"] += 1
+            journal.record(item.id, "done", path=str(path), prediction=prediction,
+                           seconds=round(seconds, 3), input=item.input)
+
+    start = time.monotonic()
+    async with ReplicateClient(max_concurrency=parallel, **client_options) as client:
+        await asyncio.gather(*(worker(client) for _ in range(min(parallel, len(todo)))))
+    wall = time.monotonic() - start
+
+    return {
+        "items": len(items),
+        "skipped": len(items) - len(todo),
+        "done": counts["done"],
+        "cached": counts["cached"],
+        "reattached": counts["reattached"],
+        "failed": len(failures),
+        "failures": [(item.id, str(e) or type(e).__name__) for item, e in failures],
+        "wall_seconds": wall,
+        "items_per_minute": counts["done"] / wall * 60 if wall else 0.0,
+        "audio_seconds_per_minute": sum(audio_seconds) / wall * 60 if wall else 0.0,
+        "latency": {f"p{q}": percentile(latencies, q) for q in (50, 90, 99)},
+        "retries": client.retries,
+    }
+
+
+def print_summary(summary):
+    print(f"✅ {summary['done']} done ({summary['cached']} from cache, "
+          f"{summary['reattached']} re-attached), {summary['skipped']} already done, "
+          f"❌ {summary['failed']} failed")
+    print(f"⏱️  {summary['wall_seconds']:.1f}s wall, "
+          f"{summary['items_per_minute']:.1f} items/min, "
+          f"{summary['audio_seconds_per_minute']:.0f} audio s/min, "
+          f"{summary['retries']} HTTP retries")
+    latency = summary["latency"]
+    if latency["p50"] is not None:
+        print("📈 Latency " + ", ".join(f"{q} {v:.1f}s" for q, v in latency.items()))
+    for item_id, error in summary["failures"]:
+        print(f"   {item_id}: {error}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    p = argparse.ArgumentParser(description="Generate every row of a CSV/JSONL manifest")
+    p.add_argument("manifest", help="CSV (with header) or JSONL manifest of prediction inputs")
+    p.add_argument("--output-dir", default="generated_audio", help="Where to save files")
+    p.add_argument("--journal", default=None,
+                   help="Progress journal (default: <output-dir>/journal.jsonl)")
+    p.add_argument("--parallel", type=int, default=8, help="Items in flight")
+    p.add_argument("--rate", type=float, default=10.0, help="API requests per second")
+    p.add_argument("--duration", type=int, default=8, help="Duration for rows without one")
+    p.add_argument("--timeout", type=float, default=None,
+                   help="Per-prediction deadline in seconds; late predictions are cancelled")
+    p.add_argument("--no-cache", action="store_true", help="Do not use the local generation cache")
+    args = p.parse_args()
+
+    items = load_manifest(args.manifest, args.duration)
+    journal = Journal(args.journal or Path(args.output_dir) / "journal.jsonl")
+    cache = None if args.no_cache else GenerationCache.from_env()
+    print(f"🚀 {len(items)} items from {args.manifest}, {args.parallel} at a time "
+          f"(journal: {journal.path})")
+    try:
+        summary = asyncio.run(run_manifest(
+            items, args.output_dir, journal, args.parallel, args.timeout, cache,
+            rate=args.rate,
+        ))
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted; re-run the same command to resume")
+        sys.exit(130)
+    finally:
+        journal.close()
+    print_summary(summary)
+    sys.exit(1 if summary["failed"] else 0)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Client-side content-addressed cache of generated audio.
+
+Keys are a hash of the model version and the full prediction input
+(prompt, duration, seed, format, ...). Each key maps to a downloaded
+file in CLIENT_CACHE_DIR. A repeat request is answered from disk
+instead of paying for another prediction and download.
+
+Explicit inputs that equal the model's defaults are dropped before
+hashing, so {"description": "pad"} and {"description": "pad",
+"duration": 8} share an entry.
+
+The index records each entry's file, size, input and last use. Every
+change is appended as one JSON line to index.log, so a lookup costs
+O(1) and a crash mid-write loses at most that line. Once the log grows
+long it is folded into the index.json snapshot. Appends and folds hold
+an flock on index.lock, and each process replays what the others
+appended before it looks anything up, so concurrent processes never
+overwrite each other's entries. Entries are evicted least recently used
+first once the cache outgrows CLIENT_CACHE_MAX_MB.
+
+Unlike the server-side result cache, inputs with a random seed (-1) are
+cached too: re-running a prompt set should not pay twice. Use
+`refresh=True` where new audio is wanted.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_DIR = Path.home() / ".cache" / "stable-audio-open"
+INDEX_FILE = "index.json"
+JOURNAL_FILE = "index.log"
+LOCK_FILE = "index.lock"
+
+# Defaults of the deployed model's predict() inputs (see predict.py; kept in
+# step by test_client_cache.py)
+DEFAULT_INPUTS = {
+    "duration": 8, "seed": -1, "tier": "high", "preview_every": 0,
+    "output_format": "wav", "bitrate": 192, "bit_depth": 16, "long_form": False,
+    "variation_strength": 0.35, "early_stop": 0, "priority": "standard",
+    "deadline": 0, "profile": False,
+}
+# Types of the deployed model's predict() inputs, for parsing them from text
+INPUT_TYPES = {
+    "description": str, "duration": int, "seed": int, "prompts": str, "durations": str,
+    "seeds": str, "tier": str, "preview_every": int, "output_format": str,
+    "bitrate": int, "bit_depth": int, "long_form": bool, "variation_of": str,
+    "variation_strength": float, "early_stop": float, "priority": str,
+    "deadline": float, "profile": bool,
+}
+
+
+def normalize_input(input):
+    """`input` without None values and values equal to the model's defaults."""
+    return {name: value for name, value in input.items()
+            if value is not None and not (name in DEFAULT_INPUTS
+                                          and DEFAULT_INPUTS[name] == value)}
+
+
+def _apply(index, record):
+    key = record["key"]
+    if "entry" in record:
+        index[key] = record["entry"]
+    elif record.get("deleted"):
+        index.pop(key, None)
+    elif key in index:
+        index[key]["last_used"] = max(index[key]["last_used"], record["last_used"])
+
+
+class GenerationCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=2 * 2**30, compact_after=1000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.compact_after = compact_after
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._journal = None  # (inode, bytes read, lines read) of index.log
+        with self._lock, self._locked():
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured by CLIENT_CACHE_* environment variables."""
+        return cls(
+            os.getenv("CLIENT_CACHE_DIR", DEFAULT_DIR),
+            max_bytes=int(float(os.getenv("CLIENT_CACHE_MAX_MB", 2048)) * 2**20),
+        )
+
+    @staticmethod
+    def key(version, input):
+        raw = json.dumps({"version": version, "input": normalize_input(input)},
+                         sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the cross-process lock on the index."""
+        with open(self.directory / LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            self.index = json.loads((self.directory / INDEX_FILE).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {}
+        self._journal = None
+        self._replay()
+        # Drop entries whose file went missing while we were not looking
+        self.index = {k: e for k, e in self.index.items()
+                      if (self.directory / e["file"]).exists()}
+
+    def _replay(self):
+        """Apply what was appended to the journal since the last replay."""
+        path = self.directory / JOURNAL_FILE
+        path.touch()
+        inode = path.stat().st_ino
+        if self._journal is not None and self._journal[0] != inode:
+            # Another process folded the journal into a new snapshot
+            return self._load()
+        _, offset, lines = self._journal or (inode, 0, 0)
+        with open(path, "rb") as journal:
+            journal.seek(offset)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash
+                offset += len(line)
+                lines += 1
+                try:
+                    _apply(self.index, json.loads(line))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass
+        self._journal = (inode, offset, lines)
+
+    def _append(self, *records):
+        """Journal `records` and apply them; fold the log once it is long."""
+        data = "".join(json.dumps(r) + "\n" for r in records)
+        with open(self.directory / JOURNAL_FILE, "a") as journal:
+            journal.write(data)
+        self._replay()
+        if self._journal[2] >= max(self.compact_after, len(self.index)):
+            self._compact()
+
+    def _compact(self):
+        tmp = self.directory / f"{INDEX_FILE}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(self.index, indent=1))
+        os.replace(tmp, self.directory / INDEX_FILE)
+        # A new file, so other processes see the fold by its inode
+        tmp = self.directory / f"{JOURNAL_FILE}.{os.getpid()}.tmp"
+        tmp.write_bytes(b"")
+        os.replace(tmp, self.directory / JOURNAL_FILE)
+        self._journal = ((self.directory / JOURNAL_FILE).stat().st_ino, 0, 0)
+
+    def get(self, version, input):
+        """Path of the cached file for this request, or None."""
+        key = self.key(version, input)
+        with self._lock, self._locked():
+            self._replay()
+            entry = self.index.get(key)
+            path = self.directory / entry["file"] if entry else None
+            if path is None or not path.exists():
+                if entry:
+                    self._append({"key": key, "deleted": True})
+                self.misses += 1
+                return None
+            self._append({"key": key, "last_used": time.time()})
+            self.hits += 1
+            return path
+
+    def fetch(self, version, input, dest):
+        """Copy the cached file for this request to `dest`; False on a miss."""
+        path = self.get(version, input)
+        if path is None:
+            return False
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copyfile(path, dest)
+        except FileNotFoundError:
+            # Evicted by another process between get() and the copy
+            return False
+        return True
+
+    def put(self, version, input, src):
+        """Copy `src` into the cache for this request and return the cached path."""
+        src = Path(src)
+        key = self.key(version, input)
+        name = f"{key}{src.suffix}"
+        tmp = self.directory / f"{name}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, self.directory / name)
+        with self._lock, self._locked():
+            self._replay()
+            self._append({"key": key, "entry": {
+                "file": name, "size": src.stat().st_size, "last_used": time.time(),
+                "version": version, "input": input}})
+            self._evict()
+        return self.directory / name
+
+    def _evict(self):
+        total = sum(e["size"] for e in self.index.values())
+        evicted = []
+        for key, entry in sorted(self.index.items(), key=lambda kv: kv[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            (self.directory / entry["file"]).unlink(missing_ok=True)
+            evicted.append({"key": key, "deleted": True})
+            total -= entry["size"]
+        if evicted:
+            self._append(*evicted)
@@ -0,0 +1,78 @@
+# --- compilation.py ----------------------------------------------------------
+"""Opt-in torch.compile for the diffusion transformer and VAE decoder.
+
+COMPILE=1 compiles both forward passes in place. Compilation is lazy:
+it happens on the first call at each new shape. Setup therefore runs
+warm-up generations at the durations in COMPILE_WARMUP_DURATIONS (by
+default one per duration bucket, see buckets.py) so real requests never
+pay for it. Each duration is warmed up at every batch size in
+COMPILE_WARMUP_BATCH_SIZES (default 1 and 2). Once dynamo has seen two
+batch sizes it marks the batch dimension dynamic, so the larger batches
+the micro-batcher forms reuse that graph instead of recompiling.
+
+Inductor's FX graph cache, autotuning results and Triton kernels are
+kept in COMPILE_CACHE_DIR. Point it at a persistent volume, or bake it
+into the image, and later restarts load compiled artifacts instead of
+recompiling.
+"""
+
+import os
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".compile-cache"
+
+
+def enabled():
+    return os.getenv("COMPILE", "0") not in ("0", "", "false")
+
+
+def warmup_durations(default=None):
+    """Durations to warm up at: COMPILE_WARMUP_DURATIONS, else `default`."""
+    raw = os.getenv("COMPILE_WARMUP_DURATIONS")
+    if raw is None:
+        return list(default or [8, 30])
+    return [int(d) for d in raw.split(",") if d.strip()]
+
+
+def warmup_batch_sizes(max_batch_size):
+    """Batch sizes to warm up at: COMPILE_WARMUP_BATCH_SIZES, else 1 and 2."""
+    raw = os.getenv("COMPILE_WARMUP_BATCH_SIZES", "1,2")
+    sizes = sorted({int(b) for b in raw.split(",") if b.strip()})
+    return [b for b in sizes if 1 <= b <= max_batch_size] or [1]
+
+
+def use_cache_dir(cache_dir=None):
+    """Route every compile cache into one reusable directory."""
+    cache_dir = Path(cache_dir or os.getenv("COMPILE_CACHE_DIR", DEFAULT_CACHE_DIR))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir / "inductor"))
+    os.environ.setdefault("TRITON_CACHE_DIR", str(cache_dir / "triton"))
+
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+    if hasattr(inductor_config, "autotune_local_cache"):
+        inductor_config.autotune_local_cache = True
+    return cache_dir
+
+
+def _decoder(model):
+    """The autoencoder's decoder network, if the model has one."""
+    pretransform = model.pretransform
+    if pretransform is None:
+        return None
+    autoencoder = getattr(pretransform, "model", pretransform)
+    return getattr(autoencoder, "decoder", None)
+
+
+def compile_model(model, mode=None):
+    """Compile the transformer and decoder forwards in place.
+
+    `dynamic=None` lets dynamo mark the sequence length dynamic once it
+    has seen a second shape instead of recompiling for every duration.
+    """
+    mode = mode or os.getenv("COMPILE_MODE", "max-autotune-no-cudagraphs")
+    model.model.compile(mode=mode, dynamic=None)
+    decoder = _decoder(model)
+    if decoder is not None:
+        decoder.compile(mode=mode, dynamic=None)
+    return model
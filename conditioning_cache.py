@@ -0,0 +1,120 @@
+# --- conditioning_cache.py ---------------------------------------------------
+"""LRU cache for text/timing conditioning tensors.
+
+Every batch item's conditioner output (T5 prompt embedding plus the
+seconds_start / seconds_total embeddings) is cached under its prompt and
+timing values. Repeated template prompts then skip the encoder entirely.
+The cache is bounded by entry count and bytes. It can also write entries
+to a directory so they survive container restarts.
+
+The unconditional branch of CFG uses zeroed embeddings in this model, so
+there is no separate null-prompt encoder pass to cache.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import torch
+
+
+def _nbytes(entry):
+    return sum(
+        t.numel() * t.element_size()
+        for pair in entry.values() for t in pair if t is not None
+    )
+
+
+class ConditioningCache:
+    def __init__(self, max_entries=1024, max_bytes=256 * 2**20,
+                 directory=None, namespace=""):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, namespace=""):
+        """Build a cache configured by COND_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("COND_CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(float(os.getenv("COND_CACHE_MAX_MB", 256)) * 2**20),
+            directory=os.getenv("COND_CACHE_DIR") or None,
+            namespace=namespace,
+        )
+
+    def key(self, item):
+        raw = json.dumps([self.namespace, item], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _lookup(self, key, device):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.directory:
+            path = self.directory / f"{key}.pt"
+            if path.exists():
+                entry = torch.load(path, map_location=device)
+                self._insert(key, entry, persist=False)
+                return entry
+        return None
+
+    def _insert(self, key, entry, persist=True):
+        size = _nbytes(entry)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _nbytes(evicted)
+        if persist and self.directory:
+            tmp = self.directory / f"{key}.pt.tmp"
+            torch.save({name: tuple(t.cpu() if t is not None else None for t in pair)
+                        for name, pair in entry.items()}, tmp)
+            os.replace(tmp, self.directory / f"{key}.pt")
+
+    def encode(self, model, conditioning, device):
+        """Drop-in replacement for `model.conditioner(conditioning, device)`."""
+        keys = [self.key(item) for item in conditioning]
+        with self._lock:
+            # In batch order, so misses are inserted (and evicted) deterministically
+            found = {k: self._lookup(k, device) for k in dict.fromkeys(keys)}
+            missing = [k for k, entry in found.items() if entry is None]
+            self.hits += len(keys) - sum(keys.count(k) for k in missing)
+            self.misses += sum(keys.count(k) for k in missing)
+
+        if missing:
+            items = [conditioning[keys.index(k)] for k in missing]
+            fresh = model.conditioner(items, device)
+            with self._lock:
+                for row, k in enumerate(missing):
+                    # Clone the row so the cache does not pin the whole batch tensor
+                    entry = {
+                        name: tuple(t[row:row + 1].detach().clone() if t is not None else None
+                                    for t in pair)
+                        for name, pair in fresh.items()
+                    }
+                    found[k] = entry
+                    self._insert(k, entry)
+
+        entries = [found[k] for k in keys]
+        return {
+            name: [
+                torch.cat([e[name][i] for e in entries])
+                if entries[0][name][i] is not None else None
+                for i in range(len(entries[0][name]))
+            ]
+            for name in entries[0]
+        }
@@ -0,0 +1,201 @@
+# --- cpu_pool.py -------------------------------------------------------------
+"""Multi-process CPU serving over one shared copy of the weights.
+
+Without a GPU one process renders one batch at a time, and a single
+sampler run cannot keep a many-core host busy. A CpuWorkerPool forks N
+worker processes from the set-up predictor. Before the fork, every
+parameter and buffer is moved into shared memory (`share_memory()`), so
+all workers read the same pages. RAM for weights stays at one copy
+however many workers run, and copy-on-write never duplicates them.
+
+Each worker pins its intra-op thread count, and its CPU affinity where
+the platform allows, to its own slice of the cores, so workers do not
+oversubscribe one another. `call()` sends a method call to an idle
+worker and blocks until it answers. Result tensors come back through
+shared memory. Sampler step callbacks and trace spans are relayed to
+the calling process.
+
+Workers are forked, so the pool has to be started during setup, before
+any serving threads exist.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+
+import torch
+
+from tracing import NULL_TRACE, RequestTrace
+
+
+def _core_slices(workers, threads):
+    """The cores each worker is pinned to, or None where affinity is unsupported."""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < workers * threads:
+        return [None] * workers
+    return [cores[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def _worker(target, conn, threads, cores):
+    """Worker process main loop: run calls on `target` until told to stop."""
+    torch.set_num_threads(threads)
+    if cores is not None:
+        os.sched_setaffinity(0, cores)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        name, args, kwargs, relay_steps = message
+        if relay_steps is not None:
+            # True relays every step, otherwise a set of step indices
+            def callback(info):
+                if relay_steps is True or info["i"] in relay_steps:
+                    conn.send(("step", {"i": info["i"], "denoised": info["denoised"]}))
+            kwargs["callback"] = callback
+        trace = RequestTrace()
+        try:
+            result = getattr(target, name)(*args, trace=trace, **kwargs)
+        except Exception as e:
+            try:
+                conn.send(("error", e))
+            except Exception:
+                # Not every exception survives pickling
+                conn.send(("error", RuntimeError(traceback.format_exc())))
+            continue
+        conn.send(("result", result, trace.start, trace.spans))
+
+
+class _Worker:
+    def __init__(self, context, index, target, threads, cores):
+        self.index = index
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker, args=(target, child, threads, cores),
+            name=f"cpu-worker-{index}", daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+
+class CpuWorkerPool:
+    """N forked workers sharing `target`'s model weights; see the module docstring."""
+
+    def __init__(self, target, workers, threads=None):
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        target.model.share_memory()
+        context = multiprocessing.get_context("fork")
+        self.threads = threads
+        self.workers = [
+            _Worker(context, i, target, threads, cores)
+            for i, cores in enumerate(_core_slices(workers, threads))
+        ]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        self.busy = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, target):
+        """A pool sized by CPU_WORKERS / CPU_THREADS_PER_WORKER, or None when off."""
+        workers = int(os.getenv("CPU_WORKERS", 0))
+        if workers < 2:
+            return None
+        threads = int(os.getenv("CPU_THREADS_PER_WORKER", 0)) or None
+        return cls(target, workers, threads)
+
+    def __len__(self):
+        return len(self.workers)
+
+    def _checkout(self):
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                if not any(w.process.is_alive() for w in self.workers):
+                    raise RuntimeError("Every CPU worker has exited.")
+
+    def call(self, name, *args, callback=None, trace=NULL_TRACE, **kwargs):
+        """Run `target.<name>(*args, **kwargs)` on an idle worker and return the result.
+
+        `callback` receives the sampler step info relayed from the worker.
+        When it has a `steps` attribute (a set of step indices), only those
+        steps are relayed. The worker's spans are added to `trace`.
+        """
+        return self._run(self._checkout(), name, args, kwargs, callback, trace)
+
+    def broadcast(self, name, *args, **kwargs):
+        """Run the same call once on every worker, e.g. a warm-up."""
+        workers = [self._checkout() for _ in self.workers]
+        errors = []
+
+        def run(worker):
+            try:
+                self._run(worker, name, args, kwargs, None, NULL_TRACE)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(w,)) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def _run(self, worker, name, args, kwargs, callback, trace):
+        with self._lock:
+            self.busy += 1
+        healthy = True
+        error = callback_error = None
+        try:
+            relay_steps = None if callback is None else getattr(callback, "steps", True)
+            worker.conn.send((name, args, kwargs, relay_steps))
+            while True:
+                kind, *payload = worker.conn.recv()
+                if kind == "step":
+                    # Keep reading after a failing callback so the pipe stays in step
+                    if callback_error is None:
+                        try:
+                            callback(payload[0])
+                        except Exception as e:
+                            callback_error = e
+                    continue
+                if kind == "error":
+                    error = payload[0]
+                break
+        except (EOFError, OSError) as e:
+            healthy = False
+            raise RuntimeError(f"CPU worker {worker.index} exited "
+                               f"(exit code {worker.process.exitcode})") from e
+        finally:
+            with self._lock:
+                self.busy -= 1
+            if healthy:
+                self._idle.put(worker)
+
+        if error is not None:
+            raise error
+        result, start, spans = payload
+        # perf_counter is system-wide, so worker offsets map onto our clock
+        for span in spans:
+            span = dict(span)
+            trace.add(span.pop("name"), start + span.pop("offset"), span.pop("seconds"),
+                      worker=worker.index, **span)
+        if callback_error is not None:
+            raise callback_error
+        return result
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pre-resolve the model into ./weights so the predictor can start without
+touching the Hugging Face hub.
+
+Run once before `cog build` / `cog push`; the weights directory is then
+baked into the image and picked up by Predictor.setup.
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from loading import CONFIG_FILE, MODEL_DIR, REVISION_FILE, WEIGHTS_FILE
+
+# Cache the T5 text encoder next to the snapshot; must be set before
+# huggingface_hub / transformers are imported
+os.environ["HF_HOME"] = str(MODEL_DIR / "hf")
+
+from huggingface_hub import HfApi, login, snapshot_download  # noqa: E402
+
+# Load environment variables
+load_dotenv()
+
+MODEL_NAME = "stabilityai/stable-audio-open-1.0"
+TEXT_ENCODER = "t5-base"
+
+
+def download_weights(model_dir: Path = MODEL_DIR):
+    """
+    Download the model config, weights and text encoder into `model_dir`
+
+    Returns:
+        str: The model revision (commit hash) that was downloaded
+    """
+    token = os.getenv("HUGGING_FACE_HUB_TOKEN") or os.getenv("HF_TOKEN")
+    if not token:
+        print("❌ HUGGING_FACE_HUB_TOKEN (or HF_TOKEN) not found")
+        return None
+    login(token=token)
+
+    revision = HfApi().model_info(MODEL_NAME).sha
+    print(f"📥 Downloading {MODEL_NAME}@{revision} into {model_dir}")
+    snapshot_download(
+        MODEL_NAME,
+        revision=revision,
+        allow_patterns=[CONFIG_FILE, WEIGHTS_FILE],
+        local_dir=model_dir,
+    )
+    (model_dir / REVISION_FILE).write_text(revision)
+
+    print(f"📥 Caching text encoder {TEXT_ENCODER}")
+    from transformers import AutoTokenizer, T5EncoderModel
+    AutoTokenizer.from_pretrained(TEXT_ENCODER)
+    T5EncoderModel.from_pretrained(TEXT_ENCODER)
+
+    print(f"✅ Snapshot ready: {model_dir}")
+    return revision
+
+
+if __name__ == "__main__":
+    download_weights()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Streaming, resumable and parallel-range file downloads.
+
+Output files are never held in memory. Bytes stream in chunks into a
+`.part` file next to the destination. When the connection drops, the
+transfer resumes with a Range request from the last byte written. Files
+of at least `parallel_threshold` bytes, from servers that accept ranges,
+are fetched as `parts` concurrent ranges written into a preallocated
+file at their own offsets.
+
+The finished file's size is checked against Content-Length, and its
+SHA-256 against `sha256` when given. Only then is it renamed over the
+destination in one atomic step, so readers see either no file or a
+complete one.
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+from pathlib import Path
+
+import httpx
+
+
+class DownloadError(Exception):
+    """A download failed for good or produced the wrong bytes."""
+
+
+def _part_path(path):
+    return path.with_name(path.name + ".part")
+
+
+async def _probe(http, url):
+    """Return (size or None, accepts ranges) for `url`."""
+    try:
+        response = await http.head(url)
+    except httpx.HTTPError:
+        return None, False
+    if response.status_code >= 400:
+        return None, False
+    size = response.headers.get("Content-Length")
+    accepts = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return (int(size) if size is not None else None), accepts
+
+
+async def _fetch_range(http, url, fd, start, end, chunk_size, max_retries, backoff):
+    """Write bytes [start, end] of `url` into `fd` at their offsets, resuming on failure."""
+    position = start
+    for attempt in range(max_retries + 1):
+        try:
+            headers = {"Range": f"bytes={position}-{end}"}
+            async with http.stream("GET", url, headers=headers) as response:
+                if response.status_code != 206:
+                    raise DownloadError(f"GET {url} range {position}-{end} "
+                                        f"returned {response.status_code}")
+                async for chunk in response.aiter_bytes(chunk_size):
+                    os.pwrite(fd, chunk, position)
+                    position += len(chunk)
+            if position > end:
+                return
+        except httpx.HTTPError:
+            pass
+        if attempt < max_retries:
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+    raise DownloadError(f"GET {url} range {start}-{end} stopped at byte {position}")
+
+
+async def _fetch_stream(http, url, part, chunk_size, max_retries, backoff):
+    """Stream `url` into `part`, resuming with a Range request after a drop."""
+    written = 0
+    size = None
+    with open(part, "wb") as f:
+        for attempt in range(max_retries + 1):
+            headers = {"Range": f"bytes={written}-"} if written else {}
+            try:
+                async with http.stream("GET", url, headers=headers) as response:
+                    if response.status_code >= 400:
+                        if response.status_code < 500:
+                            raise DownloadError(f"GET {url} returned {response.status_code}")
+                        raise httpx.HTTPStatusError("server error", request=response.request,
+                                                    response=response)
+                    if written and response.status_code != 206:
+                        # No range support: start over
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+                    if size is None and response.status_code == 200:
+                        length = response.headers.get("Content-Length")
+                        size = int(length) if length is not None else None
+                    async for chunk in response.aiter_bytes(chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                if size is None or written >= size:
+                    return size
+            except httpx.HTTPError:
+                pass
+            if attempt < max_retries:
+                await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+    raise DownloadError(f"GET {url} stopped at byte {written} of {size}")
+
+
+def _sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def download(http, url, path, sha256=None, chunk_size=1 << 16,
+                   parallel_threshold=8 << 20, parts=4, max_retries=5,
+                   backoff=0.5):
+    """Download `url` to `path` with an httpx.AsyncClient and return the path.
+
+    Raises DownloadError when the transfer cannot be completed or the
+    result fails the size or `sha256` check; the destination is left
+    untouched in that case.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = _part_path(path)
+
+    size, accepts_ranges = await _probe(http, url)
+    try:
+        if size and accepts_ranges and size >= parallel_threshold and parts > 1:
+            fd = os.open(part, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                bounds = [size * i // parts for i in range(parts + 1)]
+                tasks = [asyncio.ensure_future(
+                    _fetch_range(http, url, fd, bounds[i], bounds[i + 1] - 1,
+                                 chunk_size, max_retries, backoff))
+                    for i in range(parts)]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    # No range may still write to fd once it is closed
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                os.close(fd)
+        else:
+            size = await _fetch_stream(http, url, part, chunk_size, max_retries,
+                                       backoff) or size
+
+        actual = part.stat().st_size
+        if size is not None and actual != size:
+            raise DownloadError(f"{url}: got {actual} bytes, expected {size}")
+        if sha256 is not None and _sha256(part) != sha256.lower():
+            raise DownloadError(f"{url}: SHA-256 mismatch")
+        os.replace(part, path)
+        return path
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+
+def download_file(url, path, timeout=60.0, **options):
+    """Synchronous `download` with its own short-lived client."""
+    async def go():
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as http:
+            return await download(http, url, path, **options)
+    return asyncio.run(go())
@@ -0,0 +1,79 @@
+# --- encoding.py -------------------------------------------------------------
+"""Output encoding on a background worker pool.
+
+Waveforms are encoded into an in-memory buffer and written to disk in a
+single call, on a thread pool. Encoding one request's files therefore
+overlaps with sampling of the next batch instead of blocking it.
+"""
+
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile
+from torchcodec.encoders import AudioEncoder
+
+from tracing import NULL_TRACE
+
+FORMATS = ["wav", "flac", "mp3", "opus"]
+SUFFIXES = {"wav": ".wav", "flac": ".flac", "mp3": ".mp3", "opus": ".ogg"}
+LOSSLESS = {"wav", "flac"}
+# soundfile subtype per lossless bit depth
+SUBTYPES = {16: "PCM_16", 24: "PCM_24"}
+
+# Opus only runs at 48 kHz
+OPUS_SAMPLE_RATE = 48000
+
+
+def encode(audio, sample_rate, fmt="wav", bitrate=192, bit_depth=16):
+    """Encode a float (channels, samples) CPU waveform in [-1, 1] to bytes.
+
+    `bit_depth` applies to the lossless formats, which libsndfile writes
+    (via soundfile). `bitrate` (kbps) applies to the lossy ones, which
+    FFmpeg encodes (via torchcodec); Opus is resampled to 48 kHz in an
+    Ogg container.
+    """
+    if fmt in LOSSLESS:
+        if bit_depth not in SUBTYPES:
+            raise ValueError(f"Unsupported bit depth {bit_depth}, expected one of "
+                             f"{sorted(SUBTYPES)}.")
+        buf = io.BytesIO()
+        soundfile.write(buf, audio.float().numpy().T, sample_rate, format=fmt.upper(),
+                        subtype=SUBTYPES[bit_depth])
+        return buf.getvalue()
+    if fmt in ("mp3", "opus"):
+        encoder = AudioEncoder(audio.float(), sample_rate=sample_rate)
+        rate = OPUS_SAMPLE_RATE if fmt == "opus" else sample_rate
+        return encoder.to_tensor(fmt, bit_rate=bitrate * 1000,
+                                 sample_rate=rate).numpy().tobytes()
+    raise ValueError(f"Unknown output format '{fmt}', expected one of {FORMATS}.")
+
+
+def _encode_to(path, audio, sample_rate, options, trace=NULL_TRACE):
+    with trace.span("encode", cpu_only=True, format=options.get("fmt", "wav")):
+        data = encode(audio, sample_rate, **options)
+    with trace.span("file_write", cpu_only=True, bytes=len(data)):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+class EncoderPool:
+    """Thread pool that encodes waveforms and writes them to disk."""
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="encoder"
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(workers=int(os.getenv("ENCODER_WORKERS", 2)))
+
+    async def write(self, path, audio, sample_rate, trace=NULL_TRACE, **options):
+        """Encode `audio` with `encode(**options)` and write it to `path`."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, _encode_to, path, audio, sample_rate, options, trace
+        )
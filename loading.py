@@ -0,0 +1,99 @@
+# --- loading.py --------------------------------------------------------------
+"""Model loading and cold-start instrumentation.
+
+With a pre-resolved snapshot in MODEL_DIR (see download_weights.py) setup
+never talks to the hub. The config is read from disk, the model is built
+without running random weight init, and the safetensors weights are
+memory-mapped straight onto the target device and assigned in place.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MODEL_DIR = Path(os.getenv("MODEL_DIR", Path(__file__).parent / "weights"))
+CONFIG_FILE = "model_config.json"
+WEIGHTS_FILE = "model.safetensors"
+REVISION_FILE = "REVISION"
+
+
+def has_snapshot(model_dir=MODEL_DIR):
+    model_dir = Path(model_dir)
+    return (model_dir / CONFIG_FILE).exists() and (model_dir / WEIGHTS_FILE).exists()
+
+
+def use_local_snapshot(model_dir=MODEL_DIR):
+    """Point the HF libraries at the snapshot's cache and keep them offline.
+
+    Call this before transformers or huggingface_hub are imported: both
+    read these variables at import time. The T5 encoder used by the text
+    conditioner is fetched into this cache by download_weights.py.
+    """
+    if not has_snapshot(model_dir):
+        return False
+    os.environ.setdefault("HF_HOME", str(Path(model_dir) / "hf"))
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    return True
+
+
+def snapshot_revision(model_dir=MODEL_DIR):
+    path = Path(model_dir) / REVISION_FILE
+    return path.read_text().strip() if path.exists() else None
+
+
+class PhaseTimer:
+    """Wall-clock timer for named startup phases."""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def report(self, title="Startup timing"):
+        total = sum(self.phases.values())
+        lines = [f"⏱️  {title}: {total:.2f}s"]
+        for name, seconds in self.phases.items():
+            share = seconds / total if total else 0
+            lines.append(f"   {name:<16} {seconds:8.2f}s  {share:6.1%}")
+        return "\n".join(lines)
+
+
+def load_config(model_dir=MODEL_DIR):
+    with open(Path(model_dir) / CONFIG_FILE) as f:
+        return json.load(f)
+
+
+def build_model(model_config):
+    """Instantiate the architecture without spending time on random init."""
+    from stable_audio_tools.models.factory import create_model_from_config
+    from transformers.modeling_utils import no_init_weights
+
+    with no_init_weights():
+        return create_model_from_config(model_config)
+
+
+def load_weights(model, device, model_dir=MODEL_DIR, dtype=None):
+    """Memory-map the safetensors weights onto `device` and assign them in place.
+
+    `assign=True` swaps the module's parameters for the loaded tensors
+    instead of copying into the randomly initialised ones, so each weight
+    is materialised exactly once, already on the target device.
+    """
+    from safetensors.torch import load_file
+
+    state_dict = load_file(str(Path(model_dir) / WEIGHTS_FILE), device=str(device))
+    if dtype is not None:
+        state_dict = {
+            k: v.to(dtype) if v.is_floating_point() else v
+            for k, v in state_dict.items()
+        }
+    model.load_state_dict(state_dict, assign=True)
+    return model
@@ -0,0 +1,98 @@
+# --- longform.py -------------------------------------------------------------
+"""Long-form generation from overlapping, pipelined segments.
+
+A clip longer than the model's comfortable window is split into
+overlapping segments. Each segment is sampled on its own, with timing
+conditioning that places it inside the full clip: `seconds_start` is
+the segment's offset and `seconds_total` is the clip's duration. The
+model was trained on windows cut from longer recordings, so it renders
+each segment as a piece of a longer whole rather than a complete clip
+that fades out.
+
+Consecutive segments are joined with an equal-power crossfade. That is
+the right fade for independently sampled audio, whose overlaps are
+uncorrelated.
+
+Sampling and decoding are pipelined. While segment k+1 samples on the
+calling thread, segment k is VAE-decoded, moved to the CPU and stitched
+on a helper thread. At most one segment waits to be decoded, so device
+memory stays bounded by one segment's attention pass and one decode,
+whatever the total duration.
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+def plan_segments(total, segment, overlap):
+    """(start, length) of each segment covering `total` samples.
+
+    Segments are `segment` samples long and share `overlap` samples with
+    their neighbour. The last one is shortened to end at `total`. It is
+    always longer than the overlap.
+    """
+    if not 0 <= overlap < segment:
+        raise ValueError(f"Overlap must be shorter than a segment, got {overlap} >= {segment}.")
+    hop = segment - overlap
+    starts = [0]
+    while starts[-1] + segment < total:
+        starts.append(starts[-1] + hop)
+    return [(start, min(segment, total - start)) for start in starts]
+
+
+class Stitcher:
+    """Joins consecutive (channels, samples) CPU segments with an equal-power crossfade.
+
+    Only the trailing overlap of the last segment is kept aside, so each
+    finished part can be handed on as soon as its successor arrives.
+    """
+
+    def __init__(self, overlap):
+        self.overlap = overlap
+        self.parts = []
+        self.tail = None
+
+    def add(self, audio):
+        n = self.overlap
+        if self.tail is not None and n:
+            angle = torch.linspace(0, math.pi / 2, n + 2)[1:-1]
+            head = audio[:, :n] * angle.sin() + self.tail * angle.cos()
+            audio = torch.cat([head, audio[:, n:]], dim=-1)
+        if n:
+            self.parts.append(audio[:, :-n])
+            self.tail = audio[:, -n:]
+        else:
+            self.parts.append(audio)
+            self.tail = audio[:, :0]
+
+    def finish(self):
+        return torch.cat(self.parts + [self.tail], dim=-1)
+
+
+def render(sample, decode, plan, overlap):
+    """Run `sample(k)` and `decode(latents, k)` over a segment plan, pipelined.
+
+    `sample` runs on the calling thread and returns segment k's latents.
+    `decode` runs on a helper thread and returns its (channels, samples)
+    CPU audio, at least as long as the plan says. Returns the stitched
+    clip.
+    """
+    stitcher = Stitcher(overlap)
+
+    def finish(latents, k):
+        audio = decode(latents, k)
+        stitcher.add(audio[:, :plan[k][1]])
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="longform") as pool:
+        pending = None
+        for k in range(len(plan)):
+            latents = sample(k)
+            if pending is not None:
+                # Keeps one decode in flight and surfaces its errors
+                pending.result()
+            pending = pool.submit(finish, latents, k)
+            del latents
+        pending.result()
+    return stitcher.finish()
@@ -0,0 +1,226 @@
+# --- metrics.py --------------------------------------------------------------
+"""Process-wide serving metrics in Prometheus text format.
+
+Every finished prediction feeds its RequestTrace into ServingMetrics,
+which keeps counters and histograms for:
+  queue wait          seconds between submit and the start of its batch
+  sampler steps/sec   per sampler run, for requests that rendered
+  steps run / saved   sampler steps taken, and those skipped by early stops
+  real-time factor    audio seconds per wall-clock second, by duration bucket
+  cache hit rates     conditioning and result cache, read at scrape time
+  peak memory         highest span peak seen (device memory on GPU)
+plus the setup time per startup phase.
+
+METRICS_PORT serves the text on http://0.0.0.0:<port>/metrics next to
+cog's own server. METRICS_LOG_INTERVAL prints it as one JSON line every
+that many seconds. Both are off by default; the numbers are collected
+either way.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+RATE_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+DURATION_BUCKETS = [10, 30, 60]
+
+
+def duration_bucket(seconds):
+    """Label for the duration bucket `seconds` falls into, e.g. "10-30"."""
+    edges = [0] + DURATION_BUCKETS
+    i = bisect.bisect_left(DURATION_BUCKETS, seconds)
+    if i == len(DURATION_BUCKETS):
+        return f"{DURATION_BUCKETS[-1]}+"
+    return f"{edges[i]}-{edges[i + 1]}"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one set of labels."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = list(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), [0, 0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += 1
+        total[1] += value
+        self._series[key] = (counts, total)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, (count, total)) in sorted(self._series.items()):
+            labels = dict(key)
+            cumulative = 0
+            for edge, n in zip(self.buckets + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': edge})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+    def snapshot(self):
+        return {",".join(f"{k}={v}" for k, v in key) or "all":
+                {"count": count, "mean": total / count}
+                for key, (_, (count, total)) in self._series.items()}
+
+
+class ServingMetrics:
+    """Counters and histograms for one predictor process. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {"predictions_total": 0, "items_total": 0,
+                         "audio_seconds_total": 0.0, "rendered_total": 0,
+                         "sampler_steps_total": 0, "sampler_steps_saved_total": 0}
+        self.gauges = {"peak_memory_bytes": 0}
+        self.setup = {}
+        self.sources = {}
+        self.queue_wait = Histogram(
+            "queue_wait_seconds", "Time from submit to the start of the batch.",
+            LATENCY_BUCKETS)
+        self.steps_per_second = Histogram(
+            "sampler_steps_per_second", "Sampler steps per second of sampling.",
+            RATE_BUCKETS)
+        self.real_time_factor = Histogram(
+            "real_time_factor", "Audio seconds generated per wall-clock second.",
+            RATE_BUCKETS)
+        self.latency = Histogram(
+            "prediction_seconds", "Wall-clock time of a prediction.",
+            LATENCY_BUCKETS)
+
+    def record_setup(self, phases):
+        """Startup seconds per phase, from PhaseTimer.phases."""
+        with self._lock:
+            self.setup = dict(phases)
+
+    def add_source(self, name, read):
+        """Read `read()` -> {field: number} at scrape time, e.g. cache counters."""
+        self.sources[name] = read
+
+    def observe(self, trace):
+        """Fold one finished prediction's trace into the aggregates."""
+        seconds = trace.elapsed()
+        stages = trace.stages()
+        audio_seconds = trace.attributes.get("audio_seconds", 0)
+        longest = trace.attributes.get("longest", audio_seconds)
+        with self._lock:
+            self.counters["predictions_total"] += 1
+            self.counters["items_total"] += trace.attributes.get("items", 0)
+            self.counters["audio_seconds_total"] += audio_seconds
+            self.latency.observe(seconds)
+            if "queue" in stages:
+                self.queue_wait.observe(stages["queue"])
+            for span in trace.spans:
+                if span["name"] == "sampling":
+                    self.counters["sampler_steps_total"] += span["steps"]
+                    self.counters["sampler_steps_saved_total"] += (
+                        span.get("max_steps", span["steps"]) - span["steps"])
+                    if span["seconds"] > 0:
+                        self.steps_per_second.observe(span["steps"] / span["seconds"])
+                if span.get("peak_bytes", 0) > self.gauges["peak_memory_bytes"]:
+                    self.gauges["peak_memory_bytes"] = span["peak_bytes"]
+            # Cache hits would inflate the real-time factor, so only renders count
+            if "sampling" in stages and seconds > 0:
+                self.counters["rendered_total"] += 1
+                self.real_time_factor.observe(
+                    audio_seconds / seconds, duration=duration_bucket(longest))
+
+    def _source_values(self):
+        values = {}
+        for name, read in self.sources.items():
+            fields = read()
+            for field, value in fields.items():
+                values[f"{name}_{field}"] = value
+            lookups = fields.get("hits", 0) + fields.get("misses", 0)
+            if "hits" in fields:
+                values[f"{name}_hit_rate"] = fields["hits"] / lookups if lookups else 0.0
+        return values
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            for name, value in self.counters.items():
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+            for name, value in {**self.gauges, **self._source_values()}.items():
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+            lines.append("# TYPE setup_seconds gauge")
+            for phase, value in self.setup.items():
+                lines.append(f"setup_seconds{_labels({'phase': phase})} {value}")
+            lines += ["# TYPE uptime_seconds gauge",
+                      f"uptime_seconds {time.time() - self.started}"]
+            for histogram in (self.queue_wait, self.steps_per_second,
+                              self.real_time_factor, self.latency):
+                lines += histogram.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """A compact JSON-friendly summary for log lines."""
+        with self._lock:
+            return {
+                "event": "serving_metrics",
+                **self.counters, **self.gauges, **self._source_values(),
+                "setup_seconds": sum(self.setup.values()),
+                "queue_wait_seconds": self.queue_wait.snapshot(),
+                "sampler_steps_per_second": self.steps_per_second.snapshot(),
+                "real_time_factor": self.real_time_factor.snapshot(),
+                "prediction_seconds": self.latency.snapshot(),
+            }
+
+    def serve(self, port):
+        """Serve `render()` on /metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http",
+                         daemon=True).start()
+        return server
+
+    def log_every(self, interval):
+        """Print `snapshot()` as a JSON line every `interval` seconds."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                print(json.dumps(self.snapshot()), flush=True)
+        threading.Thread(target=loop, name="metrics-log", daemon=True).start()
+
+    def start_from_env(self):
+        port = int(os.getenv("METRICS_PORT", 0))
+        if port:
+            self.serve(port)
+            print(f"📈 Metrics on http://0.0.0.0:{port}/metrics")
+        interval = float(os.getenv("METRICS_LOG_INTERVAL", 0))
+        if interval > 0:
+            self.log_every(interval)
+        return self
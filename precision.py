@@ -0,0 +1,141 @@
+# --- precision.py ------------------------------------------------------------
+"""Per-component precision: fp32, fp16/bf16 autocast, or CPU dynamic int8.
+
+The three heavy components can each run at their own precision:
+  t5   the T5 text encoder inside the prompt conditioner
+  dit  the diffusion transformer the sampler calls every step
+  vae  the autoencoder that decodes latents to audio
+
+fp16/bf16 cast the component's weights (halving their memory) and run
+its forward under autocast, so fp32 inputs from neighbouring components
+are handled. int8 applies dynamic quantization to the Linear layers and
+is only available on CPU.
+
+Before anything is converted, each component is run once on a fixed
+probe input at fp32. After conversion the probe is run again, and the
+relative L2 drift is checked against a tolerance.
+"""
+
+import functools
+import os
+
+import torch
+
+COMPONENTS = ["t5", "dit", "vae"]
+PRECISIONS = {"fp32": torch.float32, "fp16": torch.float16,
+              "bf16": torch.bfloat16, "int8": torch.qint8}
+
+PROBE_PROMPT = "warm analog synth pad with soft drums"
+
+
+def settings_from_env():
+    """Precision per component from PRECISION_T5 / PRECISION_DIT / PRECISION_VAE."""
+    settings = {c: os.getenv(f"PRECISION_{c.upper()}", "fp32") for c in COMPONENTS}
+    for component, precision in settings.items():
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"PRECISION_{component.upper()}={precision}, "
+                f"expected one of {sorted(PRECISIONS)}."
+            )
+    return settings
+
+
+def _autocast(fn, device_type, dtype):
+    @functools.wraps(fn)
+    def wrapped(*args, **kwargs):
+        with torch.autocast(device_type, dtype=dtype):
+            return fn(*args, **kwargs)
+    return wrapped
+
+
+def _t5(model):
+    return model.conditioner.conditioners["prompt"]
+
+
+def _probe(model, component, device, inputs):
+    """Run one component on its probe input and return a float32 tensor."""
+    if component == "t5":
+        cond = model.conditioner(
+            [{"prompt": PROBE_PROMPT, "seconds_start": 0, "seconds_total": 1}], device
+        )
+        return cond["prompt"][0].float()
+    if component == "dit":
+        x, t, cond = inputs["dit"]
+        return model.model(x, t, **cond).float()
+    latents = inputs["vae"].to(next(model.pretransform.parameters()).dtype)
+    return model.pretransform.decode(latents).float()
+
+
+def _probe_inputs(model, device):
+    gen = torch.Generator(device="cpu").manual_seed(0)
+    cond = model.conditioner(
+        [{"prompt": PROBE_PROMPT, "seconds_start": 0, "seconds_total": 1}], device
+    )
+    cond = model.get_conditioning_inputs(cond)
+    x = torch.randn([1, model.io_channels, 32], generator=gen).to(device)
+    t = torch.full([1], 0.5, device=device)
+    latents = torch.randn([1, model.io_channels, 32], generator=gen).to(device)
+    return {"dit": (x, t, cond), "vae": latents}
+
+
+def _convert(model, component, precision, device):
+    dtype = PRECISIONS[precision]
+    device_type = torch.device(device).type
+
+    if precision == "int8":
+        if device_type != "cpu":
+            raise ValueError(f"int8 precision for {component} is only supported on CPU.")
+        module = {"t5": lambda: _t5(model).model, "dit": lambda: model.model,
+                  "vae": lambda: model.pretransform}[component]()
+        torch.ao.quantization.quantize_dynamic(
+            module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return
+
+    if component == "t5":
+        t5 = _t5(model).model.to(dtype)
+        t5.forward = _autocast(t5.forward, device_type, dtype)
+    elif component == "dit":
+        model.model.to(dtype)
+        model.model.forward = _autocast(model.model.forward, device_type, dtype)
+    else:
+        model.pretransform.to(dtype)
+        model.pretransform.decode = _autocast(model.pretransform.decode, device_type, dtype)
+
+
+@torch.no_grad()
+def apply_precision(model, device, settings, tolerance=None):
+    """Convert each component to its precision and check drift against fp32.
+
+    Returns {component: relative L2 drift} for the converted components.
+    Raises ValueError for an unknown precision and RuntimeError when a
+    drift exceeds `tolerance` (default $PRECISION_MAX_DRIFT, 0.05).
+    """
+    for component, precision in settings.items():
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}' for {component}, "
+                             f"expected one of {sorted(PRECISIONS)}.")
+    if tolerance is None:
+        tolerance = float(os.getenv("PRECISION_MAX_DRIFT", 0.05))
+    changed = [c for c in COMPONENTS if settings.get(c, "fp32") != "fp32"]
+    if not changed:
+        return {}
+
+    inputs = _probe_inputs(model, device)
+    reference = {c: _probe(model, c, device, inputs) for c in changed}
+    for c in changed:
+        _convert(model, c, settings[c], device)
+
+    drift = {}
+    for c in changed:
+        out = _probe(model, c, device, inputs)
+        drift[c] = ((out - reference[c]).norm() / reference[c].norm().clamp_min(1e-12)).item()
+
+    too_far = {c: d for c, d in drift.items() if d > tolerance}
+    if too_far:
+        raise RuntimeError(
+            "Precision drift above tolerance "
+            f"{tolerance}: " + ", ".join(f"{c}={settings[c]} drift {d:.4f}"
+                                         for c, d in too_far.items())
+        )
+    return drift
@@ -1,77 +1,762 @@
 # --- predict.py --------------------------------------------------------------
 # removed: from __future__ import annotations
 
+import asyncio
+import inspect
+import itertools
+import math
 import os
-import torch
-import torchaudio
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from pathlib import Path
-from einops import rearrange
+from typing import Iterator
+
+from loading import (CONFIG_FILE, MODEL_DIR, WEIGHTS_FILE, PhaseTimer,
+                     build_model, has_snapshot, load_config, load_weights,
+                     snapshot_revision, use_local_snapshot)
+
+# A snapshot baked into the image keeps the HF libraries offline. This has
+# to happen before anything imports huggingface_hub or transformers.
+use_local_snapshot()
+
+import torch
 from cog import BasePredictor, Input
 from dotenv import load_dotenv
-from huggingface_hub import login
-from stable_audio_tools import get_pretrained_model
-from stable_audio_tools.inference.generation import generate_diffusion_cond
+from huggingface_hub import login, snapshot_download
+
+import compilation
+import longform
+import tracing
+from metrics import ServingMetrics
+from batching import MicroBatcher
+from buckets import DurationBuckets
+from conditioning_cache import ConditioningCache
+from convergence import ConvergenceMonitor
+from cpu_pool import CpuWorkerPool
+from encoding import FORMATS, LOSSLESS, SUFFIXES, EncoderPool
+from precision import apply_precision, settings_from_env
+from result_cache import ResultCache
+from scheduling import PRIORITIES, CostModel
+from sampling import decode_latents, generate_batch, resolve_seed
+from tiers import DEFAULT_TIER, Tier, load_tiers
+from variations import LatentCache, variation_tier
+
+MODEL_NAME = "stabilityai/stable-audio-open-1.0"
+MAX_DURATION = 120
+# Long-form requests are rendered in segments, so their cost grows
+# linearly with duration and they may run much longer. The model's
+# seconds_start/seconds_total conditioners clamp at 512, so segments past
+# that would all get the same timing conditioning
+MAX_LONGFORM_DURATION = 512
+
+# A couple of sampler steps on a short clip at the end of setup, so CUDA
+# kernels and the T5 encoder are initialised before the first request
+WARMUP_TIER = Tier("warm-up", steps=2)
+# One measured run after the warm-up gives the cost model its first point
+CALIBRATION_TIER = Tier("calibration", steps=8)
+
+
+def _split(text, sep):
+    """Split a batch input field, dropping blank entries."""
+    if not text:
+        return []
+    return [item.strip() for item in text.split(sep) if item.strip()]
+
+
+def parse_jobs(description, duration, prompts, durations, seeds, seed=-1,
+               long_form=False):
+    """Turn the predict inputs into parallel lists of prompts, durations and seeds.
+
+    Seeds are left unresolved: -1 still means "random". Durations above
+    MAX_DURATION are only accepted in long-form mode.
+    """
+    prompt_list = _split(prompts, "\n") or ([description] if description else [])
+    if not prompt_list:
+        raise ValueError("Provide either `description` or `prompts`.")
+
+    duration_list = [int(d) for d in _split(durations, ",")] or [duration] * len(prompt_list)
+    seed_list = [int(s) for s in _split(seeds, ",")] or [
+        -1 if seed == -1 else seed + i for i in range(len(prompt_list))
+    ]
+    for name, values in (("durations", duration_list), ("seeds", seed_list)):
+        if len(values) != len(prompt_list):
+            raise ValueError(
+                f"Got {len(values)} {name} for {len(prompt_list)} prompts."
+            )
+    limit = MAX_LONGFORM_DURATION if long_form else MAX_DURATION
+    for d in duration_list:
+        if not 1 <= d <= limit:
+            hint = "" if long_form else " (use long_form for longer clips)"
+            raise ValueError(f"Durations must be between 1 and {limit} seconds{hint}, got {d}.")
+
+    return prompt_list, duration_list, seed_list
 
 
 class Predictor(BasePredictor):
     def setup(self):
+        timer = PhaseTimer()
         load_dotenv(override=False)               # local .env convenience
-        token = (os.getenv("HUGGING_FACE_HUB_TOKEN")
-                 or os.getenv("HF_TOKEN"))
-        if not token:
-            raise RuntimeError(
-                "Set HUGGING_FACE_HUB_TOKEN (or HF_TOKEN) "
-                "in the env or in a .env file."
-            )
 
-        login(token=token)
-        self.model, self.model_config = get_pretrained_model(
-            "stabilityai/stable-audio-open-1.0"
-        )
-        self.sample_rate = self.model_config["sample_rate"]
-        self.sample_size = self.model_config["sample_size"]
-        
+        if has_snapshot():
+            model_dir = MODEL_DIR
+            self.model_version = f"{MODEL_NAME}@{snapshot_revision() or 'local'}"
+        else:
+            token = (os.getenv("HUGGING_FACE_HUB_TOKEN")
+                     or os.getenv("HF_TOKEN"))
+            if not token:
+                raise RuntimeError(
+                    "Set HUGGING_FACE_HUB_TOKEN (or HF_TOKEN) "
+                    "in the env or in a .env file, or bake in a snapshot "
+                    "with download_weights.py."
+                )
+            with timer.phase("auth"):
+                login(token=token)
+            with timer.phase("hub resolve"):
+                model_dir = snapshot_download(
+                    MODEL_NAME, allow_patterns=[CONFIG_FILE, WEIGHTS_FILE]
+                )
+            self.model_version = f"{MODEL_NAME}@{Path(model_dir).name}"
+
         # Set device
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = self.model.to(self.device)
 
-    def predict(
+        with timer.phase("config"):
+            self.model_config = load_config(model_dir)
+            self.model = build_model(self.model_config)
+
+        with timer.phase("weight load"):
+            load_weights(self.model, self.device, model_dir)
+        with timer.phase("device transfer"):
+            self.model = self.model.to(self.device).eval()
+
+        self.setup_runtime(timer)
+        self.metrics.record_setup(timer.phases)
+        print(timer.report())
+
+    def setup_runtime(self, timer=None):
+        """Everything after model loading: precision, caches, batcher, warm-up.
+
+        Expects `model`, `model_config`, `model_version` and `device` to be
+        set, so benchmarks can attach a stand-in model and reuse this.
+        """
+        timer = timer or PhaseTimer()
+        self.sample_rate = self.model_config["sample_rate"]
+        self.sample_size = self.model_config["sample_size"]
+
+        # Per-component fp16/bf16/int8, each checked for drift against fp32
+        self.precision = settings_from_env()
+        with timer.phase("precision"):
+            drift = apply_precision(self.model, self.device, self.precision)
+        for component, value in drift.items():
+            print(f"🔬 {component}: {self.precision[component]}, drift {value:.4f} vs fp32")
+
+        # Opt-in: VAE-decode long clips in overlapping windows of this many
+        # latent frames to cap peak memory. The crossfaded seams differ
+        # slightly from a single pass, so 0 (one pass) is the default
+        self.decode_chunk = int(os.getenv("VAE_DECODE_CHUNK", 0))
+        self.decode_overlap = int(os.getenv("VAE_DECODE_OVERLAP", 32))
+
+        # The sampler only runs at a few bucketed lengths, so batches and
+        # compiled graphs see a handful of shapes
+        self.buckets = DurationBuckets.from_env(self.model, self.sample_rate)
+
+        # Long-form requests are sampled in segments of this many seconds
+        # that overlap by a crossfade
+        self.segment_seconds = float(os.getenv("LONGFORM_SEGMENT_SECONDS", 30))
+        self.segment_overlap = float(os.getenv("LONGFORM_OVERLAP_SECONDS", 4))
+
+        self.tiers = load_tiers()
+        self.conditioning_cache = ConditioningCache.from_env(
+            namespace=f"{self.model_version}|t5={self.precision['t5']}"
+        )
+        self.result_cache = ResultCache.from_env()
+        # Final latents of recent generations, for cheap variations
+        self.latents = LatentCache.from_env()
+        self.encoder = EncoderPool.from_env()
+        # Previews decode here, so the sampler never waits for the VAE
+        self.preview_decoder = ThreadPoolExecutor(max_workers=1,
+                                                  thread_name_prefix="preview")
+
+        # Opt-in torch.compile; the warm-up below then compiles at each
+        # common duration so no request pays for it
+        warmup_durations = [1]
+        if compilation.enabled():
+            with timer.phase("compile"):
+                compilation.use_cache_dir()
+                compilation.compile_model(self.model)
+            warmup_durations = compilation.warmup_durations(
+                default=[math.ceil(e) for e in self.buckets.edges] or None)
+
+        # On CPU hosts batches can fan out to forked worker processes that
+        # share one copy of the weights (CPU_WORKERS). The fork has to
+        # happen before any serving threads start
+        self.pool = None
+        if self.device == "cpu":
+            with timer.phase("cpu workers"):
+                self.pool = CpuWorkerPool.from_env(self)
+            if self.pool is not None:
+                print(f"🧵 {len(self.pool)} CPU workers, "
+                      f"{self.pool.threads} threads each")
+
+        # Process-wide serving metrics, optionally scraped or logged
+        self.metrics = ServingMetrics()
+        self.metrics.add_source("conditioning_cache", lambda: {
+            "hits": self.conditioning_cache.hits,
+            "misses": self.conditioning_cache.misses})
+        self.metrics.add_source("result_cache", lambda: {
+            "hits": self.result_cache.hits,
+            "misses": self.result_cache.misses,
+            "coalesced": self.result_cache.coalesced})
+        self.metrics.add_source("latent_cache", lambda: {
+            "entries": len(self.latents),
+            "hits": self.latents.hits,
+            "misses": self.latents.misses})
+        if self.pool is not None:
+            self.metrics.add_source("cpu_pool", lambda: {
+                "workers": len(self.pool), "busy": self.pool.busy})
+        # Runtime estimates for admission control and job ordering
+        self.costs = CostModel()
+        self.metrics.add_source("cost_model", self.costs.snapshot)
+        self.metrics.start_from_env()
+
+        # Concurrent predictions are coalesced into batched sampler runs;
+        # only requests on the same latency tier share a run. With CPU
+        # workers, each worker can run a batch at the same time
+        self.batcher = MicroBatcher.from_env(
+            self._run_batch, self.sample_rate, self.sample_size,
+            concurrency=len(self.pool) if self.pool is not None else 1,
+        )
+
+        if os.getenv("WARMUP", "1") != "0" or compilation.enabled():
+            # Compiled graphs also need the batch sizes the batcher forms
+            batch_sizes = [1]
+            if compilation.enabled():
+                batch_sizes = compilation.warmup_batch_sizes(self.batcher.max_batch_size)
+            with timer.phase("warm-up"):
+                for duration, size in itertools.product(warmup_durations, batch_sizes):
+                    args = (["warm-up"] * size, [duration] * size, list(range(size)))
+                    if self.pool is not None:
+                        self.pool.broadcast("generate", *args, tier=WARMUP_TIER)
+                    else:
+                        self.generate(*args, tier=WARMUP_TIER)
+            with timer.phase("calibration"):
+                length = self.buckets.latent_length(self.sample_rate)
+                self._measure(
+                    lambda trace: self._call("generate", ["calibration"], [1], [0],
+                                             tier=CALIBRATION_TIER, trace=trace),
+                    length)
+
+    async def predict(
         self,
         description: str = Input(
+            default=None,
             description="Text prompt for the audio"),
         duration: int = Input(
-            default=8, ge=1, le=120,
-            description="Length of the generated audio in seconds"),
-    ) -> Path:
-        # Set up text and timing conditioning
+            default=8, ge=1, le=MAX_LONGFORM_DURATION,
+            description=f"Length of the generated audio in seconds (at most "
+                        f"{MAX_DURATION} unless `long_form` is set)"),
+        seed: int = Input(
+            default=-1,
+            description="Random seed; -1 picks one. Requests with a fixed "
+                        "seed are cached and can be served without rendering"),
+        prompts: str = Input(
+            default=None,
+            description="Batch mode: one prompt per line, rendered in a single "
+                        "diffusion pass. Overrides `description`"),
+        durations: str = Input(
+            default=None,
+            description="Batch mode: comma-separated durations in seconds, one "
+                        "per prompt (defaults to `duration` for every prompt)"),
+        seeds: str = Input(
+            default=None,
+            description="Batch mode: comma-separated seeds, one per prompt "
+                        "(-1 picks a random seed)"),
+        tier: str = Input(
+            default=DEFAULT_TIER,
+            description="Latency tier: draft, standard or high. Fewer "
+                        "sampler steps trade quality for speed"),
+        preview_every: int = Input(
+            default=0, ge=0,
+            description="Stream a rough preview every N sampler steps "
+                        "(0 disables), skipping steps while the last one is "
+                        "still decoding. Final files are always yielded last"),
+        output_format: str = Input(
+            default="wav", choices=FORMATS,
+            description="Audio file format (opus files are Ogg containers)"),
+        bitrate: int = Input(
+            default=192, ge=32, le=320,
+            description="Bitrate in kbps for mp3 and opus"),
+        bit_depth: int = Input(
+            default=16, choices=[16, 24],
+            description="Bits per sample for wav and flac"),
+        long_form: bool = Input(
+            default=False,
+            description=f"Render in overlapping, crossfaded segments, for clips "
+                        f"up to {MAX_LONGFORM_DURATION} s at a cost linear in "
+                        f"duration. Previews are not available"),
+        variation_of: str = Input(
+            default=None,
+            description="Generation id of an earlier output of this server (its "
+                        "file name without the extension) to make a variation "
+                        "of. Keeps its duration; the prompt defaults to its prompt"),
+        variation_strength: float = Input(
+            default=0.35, ge=0.05, le=1,
+            description="How far a variation may move from the original. It "
+                        "runs about this fraction of the tier's sampler steps"),
+        early_stop: float = Input(
+            default=0, ge=0, le=0.5,
+            description="Stop sampling once the denoised estimate changes by less "
+                        "than this fraction between steps, e.g. 0.01 (0 runs "
+                        "every step). The steps used are logged with the trace"),
+        priority: str = Input(
+            default="standard", choices=list(PRIORITIES),
+            description="Queue class. Shorter jobs go first within a class; "
+                        "interactive jumps ahead of standard and batch"),
+        deadline: float = Input(
+            default=0, ge=0,
+            description="Seconds the caller is willing to wait (0 for no limit). "
+                        "Work estimated to miss it runs on a cheaper tier, or "
+                        "is rejected when even the cheapest would be late"),
+        profile: bool = Input(
+            default=False,
+            description="Capture a torch profiler trace (Chrome trace JSON) of "
+                        "this request's sampler run and yield it after the audio"),
+    # cog keys streamed output off `Iterator`; its worker also drives
+    # async generators, so the async predict keeps this annotation
+    ) -> Iterator[Path]:
+        if tier not in self.tiers:
+            raise ValueError(
+                f"Unknown tier '{tier}', expected one of {sorted(self.tiers)}."
+            )
+        source = strength = None
+        if variation_of:
+            if long_form:
+                raise ValueError("Long-form clips cannot be varied.")
+            source = self.latents.get(variation_of)
+            if source is None:
+                raise ValueError(
+                    f"Unknown generation id '{variation_of}': it was not rendered "
+                    f"here or has expired. Render it again to vary it."
+                )
+            # A variation keeps the original's length; the prompt may change
+            description = description or source.prompt
+            duration, durations = source.duration, None
+            strength = variation_strength
+        prompt_list, duration_list, seed_list = parse_jobs(
+            description, duration, prompts, durations, seeds, seed, long_form
+        )
+        trace = tracing.RequestTrace()
+        if deadline:
+            requested = tier
+            tier = self.admit(tier, duration_list, long_form, PRIORITIES[priority],
+                              deadline, strength)
+            if tier != requested:
+                trace.attributes["downgraded_from"] = requested
+        trace.attributes.update(tier=tier, items=len(prompt_list),
+                                audio_seconds=sum(duration_list),
+                                longest=max(duration_list), priority=priority)
+        preset = self.tiers[tier]
+        if source is not None:
+            trace.attributes["variation_of"] = variation_of
+            preset = variation_tier(preset, strength)
+        profile = profile or os.getenv("PROFILE_REQUESTS", "0") == "1"
+
+        if output_format in LOSSLESS:
+            encoding = {"fmt": output_format, "bit_depth": bit_depth}
+        else:
+            encoding = {"fmt": output_format, "bitrate": bitrate}
+
+        sampler = asdict(preset)
+        if source is not None:
+            sampler["variation_of"] = variation_of
+        if early_stop:
+            sampler["early_stop"] = early_stop
+        if long_form:
+            # The segment layout and each segment's bucket shape the audio too
+            sampler.update(segment_seconds=self.segment_seconds,
+                           overlap_seconds=self.segment_overlap,
+                           buckets=self.buckets.lengths)
+
+        def length(d):
+            # The bucketed noise length shapes the audio
+            return None if long_form else self.buckets.latent_length(int(d * self.sample_rate))
+
+        # Items with a fixed seed are deterministic, so they are cacheable
+        keys = [
+            None if s == -1 else ResultCache.key(
+                model=self.model_version, precision=self.precision,
+                prompt=p, duration=d, seed=s, latent_length=length(d),
+                sampler=sampler, decode=(self.decode_chunk, self.decode_overlap),
+                encoding=encoding)
+            for p, d, s in zip(prompt_list, duration_list, seed_list)
+        ]
+        if profile:
+            # A profiled request has to actually render
+            keys = [None] * len(keys)
+        seed_list = [resolve_seed(s) for s in seed_list]
+
+        # Each output is named by its own generation id, which
+        # `variation_of` accepts. Outputs served from the result cache are
+        # aliased to the latents of the render they came from
+        ids = [uuid.uuid4().hex for _ in keys]
+        rendered = set()
+
+        # Predictions run concurrently, so each one writes to its own directory
+        out_dir = Path(tempfile.mkdtemp(prefix="prediction-"))
+        suffix = SUFFIXES[output_format]
+        outputs = [out_dir / f"{generation_id}{suffix}" for generation_id in ids]
+        # A profile path in the batch key keeps the profiled run to itself
+        profile_path = out_dir / "profile.json" if profile else None
+
+        loop = asyncio.get_running_loop()
+        previews = asyncio.Queue()
+
+        async def render(indices):
+            # One batch per bucket, so an item samples at its own bucket's
+            # length whatever else the request holds
+            groups = {}
+            for i in indices:
+                groups.setdefault(length(duration_list[i]), []).append(i)
+            await asyncio.gather(*(render_bucket(bucket, group)
+                                   for bucket, group in groups.items()))
+
+        async def render_bucket(bucket, indices):
+            job_durations = [duration_list[i] for i in indices]
+
+            decoding = None
+
+            def preview(step, denoised):
+                audio = self.decode(denoised)
+                loop.call_soon_threadsafe(previews.put_nowait, (step, indices, [
+                    self._normalize(item[:, :int(d * self.sample_rate)])
+                    for item, d in zip(audio, job_durations)
+                ]))
+
+            def on_step(info, rows):
+                # Runs on the sampler thread: hand this request's rows of the
+                # current denoised estimate to the preview thread, skipping
+                # the step while the last preview is still decoding
+                nonlocal decoding
+                step = info["i"] + 1
+                if step % preview_every or step >= preset.steps:
+                    return
+                if decoding is not None and not decoding.done():
+                    return
+                decoding = self.preview_decoder.submit(
+                    preview, step, info["denoised"][rows].clone())
+
+            # The step indices that can preview, so CPU workers relay no others
+            on_step.steps = frozenset(range(preview_every - 1, preset.steps - 1,
+                                            preview_every or 1))
+
+            # Only requests in the same duration bucket share a batch
+            variation = None if source is None else (source, strength)
+            results = await self.batcher.submit(
+                (tier, profile_path, long_form, bucket, variation, early_stop),
+                [prompt_list[i] for i in indices],
+                job_durations,
+                [seed_list[i] for i in indices],
+                on_step=on_step if preview_every and not long_form else None,
+                trace=trace,
+                priority=PRIORITIES[priority],
+                cost=self.estimate(tier, job_durations, long_form, strength) or 0.0,
+            )
+            audio = results
+            if self._keeps_latents(long_form):
+                audio = [waveform for waveform, _ in results]
+                for i, (_, latents) in zip(indices, results):
+                    self.latents.put(ids[i], latents, prompt_list[i], duration_list[i],
+                                     key=keys[i])
+                    rendered.add(i)
+            # Encoding runs on the pool while the sampler moves on
+            await asyncio.gather(*(
+                self.encoder.write(outputs[i], waveform, self.sample_rate,
+                                   trace=trace, **encoding)
+                for i, waveform in zip(indices, audio)
+            ))
+
+        task = asyncio.create_task(
+            self.result_cache.get_or_compute(keys, outputs, render)
+        )
+        while True:
+            getter = asyncio.ensure_future(previews.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            step, indices, audio = getter.result()
+            for i, waveform in zip(indices, audio):
+                preview = out_dir / f"preview_{step:03d}_{i}{suffix}"
+                yield await self.encoder.write(
+                    preview, waveform, self.sample_rate, **encoding
+                )
+
+        results = await task
+        if self._keeps_latents(long_form):
+            for i, key in enumerate(keys):
+                if key is not None and i not in rendered:
+                    self.latents.alias(ids[i], key)
+        steps = [span["steps"] for span in trace.spans if span["name"] == "sampling"]
+        if steps:
+            trace.attributes["steps_used"] = sum(steps)
+        trace.emit()
+        self.metrics.observe(trace)
+        for out in results:
+            yield out
+        if profile_path is not None and profile_path.exists():
+            yield profile_path
+
+    def estimate(self, tier, durations, long_form=False, strength=None):
+        """Estimated seconds to render `durations` on `tier`, or None before calibration.
+
+        With a variation `strength`, only the steps a variation runs count.
+        """
+        preset = self.tiers[tier]
+        if strength is not None:
+            preset = variation_tier(preset, strength)
+        steps = preset.steps
+        if not long_form:
+            length = self.buckets.latent_length(int(max(durations) * self.sample_rate))
+            return self.costs.estimate(length, steps)
+        total = 0.0
+        for duration in durations:
+            plan = longform.plan_segments(
+                int(duration * self.sample_rate),
+                int(self.segment_seconds * self.sample_rate),
+                int(self.segment_overlap * self.sample_rate))
+            for _, length in plan:
+                cost = self.costs.estimate(self.buckets.latent_length(length), steps)
+                if cost is None:
+                    return None
+                total += cost
+        return total
+
+    def admit(self, tier, durations, long_form, priority, deadline, strength=None):
+        """The tier to run on so the work should finish within `deadline` seconds.
+
+        Tries `tier`, then each cheaper tier. Raises ValueError when even
+        the cheapest would be late. Before calibration everything is admitted.
+        """
+        requested = self.tiers[tier]
+        candidates = [requested] + sorted(
+            (t for t in self.tiers.values() if t.steps < requested.steps),
+            key=lambda t: -t.steps)
+        for candidate in candidates:
+            cost = self.estimate(candidate.name, durations, long_form, strength)
+            if cost is None:
+                return tier
+            finish = self.batcher.backlog(priority, cost) + cost
+            if finish <= deadline:
+                if candidate is not requested:
+                    print(f"⏬ Downgraded from '{tier}' to '{candidate.name}' "
+                          f"to meet a {deadline:g}s deadline (est. {finish:.1f}s)")
+                return candidate.name
+        raise ValueError(
+            f"Cannot finish within {deadline:g}s: estimated {finish:.1f}s even on "
+            f"tier '{candidate.name}' with the current queue. Retry later or "
+            f"allow more time."
+        )
+
+    def _call(self, name, *args, local=False, **kwargs):
+        """Run a generate method in this process or on a CPU worker."""
+        if self.pool is None or local:
+            return getattr(self, name)(*args, **kwargs)
+        return self.pool.call(name, *args, **kwargs)
+
+    def _measure(self, run, length, trace=tracing.NULL_TRACE):
+        """Call `run(trace)` and feed its sampler time into the cost model."""
+        probe = tracing.RequestTrace()
+        result = run(trace.including(probe))
+        sampling = probe.stages().get("sampling")
+        if sampling:
+            # Early-stopped runs report the steps they actually took
+            steps = sum(span["steps"] for span in probe.spans if span["name"] == "sampling")
+            self.costs.observe(length, steps, sampling, probe.elapsed() - sampling)
+        return result
+
+    def _keeps_latents(self, long_form):
+        # Long-form clips are stitched from segments, so they cannot be varied
+        return self.latents.enabled and not long_form
+
+    def _run_batch(self, key, prompts, durations, seeds, callback, trace):
+        """MicroBatcher worker.
+
+        `key` is (tier, profile path or None, long form, bucket, variation,
+        early stop threshold), where variation is None or a (Source,
+        strength) pair.
+        """
+        tier, profile_path, long_form, bucket, variation, early_stop = key
+        # A profile only sees this process, so profiled runs stay here
+        local = profile_path is not None
+
+        preset = self.tiers[tier]
+        options = {"keep_latents": self._keeps_latents(long_form),
+                   "early_stop": early_stop}
+        if variation is not None:
+            source, strength = variation
+            preset = variation_tier(preset, strength)
+            options["init"] = source.latents
+
+        if long_form:
+            def run():
+                return [self._call("generate_long", p, d, s, tier=tier, trace=trace,
+                                   local=local, early_stop=early_stop)
+                        for p, d, s in zip(prompts, durations, seeds)]
+        elif local or callback is not None:
+            # Profiler and preview overhead would skew the cost model
+            def run():
+                return self._call("generate", prompts, durations, seeds, tier=preset,
+                                  callback=callback, trace=trace, local=local, **options)
+        else:
+            def run():
+                return self._measure(
+                    lambda traced: self._call("generate", prompts, durations, seeds,
+                                              tier=preset, trace=traced, **options),
+                    bucket, trace)
+
+        if profile_path is None:
+            return run()
+        with tracing.profile(profile_path):
+            return run()
+
+    def generate(self, prompts, durations, seeds, tier=DEFAULT_TIER, callback=None,
+                 trace=tracing.NULL_TRACE, init=None, keep_latents=False,
+                 early_stop=0):
+        """Render a batch of prompts in one diffusion call.
+
+        `callback` is passed to the sampler and called after every step.
+        `trace` records the stage spans. Returns one peak-normalized
+        float32 (channels, samples) CPU tensor per prompt.
+
+        With `init`, a (channels, length) latent, every item starts from it
+        rather than from pure noise (see variations.py). With
+        `keep_latents`, each result is an (audio, latents) pair instead; the
+        latents are on the CPU and trimmed to the item's own bucket. A
+        nonzero `early_stop` ends sampling once the batch has converged to
+        that threshold (see convergence.py).
+        """
+        # Set up text and timing conditioning, one entry per batch item
         conditioning = [{
-            "prompt": description,
-            "seconds_start": 0, 
+            "prompt": prompt,
+            "seconds_start": 0,
             "seconds_total": duration
-        }]
+        } for prompt, duration in zip(prompts, durations)]
+
+        # The batch shares one sequence length: sample at the bucket of the
+        # longest request and trim each item back to its own duration afterwards
+        length = self.buckets.latent_length(int(max(durations) * self.sample_rate))
+        noise = self.buckets.noise(self.model, seeds, length, self.device)
 
-        # Calculate sample size based on requested duration
-        target_sample_size = int(duration * self.sample_rate)
-        
         # Generate stereo audio
-        output = generate_diffusion_cond(
+        preset = tier if isinstance(tier, Tier) else self.tiers[tier]
+        if early_stop:
+            callback = ConvergenceMonitor(early_stop, preset.steps, callback)
+        latents = generate_batch(
             self.model,
-            steps=100,
-            cfg_scale=7,
-            conditioning=conditioning,
-            sample_size=target_sample_size,
-            sigma_min=0.3,
-            sigma_max=500,
-            sampler_type="dpmpp-3m-sde",
-            device=self.device
+            conditioning,
+            noise,
+            steps=preset.steps,
+            cfg_scale=preset.cfg_scale,
+            device=self.device,
+            cache=self.conditioning_cache,
+            return_latents=True,
+            callback=callback,
+            trace=trace,
+            init_data=None if init is None else init.expand(len(seeds), -1, -1),
+            seeds=seeds,
+            **preset.sampler_kwargs(),
+        )
+        with trace.span("vae_decode"):
+            output = self.decode(latents)
+
+        with trace.span("transfer"):
+            audio = [
+                self._normalize(item[:, :int(d * self.sample_rate)])
+                for item, d in zip(output, durations)
+            ]
+            if not keep_latents:
+                return audio
+            return [
+                (item, row[:, :self.buckets.latent_length(int(d * self.sample_rate))].cpu().clone())
+                for item, row, d in zip(audio, latents, durations)
+            ]
+
+    def generate_long(self, prompt, duration, seed, tier=DEFAULT_TIER,
+                      trace=tracing.NULL_TRACE, early_stop=0):
+        """Render one clip as overlapping segments (see longform.py).
+
+        Segment k is seeded with `seed + k` and conditioned on its offset
+        in the clip. With `early_stop`, each segment stops on its own.
+        Returns a peak-normalized float32 (channels, samples) CPU tensor
+        like `generate`.
+        """
+        preset = tier if isinstance(tier, Tier) else self.tiers[tier]
+        overlap = int(self.segment_overlap * self.sample_rate)
+        plan = longform.plan_segments(
+            int(duration * self.sample_rate),
+            int(self.segment_seconds * self.sample_rate), overlap
         )
+        def sample(k):
+            # Segments are bucketed too; decode trims each back to its length
+            start, length = plan[k]
+            seeds = [(seed + k) % 2**32]
+            noise = self.buckets.noise(
+                self.model, seeds, self.buckets.latent_length(length), self.device
+            )
+            return generate_batch(
+                self.model,
+                [{"prompt": prompt,
+                  "seconds_start": start / self.sample_rate,
+                  "seconds_total": duration}],
+                noise,
+                steps=preset.steps,
+                cfg_scale=preset.cfg_scale,
+                device=self.device,
+                cache=self.conditioning_cache,
+                return_latents=True,
+                callback=ConvergenceMonitor(early_stop, preset.steps) if early_stop else None,
+                trace=trace,
+                seeds=seeds,
+                **preset.sampler_kwargs(),
+            )
+
+        def decode(latents, k):
+            # Runs next to the sampler, so it must not touch its counters
+            with trace.span("vae_decode", cpu_only=True, segment=k):
+                return self.decode(latents)[0].float().cpu()
+
+        audio = longform.render(sample, decode, plan, overlap)
+        with trace.span("transfer"):
+            return self._normalize(audio)
+
+    def decode(self, latents):
+        """Decode latents to audio, in windows for long clips."""
+        return decode_latents(
+            self.model, latents, self.decode_chunk, self.decode_overlap
+        )
+
+    @staticmethod
+    def _normalize(audio):
+        # Peak normalize and clip; the encoder picks the sample format
+        return audio.to(torch.float32).div(torch.max(torch.abs(audio))).clamp(-1, 1).cpu()
+
+
+def predict_inputs(**overrides):
+    """Default value of every `predict` input, updated with `overrides`.
+
+    cog fills in defaults for its own calls; use this to call `predict`
+    directly from scripts.
+    """
+    params = inspect.signature(Predictor.predict).parameters
+    inputs = {name: p.default.default for name, p in params.items() if name != "self"}
+    inputs.update(overrides)
+    return inputs
 
-        # Rearrange audio batch to a single sequence
-        output = rearrange(output, "b d n -> d (b n)")
 
-        # Peak normalize, clip, convert to int16, and save to file
-        output = output.to(torch.float32).div(torch.max(torch.abs(output))).clamp(-1, 1).mul(32767).to(torch.int16).cpu()
-        
-        out = Path("output.wav")
-        torchaudio.save(str(out), output, self.sample_rate)
-        return out
+def run_prediction(predictor, **overrides):
+    """Run `predict` outside of cog and return every file it yields."""
+    async def collect():
+        return [out async for out in predictor.predict(**predict_inputs(**overrides))]
+    return asyncio.run(collect())
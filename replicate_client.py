@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Async client for running many predictions against the Replicate HTTP API.
+
+One pooled httpx.AsyncClient is shared by every request. In-flight
+predictions are capped by a semaphore and every HTTP call draws from a
+token bucket, so thousands of prompts can be submitted without tripping
+the API's rate limit. When the API answers 429 anyway, its Retry-After
+pauses the whole bucket, not only the request that got it.
+
+Transient failures (429, 5xx, connection errors, timeouts) are retried
+with full-jitter exponential backoff. POSTs are only retried when the
+request cannot have been acted on (429, 503, connect errors), so a
+retry never creates a duplicate prediction.
+
+Waiting polls with adaptive backoff: the interval starts short, grows
+while the prediction sits in the same state and snaps back when the
+state changes. Deadlines are plain asyncio timeouts, so they work in any
+task or thread (`run_blocking` gives worker threads their own loop).
+When a deadline expires, or the caller is cancelled, the prediction is
+cancelled on the server instead of being left running.
+
+`base_url` (or REPLICATE_API_BASE) points the client at any server that
+speaks the same API, e.g. a local stub in tests.
+
+httpx ships as a dependency of the `replicate` package the other client
+scripts already use.
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+from client_cache import GenerationCache
+from downloader import download
+
+# Load environment variables
+load_dotenv()
+
+API_BASE = "https://api.replicate.com/v1"
+MODEL_VERSION = "mgysel/stable-audio-open:d90a0c38317e1c4316732753a632dbc9757f4bcae7c16b0128e85e457014da71"
+
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+# Statuses where the server cannot have acted on the request
+NOT_PROCESSED_STATUS = {429, 503}
+TERMINAL_STATES = {"succeeded", "failed", "canceled"}
+
+
+class ReplicateError(Exception):
+    """A request failed for good: a non-retryable status or retries exhausted."""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class PredictionTimeout(ReplicateError):
+    """A prediction missed its deadline and was cancelled on the server."""
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(when.timestamp() - now, 0.0)
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `burst` saved up.
+
+    `pause(seconds)` empties the bucket and blocks every caller until the
+    pause is over, which is how a 429 Retry-After is honoured.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class ReplicateClient:
+    """Pooled, rate-limited async client for the predictions API.
+
+    Use as an async context manager:
+
+        async with ReplicateClient() as client:
+            outputs = await client.run_many(MODEL_VERSION, inputs)
+    """
+
+    def __init__(self, token=None, base_url=None, max_concurrency=8,
+                 rate=10.0, burst=None, max_retries=5, backoff=0.5,
+                 max_backoff=30.0, poll_interval=0.25, max_poll_interval=5.0,
+                 poll_growth=1.5, timeout=60.0):
+        self.token = token or os.getenv("REPLICATE_API_TOKEN")
+        self.base_url = (base_url or os.getenv("REPLICATE_API_BASE", API_BASE)).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.poll_growth = poll_growth
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.retries = 0
+        self.polls = 0
+        self.http = None
+
+    async def __aenter__(self):
+        headers = {"User-Agent": "stable-audio-open-client"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency * 2,
+                                max_keepalive_connections=self.max_concurrency * 2),
+            follow_redirects=True,
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+
+    def _delay(self, attempt):
+        # Full jitter: uniform over [0, capped exponential]
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def request(self, method, url, idempotent=None, **kwargs):
+        """Send one request with pacing and retries; returns the httpx.Response.
+
+        `idempotent` defaults to the method's HTTP semantics.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = e
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if not idempotent:
+                    raise ReplicateError(f"{method} {url} failed: {e}") from e
+                error = e
+            else:
+                status = response.status_code
+                if status < 400:
+                    return response
+                retryable = status in (TRANSIENT_STATUS if idempotent else NOT_PROCESSED_STATUS)
+                if not retryable or attempt == self.max_retries:
+                    raise ReplicateError(f"{method} {url} returned {status}",
+                                         status=status, body=response.text)
+                error = None
+                wait = parse_retry_after(response.headers.get("Retry-After"))
+                if status == 429 and wait is not None:
+                    # Everyone waits, not only this request
+                    self.bucket.pause(wait)
+                    self.retries += 1
+                    continue
+            if attempt == self.max_retries:
+                raise ReplicateError(f"{method} {url} failed: {error}") from error
+            self.retries += 1
+            await asyncio.sleep(self._delay(attempt))
+        raise AssertionError("unreachable")
+
+    async def create_prediction(self, version, input):
+        """Start a prediction. `version` may be "owner/name:version_id" or the id."""
+        response = await self.request("POST", "/predictions", json={
+            "version": version.split(":")[-1], "input": input,
+        })
+        return response.json()
+
+    async def get_prediction(self, prediction_id):
+        response = await self.request("GET", f"/predictions/{prediction_id}")
+        return response.json()
+
+    async def cancel(self, prediction_id):
+        """Ask the server to stop a prediction. Cancelling twice is harmless."""
+        response = await self.request("POST", f"/predictions/{prediction_id}/cancel",
+                                      idempotent=True)
+        return response.json()
+
+    async def wait(self, prediction):
+        """Poll until the prediction reaches a terminal state and return it.
+
+        The interval grows by `poll_growth` per unchanged poll, up to
+        `max_poll_interval`, and resets whenever the status changes.
+        """
+        interval = self.poll_interval
+        while prediction["status"] not in TERMINAL_STATES:
+            await asyncio.sleep(interval)
+            status = prediction["status"]
+            prediction = await self.get_prediction(prediction["id"])
+            self.polls += 1
+            if prediction["status"] == status:
+                interval = min(interval * self.poll_growth, self.max_poll_interval)
+            else:
+                interval = self.poll_interval
+        return prediction
+
+    async def _cancel_quietly(self, prediction_id):
+        try:
+            await asyncio.shield(self.cancel(prediction_id))
+        except (ReplicateError, asyncio.CancelledError):
+            pass
+
+    def _cancel_when_created(self, create):
+        # The caller gave up while the create request was in flight
+        if not create.cancelled() and create.exception() is None:
+            asyncio.ensure_future(self._cancel_quietly(create.result()["id"]))
+
+    async def run(self, version, input, timeout=None, prediction_id=None,
+                  on_created=None):
+        """Create a prediction, wait for it and return its output.
+
+        `timeout` is the deadline in seconds for the whole call. The create
+        request always runs to completion so that a prediction it started
+        can be cancelled. When the deadline passes, or this task is
+        cancelled, the prediction is cancelled on the server.
+
+        `prediction_id` attaches to a prediction started earlier instead
+        of creating one. `on_created(prediction)` is called as soon as the
+        prediction exists, e.g. to journal its id.
+
+        Raises PredictionTimeout on a missed deadline and ReplicateError
+        when the prediction fails or is canceled.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        async with self.semaphore:
+            if prediction_id is None:
+                create = asyncio.ensure_future(self.create_prediction(version, input))
+            else:
+                create = asyncio.ensure_future(self.get_prediction(prediction_id))
+            try:
+                prediction = await asyncio.shield(create)
+            except asyncio.CancelledError:
+                create.add_done_callback(self._cancel_when_created)
+                raise
+            if on_created is not None:
+                on_created(prediction)
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                prediction = await asyncio.wait_for(self.wait(prediction), remaining)
+            except asyncio.TimeoutError:
+                await self._cancel_quietly(prediction["id"])
+                raise PredictionTimeout(
+                    f"Prediction {prediction['id']} missed its {timeout}s deadline "
+                    "and was cancelled", body=prediction) from None
+            except asyncio.CancelledError:
+                await self._cancel_quietly(prediction["id"])
+                raise
+        if prediction["status"] != "succeeded":
+            raise ReplicateError(
+                f"Prediction {prediction['id']} {prediction['status']}: "
+                f"{prediction.get('error')}", body=prediction)
+        return prediction["output"]
+
+    async def run_many(self, version, inputs, timeout=None):
+        """Run every input concurrently (at most `max_concurrency` at a time).
+
+        `timeout` is a per-prediction deadline. Returns one entry per
+        input, in order: the output, or the exception that input failed
+        with.
+        """
+        return await asyncio.gather(
+            *(self.run(version, input, timeout) for input in inputs),
+            return_exceptions=True
+        )
+
+    async def download(self, url, path, sha256=None):
+        """Stream `url` to `path` over the pooled connection (see downloader.py)."""
+        return await download(self.http, url, path, sha256=sha256,
+                              max_retries=self.max_retries, backoff=self.backoff)
+
+
+def final_output(output):
+    """URL of the final audio file in a prediction's output.
+
+    predict yields previews (when `preview_every` is set) before the final
+    file and profile.json after it, so this is the last non-JSON entry.
+    """
+    if not isinstance(output, list):
+        return output
+    audio = [url for url in output if not urlparse(url).path.endswith(".json")]
+    if not audio:
+        raise ReplicateError(f"Prediction output has no audio file: {output}", body=output)
+    return audio[-1]
+
+
+def run_blocking(version, input, timeout=None, **client_options):
+    """Synchronous `run` for scripts and worker threads.
+
+    Uses an event loop private to the calling thread, so unlike
+    SIGALRM-based timeouts it works off the main thread.
+    """
+    async def go():
+        async with ReplicateClient(**client_options) as client:
+            return await client.run(version, input, timeout)
+    return asyncio.run(go())
+
+
+async def generate_many(prompts, duration=8, output_dir="generated_audio",
+                        timeout=None, cache=None, refresh=False, max_downloads=4,
+                        **client_options):
+    """Render every prompt on the deployed model and download the results.
+
+    Each output is downloaded as soon as its prediction finishes, before
+    its URL can expire, with at most `max_downloads` downloads at a time.
+    With a `GenerationCache`, prompts rendered before are copied from the
+    cache instead of re-run, and fresh downloads are added to it.
+    `refresh` skips the lookup but still stores the new results.
+    Returns one entry per prompt: the file path, or the error it hit.
+    """
+    inputs = [{"description": p, "duration": duration} for p in prompts]
+    paths = [Path(output_dir) / f"prompt_{i:04d}.wav" for i in range(len(prompts))]
+    results = list(paths)
+    todo = [
+        i for i in range(len(prompts))
+        if cache is None or refresh or not cache.fetch(MODEL_VERSION, inputs[i], paths[i])
+    ]
+    if not todo:
+        return results
+
+    downloads = asyncio.Semaphore(max_downloads)
+
+    async with ReplicateClient(**client_options) as client:
+        async def render(i):
+            url = final_output(await client.run(MODEL_VERSION, inputs[i], timeout))
+            async with downloads:
+                path = await client.download(url, paths[i])
+            if cache is not None:
+                cache.put(MODEL_VERSION, inputs[i], path)
+            return path
+
+        fetched = await asyncio.gather(*(render(i) for i in todo), return_exceptions=True)
+    for i, result in zip(todo, fetched):
+        results[i] = result
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Render many prompts on Replicate concurrently")
+    p.add_argument("prompts_file", help="Text file with one prompt per line")
+    p.add_argument("--duration", type=int, default=8, help="Duration in seconds")
+    p.add_argument("--concurrency", type=int, default=8, help="Predictions in flight")
+    p.add_argument("--rate", type=float, default=10.0, help="API requests per second")
+    p.add_argument("--downloads", type=int, default=4, help="Downloads in flight")
+    p.add_argument("--timeout", type=float, default=None,
+                   help="Per-prediction deadline in seconds; late predictions are cancelled")
+    p.add_argument("--output-dir", default="generated_audio", help="Where to save files")
+    p.add_argument("--no-cache", action="store_true", help="Do not use the local generation cache")
+    p.add_argument("--refresh", action="store_true",
+                   help="Re-render cached prompts and replace their cache entries")
+    args = p.parse_args()
+
+    cache = None if args.no_cache else GenerationCache.from_env()
+
+    prompts = [line.strip() for line in open(args.prompts_file) if line.strip()]
+    print(f"🚀 Rendering {len(prompts)} prompts, {args.concurrency} at a time")
+    results = asyncio.run(generate_many(
+        prompts, args.duration, args.output_dir, args.timeout, cache, args.refresh,
+        args.downloads, max_concurrency=args.concurrency, rate=args.rate,
+    ))
+    failed = [(prompt, r) for prompt, r in zip(prompts, results) if isinstance(r, Exception)]
+    print(f"✅ {len(prompts) - len(failed)} succeeded, ❌ {len(failed)} failed")
+    if cache is not None:
+        print(f"♻️  {cache.hits} served from the local cache")
+    for prompt, error in failed:
+        print(f"   '{prompt}': {error}")
@@ -0,0 +1,150 @@
+# --- result_cache.py ---------------------------------------------------------
+"""Content-addressed cache of rendered audio files.
+
+A result is keyed by everything that determines its bytes: model
+version, prompt, duration, seed and sampler settings. Files live in a
+local directory and the least recently used ones are deleted once the
+directory outgrows its byte budget. Identical requests that arrive while
+a matching one is still rendering wait for that render instead of
+starting their own. If the request that started a render is cancelled,
+one of the waiting requests takes the render over.
+
+Items with a random seed are never cached; they cannot repeat.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+
+class _Abandoned(Exception):
+    """Set on an in-flight entry whose owning request was cancelled."""
+
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=2 * 2**30):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured by RESULT_CACHE_* environment variables."""
+        return cls(
+            os.getenv("RESULT_CACHE_DIR", "/tmp/result-cache"),
+            max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", 2048)) * 2**20),
+        )
+
+    @staticmethod
+    def key(**fields):
+        raw = json.dumps(fields, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def lookup(self, key):
+        """Path of the cached file for `key`, or None."""
+        for path in self.directory.glob(f"{key}.*"):
+            if path.suffix == ".tmp":
+                continue
+            try:
+                os.utime(path)  # mtime doubles as the LRU clock
+            except FileNotFoundError:
+                return None
+            return path
+        return None
+
+    def store(self, key, src):
+        """Copy `src` into the cache and return the cached path."""
+        src = Path(src)
+        dest = self.directory / f"{key}{src.suffix}"
+        tmp = dest.with_name(dest.name + ".tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+        self._evict()
+        return dest
+
+    def _evict(self):
+        with self._lock:
+            files = [p for p in self.directory.iterdir() if p.suffix != ".tmp"]
+            stats = {p: p.stat() for p in files}
+            total = sum(s.st_size for s in stats.values())
+            for path in sorted(files, key=lambda p: stats[p].st_mtime):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= stats[path].st_size
+
+    async def get_or_compute(self, keys, outputs, compute):
+        """Fill `outputs[i]` for every key, rendering only what nobody else has.
+
+        `keys` may contain None for uncacheable items. `compute(indices)` is
+        awaited with the positions that need rendering and must write those
+        `outputs`. Cache hits and coalesced results are copied into place,
+        so callers never hold a path the cache might evict.
+        """
+        loop = asyncio.get_running_loop()
+        waiting = {}
+        owned = {}
+        todo = []
+
+        for i, key in enumerate(keys):
+            if key is None:
+                todo.append(i)
+            elif key in owned or key in self._inflight:
+                waiting[i] = owned.get(key) or self._inflight[key]
+                self.coalesced += 1
+            elif (hit := self.lookup(key)) is not None:
+                shutil.copyfile(hit, outputs[i])
+                self.hits += 1
+            else:
+                owned[key] = self._inflight[key] = loop.create_future()
+                todo.append(i)
+                self.misses += 1
+
+        if todo:
+            try:
+                await compute(todo)
+            except asyncio.CancelledError:
+                # Waiters from other requests still want the result
+                for key, future in owned.items():
+                    self._inflight.pop(key, None)
+                    if not future.done():
+                        future.set_exception(_Abandoned(key))
+                        future.exception()
+                raise
+            except Exception as e:
+                for key, future in owned.items():
+                    self._inflight.pop(key, None)
+                    future.set_exception(e)
+                    future.exception()  # consumed here; waiters re-raise it
+                raise
+            for i in todo:
+                key = keys[i]
+                if key is None or owned[key].done():
+                    continue
+                self.store(key, outputs[i])
+                self._inflight.pop(key, None)
+                owned[key].set_result(outputs[i])
+
+        orphaned = []
+        for i, future in waiting.items():
+            try:
+                shutil.copyfile(await future, outputs[i])
+            except _Abandoned:
+                orphaned.append(i)
+        if orphaned:
+            # The first waiter back claims each key again; the rest
+            # coalesce onto it
+            await self.get_or_compute(
+                [keys[i] for i in orphaned], [outputs[i] for i in orphaned],
+                lambda indices: compute([orphaned[j] for j in indices]),
+            )
+        return outputs
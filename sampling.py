@@ -0,0 +1,216 @@
+# --- sampling.py -------------------------------------------------------------
+"""Batched conditional diffusion for Stable Audio Open.
+
+Mirrors `generate_diffusion_cond` from stable_audio_tools, but takes the
+initial noise as an argument so every item in a batch can carry its own
+seed.
+
+The SDE samplers also draw fresh noise at every step. `sample_k` leaves
+that to a Brownian tree seeded from the global torch RNG, so the same
+seed rendered twice would give different audio. With `seeds`, each row
+gets its own Brownian tree seeded from its request seed instead.
+"""
+
+import inspect
+
+import k_diffusion as K
+import numpy as np
+import torch
+from stable_audio_tools.inference.sampling import sample_k
+
+from convergence import Converged
+from tracing import NULL_TRACE
+
+
+def latent_length(model, sample_size: int) -> int:
+    """Length of the sequence the diffusion model sees for `sample_size` audio samples."""
+    if model.pretransform is not None:
+        return sample_size // model.pretransform.downsampling_ratio
+    return sample_size
+
+
+def resolve_seed(seed: int) -> int:
+    """-1 means "pick one for me"; anything else is used as-is."""
+    if seed == -1:
+        return int(np.random.randint(0, 2**32 - 1, dtype=np.uint32))
+    return seed
+
+
+def make_noise(model, seeds, length: int, device, out=None) -> torch.Tensor:
+    """One noise row per seed.
+
+    Each row is drawn from its own CPU generator, so a row's starting
+    noise does not depend on the rest of the batch. Its audio is the same
+    alone or batched only when the batch shares its latent length and the
+    sampler's per-step noise is seeded too (see `generate_batch`). With
+    `out`, rows are copied into its leading rows and that view is returned.
+    """
+    rows = []
+    for seed in seeds:
+        gen = torch.Generator(device="cpu").manual_seed(seed)
+        rows.append(torch.randn([model.io_channels, length], generator=gen))
+    if out is None:
+        return torch.stack(rows).to(device)
+    out = out[:len(rows)]
+    out.copy_(torch.stack(rows))
+    return out
+
+
+# The k-diffusion samplers `sample_k` dispatches to by sampler_type
+K_SAMPLERS = {
+    "k-heun": K.sampling.sample_heun,
+    "k-lms": K.sampling.sample_lms,
+    "k-dpmpp-2s-ancestral": K.sampling.sample_dpmpp_2s_ancestral,
+    "k-dpm-2": K.sampling.sample_dpm_2,
+    "dpmpp-2m": K.sampling.sample_dpmpp_2m,
+    "dpmpp-2m-sde": K.sampling.sample_dpmpp_2m_sde,
+    "dpmpp-3m-sde": K.sampling.sample_dpmpp_3m_sde,
+}
+
+
+def sample_seeded(model_fn, noise, seeds, init_data=None, steps=100,
+                  sampler_type="dpmpp-2m-sde", sigma_min=0.01, sigma_max=100,
+                  rho=1.0, device="cuda", callback=None, **extra_args):
+    """`sample_k` with the per-step sampler noise seeded row by row.
+
+    A row's Brownian tree depends only on its own seed, so an item samples
+    the same whether it runs alone or in a batch. Sampler types outside
+    K_SAMPLERS are passed to `sample_k` unchanged.
+    """
+    sampler = K_SAMPLERS.get(sampler_type)
+    if sampler is None:
+        return sample_k(model_fn, noise, init_data=init_data, steps=steps,
+                        sampler_type=sampler_type, sigma_min=sigma_min,
+                        sigma_max=sigma_max, rho=rho, device=device,
+                        callback=callback, **extra_args)
+
+    denoiser = K.external.VDenoiser(model_fn)
+    sigmas = K.sampling.get_sigmas_polyexponential(steps, sigma_min, sigma_max, rho,
+                                                   device=device)
+    x = noise * sigmas[0]
+    if init_data is not None:
+        x = init_data + x
+    options = {}
+    if "noise_sampler" in inspect.signature(sampler).parameters:
+        options["noise_sampler"] = K.sampling.BrownianTreeNoiseSampler(
+            x, sigmas[sigmas > 0].min(), sigmas.max(), seed=list(seeds))
+    return sampler(denoiser, x, sigmas, disable=False, callback=callback,
+                   extra_args=extra_args, **options)
+
+
+@torch.no_grad()
+def generate_batch(
+    model,
+    conditioning: list,
+    noise: torch.Tensor,
+    steps: int,
+    cfg_scale: float,
+    device,
+    cache=None,
+    return_latents=False,
+    trace=NULL_TRACE,
+    init_data=None,
+    seeds=None,
+    **sampler_kwargs,
+) -> torch.Tensor:
+    """Run one diffusion pass over a batch and decode it to audio.
+
+    `conditioning` holds one dict per row of `noise`. With a
+    `ConditioningCache`, encoder outputs are reused across calls. Returns
+    a tensor of shape (batch, channels, samples), or the raw latents when
+    `return_latents` is set. `trace` records the conditioning and sampling
+    spans. With `init_data` (latents shaped like `noise`), sampling starts
+    from those latents plus noise at the schedule's first sigma instead of
+    from pure noise. With `seeds`, one per row, the sampler's own noise is
+    seeded too (see `sample_seeded`), so a seed always renders the same.
+
+    A step callback may raise `Converged` (see convergence.py) to stop
+    early. Its denoised estimate then stands in for the final latents.
+    The sampling span records the steps that actually ran, with the
+    planned count as `max_steps`.
+    """
+    with trace.span("conditioning"):
+        if cache is not None:
+            conditioning_tensors = cache.encode(model, conditioning, device)
+        else:
+            conditioning_tensors = model.conditioner(conditioning, device)
+    conditioning_inputs = model.get_conditioning_inputs(conditioning_tensors)
+
+    model_dtype = next(model.model.parameters()).dtype
+    conditioning_inputs = {
+        k: v.type(model_dtype) if v is not None else v
+        for k, v in conditioning_inputs.items()
+    }
+    if init_data is not None:
+        init_data = init_data.to(device=noise.device, dtype=model_dtype)
+    with trace.span("sampling", steps=steps) as span:
+        if seeds is None:
+            sample, seeded = sample_k, {}
+        else:
+            sample, seeded = sample_seeded, {"seeds": seeds}
+        try:
+            sampled = sample(
+                model.model,
+                noise.type(model_dtype),
+                init_data=init_data,
+                steps=steps,
+                **seeded,
+                **sampler_kwargs,
+                **conditioning_inputs,
+                cfg_scale=cfg_scale,
+                batch_cfg=True,
+                rescale_cfg=True,
+                device=device,
+            )
+        except Converged as stop:
+            sampled = stop.denoised
+            span.update(steps=stop.steps, max_steps=steps)
+
+    if return_latents:
+        return sampled
+    with trace.span("vae_decode"):
+        return decode_latents(model, sampled)
+
+
+def _fade(length, device):
+    return torch.linspace(0, 1, length + 2, device=device)[1:-1]
+
+
+@torch.no_grad()
+def decode_latents(model, latents: torch.Tensor, chunk_size: int = 0,
+                   overlap: int = 32) -> torch.Tensor:
+    """Latent diffusion: decode back to audio. A no-op for raw-audio models.
+
+    With `chunk_size` (in latent frames) the latents are decoded in
+    overlapping windows that are crossfaded together on the CPU, so peak
+    decoder memory depends on the chunk size rather than the duration.
+    0 decodes everything in one pass.
+    """
+    if model.pretransform is None:
+        return latents
+    latents = latents.to(next(model.pretransform.parameters()).dtype)
+    length = latents.shape[-1]
+    if not chunk_size or length <= chunk_size:
+        return model.pretransform.decode(latents)
+
+    overlap = min(overlap, chunk_size // 2)
+    ratio = model.pretransform.downsampling_ratio
+    hop = chunk_size - overlap
+    starts = list(range(0, length - overlap, hop))
+
+    output = None
+    for n, start in enumerate(starts):
+        end = min(start + chunk_size, length)
+        audio = model.pretransform.decode(latents[..., start:end]).float().cpu()
+        if output is None:
+            output = torch.zeros(*audio.shape[:-1], length * ratio)
+
+        # Linear crossfade over the overlap shared with each neighbour
+        fade = overlap * ratio
+        weight = torch.ones(audio.shape[-1])
+        if n > 0:
+            weight[:fade] = _fade(fade, weight.device)
+        if n < len(starts) - 1:
+            weight[-fade:] = _fade(fade, weight.device).flip(0)
+        output[..., start * ratio:start * ratio + audio.shape[-1]] += audio * weight
+    return output
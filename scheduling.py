@@ -0,0 +1,66 @@
+# --- scheduling.py -----------------------------------------------------------
+"""Runtime estimates and admission control for predictions.
+
+CostModel learns, per duration bucket (latent length), the sampler
+seconds per step and the fixed seconds around it: conditioning, decode
+and the transfer back. Each number is an exponentially weighted
+average of measured sampler runs. A request is then estimated as
+
+    overhead + steps * step_seconds
+
+using the nearest measured bucket, scaled linearly by latent length.
+Until the first run has been measured there is no estimate. A batched
+run is counted at the cost of one run; on a GPU, micro-batches of a few
+rows cost little more than one.
+
+PRIORITIES gives each request class a rank penalty in seconds for the
+micro-batcher's shortest-job-first queue (see batching.py). An
+interactive request is picked ahead of a standard one unless the
+standard one is that much shorter or has waited that much longer.
+"""
+
+import os
+import threading
+
+PRIORITIES = {
+    "interactive": 0.0,
+    "standard": float(os.getenv("PRIORITY_STANDARD_PENALTY", 30)),
+    "batch": float(os.getenv("PRIORITY_BATCH_PENALTY", 300)),
+}
+
+
+class CostModel:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.step_seconds = {}
+        self.overhead = {}
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def _update(self, table, length, value):
+        old = table.get(length)
+        table[length] = value if old is None else old + self.alpha * (value - old)
+
+    def observe(self, length, steps, sampling_seconds, other_seconds):
+        """Fold in one sampler run at `length` latent frames."""
+        with self._lock:
+            self._update(self.step_seconds, length, sampling_seconds / steps)
+            self._update(self.overhead, length, max(other_seconds, 0.0))
+            self.runs += 1
+
+    def estimate(self, length, steps):
+        """Estimated seconds for one run at `length` frames, or None before any run."""
+        with self._lock:
+            if not self.step_seconds:
+                return None
+            known = min(self.step_seconds, key=lambda k: (abs(k - length), -k))
+            scale = length / known
+            return scale * (self.overhead[known] + steps * self.step_seconds[known])
+
+    def snapshot(self):
+        """Calibration per latent length, e.g. for metrics."""
+        with self._lock:
+            return {"runs": self.runs, **{
+                f"step_seconds_{length}": seconds
+                for length, seconds in sorted(self.step_seconds.items())
+            }}
@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+MODEL_VERSION = "mgysel/stable-audio-open:d90a0c38317e1c4316732753a632dbc9757f4bcae7c16b0128e85e457014da71"
+
 def make_api_request(description: str, duration: int = 8):
     """
     Make a simple API request to Replicate
@@ -37,7 +39,7 @@ def make_api_request(description: str, duration: int = 8):
         # Use the model version directly
         print("🚀 Sending request to Replicate model...")
         prediction = replicate.predictions.create(
-            version="mgysel/stable-audio-open:d90a0c38317e1c4316732753a632dbc9757f4bcae7c16b0128e85e457014da71",
+            version=MODEL_VERSION,
             input={
                 "description": description,
                 "duration": duration
@@ -47,6 +49,9 @@ def make_api_request(description: str, duration: int = 8):
         print("⏳ Waiting for prediction to complete...")
         prediction.wait()
         output = prediction.output
+        # The model returns a list of files (one per prompt)
+        if isinstance(output, list):
+            output = output[0] if output else None
         
         print(f"✅ Success! Audio URL: {output}")
         return output
@@ -59,6 +64,9 @@ def download_audio(url: str, filename: str = "generated_audio.wav"):
     """
     Download audio from URL and save to file
     
+    The file is streamed to disk in chunks, resumed after interruptions
+    and renamed into place only once it is complete.
+    
     Args:
         url (str): URL to the audio file
         filename (str): Local filename to save as
@@ -66,32 +74,54 @@ def download_audio(url: str, filename: str = "generated_audio.wav"):
     Returns:
         str: Path to saved file, or None if failed
     """
-    import requests
+    from downloader import download_file
     
     try:
         print(f"📥 Downloading audio from: {url}")
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            # Create output directory
-            output_dir = Path("generated_audio")
-            output_dir.mkdir(exist_ok=True)
-            
-            # Save file
-            output_path = output_dir / filename
-            with open(output_path, "wb") as f:
-                f.write(response.content)
-            
-            print(f"💾 Audio saved to: {output_path}")
-            return str(output_path)
-        else:
-            print(f"❌ Download failed: {response.status_code}")
-            return None
+        output_path = download_file(url, Path("generated_audio") / filename)
+        print(f"💾 Audio saved to: {output_path}")
+        return str(output_path)
             
     except Exception as e:
         print(f"❌ Download error: {e}")
         return None
 
+def generate_audio(description: str, duration: int = 8, use_cache: bool = True):
+    """
+    Request audio and download it, reusing a local copy when the same
+    request was made before (see client_cache.py)
+    
+    Returns:
+        str: Path to the audio file, or None if failed
+    """
+    from client_cache import GenerationCache
+    
+    request_input = {"description": description, "duration": duration}
+    filename = f"{description}_{duration}s.wav"
+    cache = GenerationCache.from_env() if use_cache else None
+    
+    if cache is not None:
+        output_path = Path("generated_audio") / filename
+        if cache.fetch(MODEL_VERSION, request_input, output_path):
+            print(f"♻️  Cache hit, no prediction needed: {output_path}")
+            return str(output_path)
+    
+    # Make the API request
+    audio_url = make_api_request(description, duration)
+    if not audio_url:
+        print("\n❌ API request failed")
+        return None
+    
+    # Download the audio
+    local_file = download_audio(audio_url, filename)
+    if not local_file:
+        print("\n⚠️  API request succeeded but download failed")
+        return None
+    
+    if cache is not None:
+        cache.put(MODEL_VERSION, request_input, local_file)
+    return local_file
+
 if __name__ == "__main__":
     # Example usage
     description = "Noisia style neuro dnb bass at 170bpm"
@@ -100,17 +130,7 @@ if __name__ == "__main__":
     print("🎼 Stable Audio Open - API Request")
     print("=" * 40)
     
-    # Make the API request
-    audio_url = make_api_request(description, duration)
+    local_file = generate_audio(description, duration)
     
-    if audio_url:
-        # Download the audio
-        filename = f"{description}_{duration}s.wav"
-        local_file = download_audio(audio_url, filename)
-        
-        if local_file:
-            print(f"\n🎉 Complete! Audio file: {local_file}")
-        else:
-            print("\n⚠️  API request succeeded but download failed")
-    else:
-        print("\n❌ API request failed") 
\ No newline at end of file
+    if local_file:
+        print(f"\n🎉 Complete! Audio file: {local_file}") 
\ No newline at end of file
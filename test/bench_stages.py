@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Offline stage-level benchmark on a tiny stand-in model.
+
+Builds the real Predictor around the randomly initialised model from
+tiny_model.py (no tokens, no downloads) and times each stage of a
+prediction separately:
+  conditioning   prompt + timing conditioner forward
+  sampling       the whole sampler loop; sampling_step is the mean step
+  vae_decode     latents to audio
+  normalize      peak normalisation and the copy to CPU
+  encoding       in-memory encode of every item (wav by default)
+  file_write     writing the encoded bytes to disk
+
+Every combination of --durations, --batch-sizes and --steps is measured
+--repeats times after a warm-up, and the median per stage is kept. With
+--baseline, any stage slower than the baseline by more than --tolerance
+(and by more than --min-delta-ms, so tiny stages do not flap) fails the
+run with exit code 1. A baseline recorded in a different environment
+(Python, torch, CPU or thread count) is still compared, but regressions
+are only reported as warnings. Use --update-baseline to record a new
+baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import predict
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+# Load environment variables
+load_dotenv()
+
+PROMPT = "warm analog synth pad with soft drums"
+STAGES = ["conditioning", "sampling", "sampling_step", "vae_decode",
+          "normalize", "encoding", "file_write"]
+
+
+class _Encoded:
+    """Stands in for ConditioningCache so sampling reuses one conditioner run."""
+
+    def __init__(self, tensors):
+        self.tensors = tensors
+
+    def encode(self, model, conditioning, device):
+        return self.tensors
+
+
+def make_predictor(seed=0):
+    """A Predictor with the tiny model attached and every cache disabled."""
+    # Caches and warm-up would hide the stages being measured
+    os.environ["WARMUP"] = "0"
+    os.environ["COND_CACHE_MAX_ENTRIES"] = "0"
+    os.environ.setdefault("RESULT_CACHE_DIR", tempfile.mkdtemp(prefix="bench-results-"))
+
+    from predict import Predictor
+    from tiny_model import build_tiny_model
+
+    predictor = Predictor()
+    predictor.model, predictor.model_config = build_tiny_model(seed)
+    predictor.model_version = "tiny-stand-in"
+    predictor.device = "cpu"
+    predictor.setup_runtime()
+    return predictor
+
+
+def run_once(predictor, duration, batch_size, steps, fmt, out_dir):
+    """Time one prediction's stages. Returns {stage: seconds}."""
+    from encoding import encode
+    from sampling import generate_batch, latent_length, make_noise
+
+    model, device = predictor.model, predictor.device
+    tier = predictor.tiers["standard"]
+    conditioning = [{"prompt": f"{PROMPT} {i}", "seconds_start": 0,
+                     "seconds_total": duration} for i in range(batch_size)]
+    noise = make_noise(model, list(range(batch_size)),
+                       latent_length(model, duration * predictor.sample_rate), device)
+    times = {}
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        tensors = model.conditioner(conditioning, device)
+    times["conditioning"] = time.perf_counter() - start
+
+    step_times = []
+    start = time.perf_counter()
+    latents = generate_batch(
+        model, conditioning, noise, steps=steps, cfg_scale=tier.cfg_scale,
+        device=device, cache=_Encoded(tensors), return_latents=True,
+        callback=lambda info: step_times.append(time.perf_counter()),
+        **tier.sampler_kwargs(),
+    )
+    times["sampling"] = time.perf_counter() - start
+    times["sampling_step"] = (step_times[-1] - start) / len(step_times)
+
+    start = time.perf_counter()
+    audio = predictor.decode(latents)
+    times["vae_decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    audio = [predictor._normalize(item) for item in audio]
+    times["normalize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoded = [encode(item, predictor.sample_rate, fmt) for item in audio]
+    times["encoding"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, data in enumerate(encoded):
+        with open(out_dir / f"bench_{i}.{fmt}", "wb") as f:
+            f.write(data)
+    times["file_write"] = time.perf_counter() - start
+    return times
+
+
+def run_suite(predictor, durations, batch_sizes, step_counts, repeats, fmt):
+    """Return one result row per (duration, batch size, steps) case."""
+    out_dir = Path(tempfile.mkdtemp(prefix="bench-"))
+    # Warm-up so lazy initialisation does not land in the first case
+    run_once(predictor, 1, 1, 2, fmt, out_dir)
+
+    rows = []
+    for duration in durations:
+        for batch_size in batch_sizes:
+            for steps in step_counts:
+                runs = [run_once(predictor, duration, batch_size, steps, fmt, out_dir)
+                        for _ in range(repeats)]
+                stages = {s: statistics.median(r[s] for r in runs) for s in STAGES}
+                rows.append({"case": case_id(duration, batch_size, steps),
+                             "duration": duration, "batch_size": batch_size,
+                             "steps": steps, "stages": stages})
+                print(f"   {rows[-1]['case']:>14}: " + "  ".join(
+                    f"{s}={stages[s] * 1000:.1f}ms" for s in STAGES))
+    return rows
+
+
+def case_id(duration, batch_size, steps):
+    return f"d{duration}-b{batch_size}-s{steps}"
+
+
+def compare(rows, baseline, tolerance, min_delta):
+    """List every stage that is slower than the baseline beyond both limits."""
+    reference = {row["case"]: row["stages"] for row in baseline["cases"]}
+    regressions = []
+    for row in rows:
+        for stage, seconds in row["stages"].items():
+            before = reference.get(row["case"], {}).get(stage)
+            if before is None:
+                continue
+            if seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                regressions.append({"case": row["case"], "stage": stage,
+                                    "baseline": before, "current": seconds,
+                                    "ratio": seconds / before if before else float("inf")})
+    return regressions
+
+
+def environment():
+    return {"python": platform.python_version(), "torch": torch.__version__,
+            "machine": platform.machine(), "cpu": _cpu_model(),
+            "threads": torch.get_num_threads()}
+
+
+def environment_changes(current, recorded):
+    """List the environment keys whose values differ from the baseline's."""
+    recorded = recorded or {}
+    return [f"{key}: {recorded.get(key)} -> {value}" for key, value in current.items()
+            if recorded.get(key) != value]
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--durations", type=_ints, default=[1, 4], help="Comma-separated seconds")
+    p.add_argument("--batch-sizes", type=_ints, default=[1, 4], help="Comma-separated batch sizes")
+    p.add_argument("--steps", type=_ints, default=[4, 8], help="Comma-separated sampler step counts")
+    p.add_argument("--repeats", type=int, default=7, help="Runs per case; the median is kept")
+    p.add_argument("--format", default="wav", help="Output format for the encoding stage")
+    p.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    p.add_argument("--output-path", default="bench_results.json", help="JSON results path")
+    p.add_argument("--baseline", default=str(Path(__file__).parent / "bench_baseline.json"),
+                   help="Baseline JSON to compare against")
+    p.add_argument("--tolerance", type=float, default=0.25,
+                   help="Allowed slowdown per stage as a fraction of the baseline")
+    p.add_argument("--min-delta-ms", type=float, default=2.0,
+                   help="Slowdowns smaller than this never count as regressions")
+    p.add_argument("--update-baseline", action="store_true",
+                   help="Write the results to --baseline instead of comparing")
+    args = p.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    print("🧪 Stage Benchmark (tiny stand-in model, CPU)")
+    print("=" * 50)
+    predictor = make_predictor()
+    rows = run_suite(predictor, args.durations, args.batch_sizes, args.steps,
+                     args.repeats, args.format)
+    results = {"environment": environment(), "cases": rows}
+    changes = []
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"\n💾 Baseline saved to: {baseline_path}")
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        changes = environment_changes(results["environment"], baseline.get("environment"))
+        results["baseline"] = {"path": str(baseline_path),
+                               "environment": baseline.get("environment"),
+                               "environment_changes": changes}
+        results["regressions"] = compare(rows, baseline, args.tolerance,
+                                         args.min_delta_ms / 1000)
+        if changes:
+            print("\n⚠️  Baseline was recorded in a different environment, "
+                  "regressions are warnings only:")
+            for change in changes:
+                print(f"   {change}")
+    else:
+        print(f"\n⚠️  No baseline at {baseline_path}, nothing to compare against")
+
+    Path(args.output_path).write_text(json.dumps(results, indent=2))
+    print(f"💾 Results saved to: {args.output_path}")
+
+    regressions = results.get("regressions", [])
+    if regressions:
+        mark = "⚠️ " if changes else "❌"
+        print(f"\n{mark} {len(regressions)} stage regression(s) beyond {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"   {r['case']:>14} {r['stage']:<14} {r['baseline'] * 1000:8.1f}ms "
+                  f"-> {r['current'] * 1000:8.1f}ms  x{r['ratio']:.2f}")
+        sys.exit(0 if changes else 1)
+    if "regressions" in results:
+        print("\n✅ No stage regressed past the baseline")
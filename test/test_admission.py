@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for deadline admission in predict.py: a request runs on the tier
+it asked for when that is on time, drops to a cheaper tier when not, is
+rejected when nothing is on time, and is always admitted before the cost
+model is calibrated. The cost model and the queue are stubbed, so no
+model is needed. Runs under pytest or directly.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the predictor
+sys.path.append(str(Path(__file__).parent.parent))
+
+from predict import Predictor
+from tiers import TIERS
+
+
+class StubCosts:
+    """`per_step` seconds per sampler step, or uncalibrated when None."""
+
+    def __init__(self, per_step):
+        self.per_step = per_step
+
+    def estimate(self, length, steps):
+        return None if self.per_step is None else steps * self.per_step
+
+
+class StubBatcher:
+    def __init__(self, backlog):
+        self.queued = backlog
+        self.asked = []
+
+    def backlog(self, priority, cost):
+        self.asked.append((priority, cost))
+        return self.queued
+
+
+class StubBuckets:
+    def latent_length(self, samples):
+        return samples
+
+
+def _predictor(per_step=0.1, backlog=0.0):
+    predictor = Predictor.__new__(Predictor)
+    predictor.tiers = dict(TIERS)
+    predictor.costs = StubCosts(per_step)
+    predictor.batcher = StubBatcher(backlog)
+    predictor.buckets = StubBuckets()
+    predictor.sample_rate = 10
+    predictor.segment_seconds, predictor.segment_overlap = 30, 4
+    return predictor
+
+
+def test_requested_tier_when_on_time():
+    # high: 100 steps at 0.1 s is 10 s, plus 5 s of queue
+    predictor = _predictor(backlog=5.0)
+    assert predictor.admit("high", [8], False, 0.0, deadline=15) == "high"
+    assert predictor.batcher.asked == [(0.0, 10.0)]
+
+
+def test_downgrades_to_the_best_tier_on_time():
+    predictor = _predictor(backlog=5.0)
+    # standard takes 5 + 5 s, draft 2 + 5 s
+    assert predictor.admit("high", [8], False, 0.0, deadline=12) == "standard"
+    assert predictor.admit("high", [8], False, 0.0, deadline=8) == "draft"
+    # Never upgrades
+    assert predictor.admit("draft", [8], False, 0.0, deadline=100) == "draft"
+
+
+def test_rejects_when_even_the_cheapest_is_late():
+    predictor = _predictor(backlog=30.0)
+    try:
+        predictor.admit("high", [8], False, 0.0, deadline=10)
+    except ValueError as e:
+        assert "'draft'" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_long_form_counts_every_segment():
+    predictor = _predictor()
+    # 60 s in 30 s segments overlapping by 4 s is three segments; the stub
+    # prices each at 10 s on high and 2 s on draft
+    assert abs(predictor.estimate("high", [60], long_form=True) - 30) < 1e-9
+    assert predictor.admit("high", [60], True, 0.0, deadline=7) == "draft"
+
+
+def test_everything_is_admitted_before_calibration():
+    predictor = _predictor(per_step=None, backlog=1000.0)
+    assert predictor.estimate("high", [8]) is None
+    assert predictor.admit("high", [8], False, 0.0, deadline=1) == "high"
+
+
+if __name__ == "__main__":
+    print("🧪 Admission tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
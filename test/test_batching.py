@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the micro-batcher in batching.py: what arrives within the
+collect window shares a sampler run, the batch limits split it up, and
+each caller gets back its own slice of the results. Uses a fake batch
+runner, so no model is needed. Runs under pytest or directly.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import the batcher
+sys.path.append(str(Path(__file__).parent.parent))
+
+from batching import MicroBatcher
+
+
+def _serve(requests, stagger=0.0, **limits):
+    """Submit (key, prompts, durations) requests, `stagger` seconds apart.
+
+    Returns each request's results and the prompts of every sampler run.
+    """
+    runs = []
+
+    def run_batch(key, prompts, durations, seeds, callback, trace):
+        runs.append(list(prompts))
+        return [f"{key}:{p}:{s}" for p, s in zip(prompts, seeds)]
+
+    async def go():
+        batcher = MicroBatcher(run_batch, 10, **limits)
+        tasks = []
+        for n, (key, prompts, durations) in enumerate(requests):
+            if n and stagger:
+                await asyncio.sleep(stagger)
+            seeds = list(range(len(prompts)))
+            tasks.append(asyncio.create_task(batcher.submit(key, prompts, durations, seeds)))
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(go()), runs
+
+
+def test_requests_in_the_window_share_a_run():
+    results, runs = _serve([("k", ["a", "b"], [1, 1]), ("k", ["c"], [1])], max_wait_ms=50)
+    assert runs == [["a", "b", "c"]]
+    # Every caller gets its own slice back, in order
+    assert results == [["k:a:0", "k:b:1"], ["k:c:0"]]
+
+    # A request that arrives after the window closed gets its own run
+    _, runs = _serve([("k", ["a"], [1]), ("k", ["b"], [1])], stagger=0.05, max_wait_ms=5)
+    assert runs == [["a"], ["b"]]
+
+
+def test_only_equal_keys_share_a_run():
+    results, runs = _serve([("x", ["a"], [1]), ("y", ["b"], [1]), ("x", ["c"], [1])],
+                           max_wait_ms=50)
+    assert sorted(runs) == [["a", "c"], ["b"]]
+    assert results == [["x:a:0"], ["y:b:0"], ["x:c:0"]]
+
+
+def test_batch_limits():
+    requests = [("k", [p], [1]) for p in "abcde"]
+    _, runs = _serve(requests, max_wait_ms=50, max_batch_size=2)
+    assert runs == [["a", "b"], ["c", "d"], ["e"]]
+
+    # 10 samples per second: three 2 s items fit in 60 samples, a 4 s one
+    # pads the batch past it
+    requests = [("k", ["a"], [2]), ("k", ["b"], [2]), ("k", ["c"], [4]), ("k", ["d"], [2])]
+    _, runs = _serve(requests, max_wait_ms=50, max_total_samples=60)
+    assert runs == [["a", "b", "d"], ["c"]]
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def run_batch(key, prompts, durations, seeds, callback, trace):
+        raise RuntimeError("out of memory")
+
+    async def go():
+        batcher = MicroBatcher(run_batch, 10, max_wait_ms=50)
+        return await asyncio.gather(batcher.submit("k", ["a"], [1], [0]),
+                                    batcher.submit("k", ["b"], [1], [0]),
+                                    return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(go())] == ["out of memory"] * 2
+
+
+def test_step_callback_routes_rows_and_merges_steps():
+    seen = []
+
+    def listener(name, steps=None):
+        def on_step(info, rows):
+            seen.append((name, info["i"], rows))
+        if steps is not None:
+            on_step.steps = frozenset(steps)
+        return on_step
+
+    def request(n, on_step):
+        return SimpleNamespace(prompts=["p"] * n, on_step=on_step)
+
+    callback = MicroBatcher._step_callback([request(2, listener("a", {1})),
+                                            request(1, None),
+                                            request(1, listener("b", {3}))])
+    callback({"i": 1})
+    assert seen == [("a", 1, slice(0, 2)), ("b", 1, slice(3, 4))]
+    assert callback.steps == {1, 3}
+    # A listener without `steps` needs every step
+    callback = MicroBatcher._step_callback([request(1, listener("a", {1})),
+                                            request(1, listener("c"))])
+    assert not hasattr(callback, "steps")
+
+
+def test_survives_a_new_event_loop():
+    def run_batch(key, prompts, durations, seeds, callback, trace):
+        return list(prompts)
+
+    batcher = MicroBatcher(run_batch, 10, max_wait_ms=0)
+    for prompt in ("a", "b"):
+        assert asyncio.run(asyncio.wait_for(
+            batcher.submit("k", [prompt], [1], [0]), 5)) == [prompt]
+
+
+if __name__ == "__main__":
+    print("🧪 Micro-batcher tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
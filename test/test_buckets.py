@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for buckets.py: durations round up to a fixed set of latent
+lengths, and noise is written into one reused buffer per length without
+changing its values. Runs under pytest or directly.
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+
+# Add the parent directory to the path so we can import the buckets
+sys.path.append(str(Path(__file__).parent.parent))
+
+from buckets import DurationBuckets
+from sampling import make_noise
+
+SAMPLE_RATE = 44100
+RATIO = 2048
+
+
+def _model(dtype=torch.float32):
+    return SimpleNamespace(model=torch.nn.Linear(2, 2).to(dtype), io_channels=4,
+                           pretransform=SimpleNamespace(downsampling_ratio=RATIO))
+
+
+def test_durations_round_up_to_buckets():
+    buckets = DurationBuckets([10, 30], SAMPLE_RATE, RATIO, granule=32)
+    ten, thirty = buckets.lengths
+    assert ten == buckets.frames(10 * SAMPLE_RATE) and ten * RATIO >= 10 * SAMPLE_RATE
+    # Every duration up to an edge shares that edge's shape
+    assert {buckets.latent_length(d * SAMPLE_RATE) for d in range(1, 11)} == {ten}
+    assert {buckets.latent_length(d * SAMPLE_RATE) for d in range(11, 31)} == {thirty}
+    # Past the last edge lengths step by the granule
+    beyond = buckets.latent_length(31 * SAMPLE_RATE)
+    assert beyond % 32 == 0 and beyond * RATIO >= 31 * SAMPLE_RATE
+
+    exact = DurationBuckets([], SAMPLE_RATE, RATIO)
+    assert exact.latent_length(8 * SAMPLE_RATE) == buckets.frames(8 * SAMPLE_RATE)
+
+
+def test_noise_reuses_one_buffer_per_length():
+    model = _model()
+    buckets = DurationBuckets([10], SAMPLE_RATE, RATIO)
+    length = buckets.lengths[0]
+    first = buckets.noise(model, [1, 2], length, "cpu")
+    pointer = first.data_ptr()
+    assert torch.equal(first, make_noise(model, [1, 2], length, "cpu"))
+
+    again = buckets.noise(model, [3], length, "cpu")
+    assert again.data_ptr() == pointer and again.shape == (1, 4, length)
+    assert torch.equal(again, make_noise(model, [3], length, "cpu"))
+
+    # More rows than the buffer holds grows it once
+    grown = buckets.noise(model, [1, 2, 3], length, "cpu")
+    assert grown.shape[0] == 3
+    assert buckets.noise(model, [5, 6], length, "cpu").data_ptr() == grown.data_ptr()
+
+
+def test_noise_buffer_follows_model_dtype():
+    model = _model(torch.float16)
+    buckets = DurationBuckets([10], SAMPLE_RATE, RATIO)
+    noise = buckets.noise(model, [7], buckets.lengths[0], "cpu")
+    assert noise.dtype == torch.float16
+    assert torch.equal(noise, make_noise(model, [7], buckets.lengths[0], "cpu").half())
+
+
+if __name__ == "__main__":
+    print("🧪 Duration bucket tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk_runner.py: manifest parsing, and resuming from the journal
+against the local stub API without resubmitting finished work. Runs under
+pytest or directly.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the runner
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from bulk_runner import Item, Journal, load_manifest, percentile, run_manifest
+from test_replicate_client import AUDIO, StubAPI
+
+
+def _write(name, text):
+    path = Path(tempfile.mkdtemp()) / name
+    path.write_text(text)
+    return path
+
+
+def _run(stub, items, output_dir, journal_path, **options):
+    journal = Journal(journal_path)
+    try:
+        return asyncio.run(run_manifest(
+            items, output_dir, journal, parallel=3, token="test",
+            base_url=stub.base_url, poll_interval=0.01, backoff=0.01, **options
+        ))
+    finally:
+        journal.close()
+
+
+def test_load_manifest_csv_and_jsonl():
+    items = load_manifest(_write("m.csv", "id,prompt,duration,seed\n"
+                                          "kick,909 kick,2,7\n"
+                                          ",pad,,\n"), duration=5)
+    assert items[0] == Item("kick", {"description": "909 kick", "duration": 2, "seed": 7})
+    assert items[1] == Item("000001", {"description": "pad", "duration": 5})
+
+    items = load_manifest(_write("m.jsonl", '{"description": "a/b", "output_format": "mp3"}\n\n'))
+    assert items == [Item("000000", {"description": "a/b", "output_format": "mp3", "duration": 8})]
+    assert items[0].filename == "000000.mp3"
+    assert Item("a/b c", {}).filename == "a_b_c.wav"
+    # The server writes opus into an Ogg container
+    assert Item("x", {"output_format": "opus"}).filename == "x.ogg"
+
+
+def test_load_manifest_coerces_input_types():
+    items = load_manifest(_write("m.csv", "prompt,duration,early_stop,variation_strength,"
+                                          "deadline,long_form,profile\n"
+                                          "pad,40,0.01,0.5,30,true,0\n"
+                                          "kick,2,0,1,1.5,False,yes\n"))
+    assert items[0].input == {"description": "pad", "duration": 40, "early_stop": 0.01,
+                              "variation_strength": 0.5, "deadline": 30.0,
+                              "long_form": True, "profile": False}
+    second = items[1].input
+    assert second["long_form"] is False and second["profile"] is True
+    assert type(second["early_stop"]) is float and type(second["deadline"]) is float
+
+    items = load_manifest(_write("m.jsonl", '{"prompt": "a", "early_stop": "0.02", '
+                                            '"long_form": "1", "seed": "7"}\n'))
+    assert items[0].input == {"description": "a", "early_stop": 0.02, "long_form": True,
+                              "seed": 7, "duration": 8}
+
+    try:
+        load_manifest(_write("m.csv", "prompt,long_form\npad,maybe\n"))
+    except ValueError as e:
+        assert "row 1" in str(e) and "long_form" in str(e)
+    else:
+        raise AssertionError("long_form=maybe should be rejected")
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([4, 1, 3, 2], 50) == 2
+    assert percentile(range(1, 101), 99) == 99
+
+
+def test_rerun_skips_done_and_retries_failed():
+    stub = StubAPI(polls_until_done=1)
+    items = [Item(str(i), {"description": f"prompt {i}", "duration": 1}) for i in range(6)]
+    output_dir = Path(tempfile.mkdtemp())
+    journal = output_dir / "journal.jsonl"
+    try:
+        stub.fail("POST /v1/predictions", 422)
+        first = _run(stub, items, output_dir, journal)
+        assert first["done"] == 5 and first["failed"] == 1
+        assert first["latency"]["p50"] is not None
+
+        second = _run(stub, items, output_dir, journal)
+        assert second["skipped"] == 5 and second["done"] == 1 and second["failed"] == 0
+        # 6 accepted predictions in total plus the one rejected POST
+        assert stub.count("POST", "/v1/predictions") == 7
+        assert all((output_dir / f"{i}.wav").read_bytes() == AUDIO for i in range(6))
+
+        # A changed input is new work even though its id was journaled
+        items[0] = Item("0", {"description": "prompt 0", "duration": 2})
+        third = _run(stub, items, output_dir, journal)
+        assert third["skipped"] == 5 and third["done"] == 1
+    finally:
+        stub.close()
+
+
+def test_crash_reattaches_to_running_prediction():
+    stub = StubAPI(polls_until_done=2)
+    items = [Item("a", {"description": "pad", "duration": 1}),
+             Item("b", {"description": "bass", "duration": 1})]
+    output_dir = Path(tempfile.mkdtemp())
+    journal = output_dir / "journal.jsonl"
+    try:
+        async def start():
+            from replicate_client import ReplicateClient
+            async with ReplicateClient(token="test", base_url=stub.base_url) as client:
+                return await client.create_prediction("owner/model:abc", items[0].input)
+        prediction = asyncio.run(start())
+        # What a crashed run leaves behind, including a half-written last line
+        journal.write_text(
+            json.dumps({"id": "a", "status": "submitted", "prediction": prediction["id"],
+                        "input": items[0].input}) + "\n" + '{"id": "b", "sta'
+        )
+
+        summary = _run(stub, items, output_dir, journal)
+        assert summary["done"] == 2 and summary["reattached"] == 1
+        # Only item b needed a new prediction
+        assert stub.count("POST", "/v1/predictions") == 2
+        entries = [json.loads(line) for line in journal.read_text().splitlines()[2:]]
+        assert {e["id"] for e in entries if e["status"] == "done"} == {"a", "b"}
+    finally:
+        stub.close()
+
+
+def test_failed_download_reuses_the_prediction():
+    stub = StubAPI(polls_until_done=1)
+    items = [Item("a", {"description": "pad", "duration": 1})]
+    output_dir = Path(tempfile.mkdtemp())
+    journal = output_dir / "journal.jsonl"
+    try:
+        # The second 404 is the known URL having expired by the next run
+        stub.fail("GET /v1/files", 404, 404)
+        first = _run(stub, items, output_dir, journal)
+        assert first["failed"] == 1
+        failed = json.loads(journal.read_text().splitlines()[-1])
+        assert failed["prediction"] == "p0" and failed["output"].endswith("/p0.wav")
+
+        second = _run(stub, items, output_dir, journal)
+        assert second["done"] == 1 and second["reattached"] == 1
+        # The paid prediction handed out its URL again, nothing was resubmitted
+        assert stub.count("POST", "/v1/predictions") == 1
+        assert stub.count("GET", "/v1/files/") == 3
+        assert (output_dir / "a.wav").read_bytes() == AUDIO
+    finally:
+        stub.close()
+
+
+
+def test_downloads_the_final_output():
+    stub = StubAPI(polls_until_done=1)
+    items = [Item("a", {"description": "pad", "duration": 1, "preview_every": 2,
+                        "profile": True}),
+             Item("b", {"description": "kick", "duration": 1, "output_format": "opus"})]
+    output_dir = Path(tempfile.mkdtemp())
+    try:
+        summary = _run(stub, items, output_dir, output_dir / "journal.jsonl")
+        assert summary["done"] == 2
+        # Not a preview and not profile.json
+        assert (output_dir / "a.wav").read_bytes() == AUDIO
+        assert (output_dir / "b.ogg").read_bytes() == AUDIO
+        entries = [json.loads(line) for line in (output_dir / "journal.jsonl").open()]
+        urls = {e["id"]: e["output"] for e in entries if e["status"] == "succeeded"}
+        assert urls["a"].endswith(".wav") and "preview" not in urls["a"]
+        assert urls["b"].endswith(".ogg")
+    finally:
+        stub.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Bulk runner tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for client_cache.py, including a repeat batch against the local
+stub API that must not start any new predictions. Runs under pytest or
+directly.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the cache
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from client_cache import DEFAULT_INPUTS, INPUT_TYPES, GenerationCache
+from replicate_client import generate_many
+from test_replicate_client import AUDIO, StubAPI
+
+VERSION = "owner/model:abc"
+
+
+def _file(size, name="audio.wav"):
+    path = Path(tempfile.mkdtemp()) / name
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_round_trip_and_index_survives_restart():
+    directory = tempfile.mkdtemp()
+    cache = GenerationCache(directory)
+    request = {"description": "pad", "duration": 8}
+    assert cache.get(VERSION, request) is None
+    cache.put(VERSION, request, _file(100))
+
+    reopened = GenerationCache(directory)
+    dest = Path(tempfile.mkdtemp()) / "out.wav"
+    assert reopened.fetch(VERSION, request, dest) and dest.stat().st_size == 100
+    # Any input that differs is a different entry
+    assert reopened.get(VERSION, {**request, "duration": 9}) is None
+    assert reopened.get("owner/model:other", request) is None
+    assert (reopened.hits, reopened.misses) == (1, 2)
+
+
+def test_lru_eviction_by_size():
+    cache = GenerationCache(tempfile.mkdtemp(), max_bytes=250)
+    for i in range(3):
+        cache.put(VERSION, {"description": str(i)}, _file(100))
+        time.sleep(0.01)
+        if i == 1:
+            cache.get(VERSION, {"description": "0"})  # 0 is now fresher than 1
+    assert cache.get(VERSION, {"description": "1"}) is None
+    assert cache.get(VERSION, {"description": "0"}) is not None
+    assert cache.get(VERSION, {"description": "2"}) is not None
+
+
+def test_missing_file_is_a_miss():
+    directory = tempfile.mkdtemp()
+    cache = GenerationCache(directory)
+    path = cache.put(VERSION, {"description": "pad"}, _file(10))
+    path.unlink()
+    assert GenerationCache(directory).get(VERSION, {"description": "pad"}) is None
+
+
+def test_explicit_defaults_share_a_key():
+    plain = GenerationCache.key(VERSION, {"description": "pad"})
+    assert GenerationCache.key(VERSION, {"description": "pad", "duration": 8,
+                                         "seed": -1, "prompts": None}) == plain
+    assert GenerationCache.key(VERSION, {"description": "pad", "duration": 9}) != plain
+
+
+
+def test_defaults_and_types_match_the_model():
+    import inspect
+
+    from predict import Predictor, predict_inputs
+
+    # Every input the model fills in on its own, at the value it uses
+    defaults = {name: value for name, value in predict_inputs().items() if value is not None}
+    assert DEFAULT_INPUTS == defaults
+    params = inspect.signature(Predictor.predict).parameters
+    assert INPUT_TYPES == {name: p.annotation for name, p in params.items() if name != "self"}
+
+def test_processes_sharing_a_directory_keep_each_others_entries():
+    directory = tempfile.mkdtemp()
+    first, second = GenerationCache(directory), GenerationCache(directory)
+    first.put(VERSION, {"description": "a"}, _file(10))
+    second.put(VERSION, {"description": "b"}, _file(10))
+    # Each sees what the other appended, and so does a fresh process
+    assert second.get(VERSION, {"description": "a"}) is not None
+    assert first.get(VERSION, {"description": "b"}) is not None
+    assert len(GenerationCache(directory).index) == 2
+
+
+def test_journal_is_folded_into_the_snapshot():
+    directory = Path(tempfile.mkdtemp())
+    cache = GenerationCache(directory, compact_after=4)
+    other = GenerationCache(directory)
+    for i in range(3):
+        cache.put(VERSION, {"description": str(i)}, _file(10))
+    for _ in range(3):
+        cache.get(VERSION, {"description": "0"})
+    assert len((directory / "index.log").read_text().splitlines()) < 4
+    assert len(json.loads((directory / "index.json").read_text())) == 3
+    # A process that read the old journal notices the fold
+    assert other.get(VERSION, {"description": "2"}) is not None
+    assert len(other.index) == 3
+
+
+def test_repeat_batch_skips_predictions():
+    stub = StubAPI(polls_until_done=1)
+    cache = GenerationCache(tempfile.mkdtemp())
+    options = dict(token="test", base_url=stub.base_url, poll_interval=0.01)
+    prompts = ["pad", "drums", "bass"]
+    try:
+        first = asyncio.run(generate_many(prompts, 4, tempfile.mkdtemp(),
+                                          cache=cache, **options))
+        second = asyncio.run(generate_many(prompts + ["new"], 4, tempfile.mkdtemp(),
+                                           cache=cache, **options))
+        assert all(p.read_bytes() == AUDIO for p in first + second)
+        # Only the prompt that was not seen before reached the API
+        assert stub.count("POST", "/v1/predictions") == 4
+    finally:
+        stub.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Client cache tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for conditioning_cache.py on the tiny stand-in model: cached
+batches match the conditioner, entries are evicted by count and by
+bytes, reload from COND_CACHE_DIR in a new instance, and are keyed by the
+T5 precision. Runs under pytest or directly.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import the cache
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from conditioning_cache import ConditioningCache, _nbytes
+from tiny_model import build_tiny_model
+
+
+def _item(prompt, seconds=8):
+    return {"prompt": prompt, "seconds_start": 0, "seconds_total": seconds}
+
+
+def _assert_same(cached, expected):
+    assert cached.keys() == expected.keys()
+    for name in expected:
+        for got, want in zip(cached[name], expected[name]):
+            assert (got is None) == (want is None)
+            if want is not None:
+                assert got.shape == want.shape and got.dtype == want.dtype
+                assert torch.allclose(got.float(), want.float(), atol=1e-6), name
+
+
+class _NoConditioner:
+    """A model whose conditioner must not run: every item has to be a hit."""
+
+    def conditioner(self, conditioning, device):
+        raise AssertionError(f"conditioner ran for {len(conditioning)} item(s)")
+
+
+def test_mixed_hits_and_misses_match_the_conditioner():
+    model, _ = build_tiny_model()
+    cache = ConditioningCache()
+    with torch.no_grad():
+        cache.encode(model, [_item("soft piano"), _item("rain on a roof", 20)], "cpu")
+        assert (cache.hits, cache.misses) == (0, 2)
+
+        # Hits, misses, a repeated miss and a different duration for a hit's prompt
+        batch = [_item("deep house loop"), _item("soft piano"), _item("rain on a roof", 20),
+                 _item("deep house loop"), _item("soft piano", 30), _item("rain on a roof", 20)]
+        _assert_same(cache.encode(model, batch, "cpu"), model.conditioner(batch, "cpu"))
+        assert (cache.hits, cache.misses) == (3, 5)
+
+        # Now everything is cached and comes back in the order asked for
+        reordered = batch[::-1]
+        cached = cache.encode(_NoConditioner(), reordered, "cpu")
+        _assert_same(cached, model.conditioner(reordered, "cpu"))
+
+
+def test_evicts_least_recently_used_by_entry_count():
+    model, _ = build_tiny_model()
+    cache = ConditioningCache(max_entries=2)
+    with torch.no_grad():
+        cache.encode(model, [_item("a")], "cpu")
+        cache.encode(model, [_item("b")], "cpu")
+        cache.encode(model, [_item("a")], "cpu")  # a is now the most recent
+        cache.encode(model, [_item("c")], "cpu")
+    assert len(cache._entries) == 2
+    assert cache.key(_item("b")) not in cache._entries
+    cache.encode(_NoConditioner(), [_item("a"), _item("c")], "cpu")
+
+
+def test_evicts_by_byte_budget():
+    model, _ = build_tiny_model()
+    with torch.no_grad():
+        probe = ConditioningCache()
+        probe.encode(model, [_item("a")], "cpu")
+        size = _nbytes(next(iter(probe._entries.values())))
+
+        cache = ConditioningCache(max_entries=100, max_bytes=int(size * 2.5))
+        cache.encode(model, [_item("a"), _item("b"), _item("c")], "cpu")
+        assert len(cache._entries) == 2 and cache._bytes == 2 * size
+        assert cache.key(_item("a")) not in cache._entries
+
+        # An entry larger than the whole budget is not cached at all
+        tiny = ConditioningCache(max_bytes=size - 1)
+        tiny.encode(model, [_item("a")], "cpu")
+        assert not tiny._entries and tiny._bytes == 0
+
+
+def test_reloads_from_cache_dir_in_a_new_instance():
+    model, _ = build_tiny_model()
+    batch = [_item("soft piano"), _item("rain on a roof", 20)]
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["COND_CACHE_DIR"] = directory
+        try:
+            first = ConditioningCache.from_env(namespace="tiny|t5=fp32")
+            with torch.no_grad():
+                expected = first.encode(model, batch, "cpu")
+            assert len(list(Path(directory).glob("*.pt"))) == 2
+
+            second = ConditioningCache.from_env(namespace="tiny|t5=fp32")
+            assert not second._entries
+            _assert_same(second.encode(_NoConditioner(), batch, "cpu"), expected)
+            assert (second.hits, second.misses) == (2, 0) and len(second._entries) == 2
+        finally:
+            del os.environ["COND_CACHE_DIR"]
+
+
+def test_t5_precision_changes_the_namespace():
+    from predict import Predictor
+
+    keys = {}
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(WARMUP="0", COND_CACHE_DIR=directory,
+                          RESULT_CACHE_DIR=str(Path(directory) / "results"))
+        try:
+            for precision in ("fp32", "fp16"):
+                os.environ["PRECISION_T5"] = precision
+                predictor = Predictor()
+                predictor.model, predictor.model_config = build_tiny_model()
+                predictor.model_version = "tiny-stand-in"
+                predictor.device = "cpu"
+                predictor.setup_runtime()
+                cache = predictor.conditioning_cache
+                assert cache.namespace.endswith(f"t5={precision}")
+                keys[precision] = cache.key(_item("soft piano"))
+                with torch.no_grad():
+                    cache.encode(predictor.model, [_item("soft piano")], "cpu")
+                # The fp32 entry on disk is not reused once T5 runs in fp16
+                assert (cache.hits, cache.misses) == (0, 1)
+        finally:
+            for name in ("WARMUP", "COND_CACHE_DIR", "RESULT_CACHE_DIR", "PRECISION_T5"):
+                os.environ.pop(name, None)
+    assert keys["fp32"] != keys["fp16"]
+
+
+if __name__ == "__main__":
+    print("🧪 Conditioning cache tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
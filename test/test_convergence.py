@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for convergence.py: the monitor stops the sampler only once every
+batch row has settled for long enough, and never too early or on the
+last step. Feeds it synthetic denoised estimates, so no model is needed.
+Runs under pytest or directly.
+"""
+
+import sys
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import the monitor
+sys.path.append(str(Path(__file__).parent.parent))
+
+from convergence import Converged, ConvergenceMonitor
+
+
+def _drive(monitor, estimates):
+    """Feed estimates step by step; return the step it stopped at, or None."""
+    for i, denoised in enumerate(estimates):
+        try:
+            monitor({"i": i, "denoised": denoised, "x": None})
+        except Converged as stop:
+            assert stop.denoised is denoised
+            return stop.steps
+    return None
+
+
+def _settling(steps, rows=1, settle_at=None):
+    """Estimates that jump around until `settle_at`, then stay put."""
+    gen = torch.Generator().manual_seed(0)
+    target = torch.randn(rows, 4, 16, generator=gen)
+    return [target if settle_at is not None and i >= settle_at
+            else torch.randn(rows, 4, 16, generator=gen) for i in range(steps)]
+
+
+def test_stops_after_patience_once_settled():
+    monitor = ConvergenceMonitor(0.01, total_steps=20, patience=2)
+    # Settles at step 8; steps 9 and 10 are the two calm ones
+    assert _drive(monitor, _settling(20, settle_at=7)) == 10
+    assert monitor.changes[-1] == 0.0
+
+    # Never stops while the estimate keeps moving
+    assert _drive(ConvergenceMonitor(0.01, total_steps=20), _settling(20)) is None
+
+
+def test_min_steps_and_last_step_are_respected():
+    monitor = ConvergenceMonitor(0.01, total_steps=20, min_fraction=0.5, patience=1)
+    assert _drive(monitor, _settling(20, settle_at=0)) == 10
+    # Settling only at the very end saves nothing, so it runs to completion
+    assert _drive(ConvergenceMonitor(0.01, total_steps=20, patience=2),
+                  _settling(20, settle_at=17)) is None
+
+
+def test_batch_waits_for_its_slowest_row_and_chains_callbacks():
+    early, late = _settling(20, settle_at=4), _settling(20, settle_at=12)
+    batch = [torch.cat([a, b]) for a, b in zip(early, late)]
+    seen = []
+    monitor = ConvergenceMonitor(0.01, total_steps=20, callback=lambda info: seen.append(info["i"]),
+                                 patience=2)
+    assert _drive(monitor, batch) == 15
+    assert seen == list(range(15))
+
+
+if __name__ == "__main__":
+    print("🧪 Convergence monitor tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for cpu_pool.py with a small stand-in model: weights are shared
+with the workers rather than copied, calls run in parallel, and step
+callbacks, spans and errors make it back to the caller. Runs under
+pytest or directly.
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import the pool
+sys.path.append(str(Path(__file__).parent.parent))
+
+from cpu_pool import CpuWorkerPool
+from tracing import RequestTrace
+
+
+class Target:
+    """Stands in for the Predictor: a `model` plus methods the workers call."""
+
+    def __init__(self):
+        self.model = torch.nn.Linear(4, 4)
+
+    def weight_sum(self, trace, callback=None):
+        with trace.span("sum", cpu_only=True):
+            return self.model.weight.detach().sum().item()
+
+    def steps(self, n, trace, callback=None):
+        for i in range(n):
+            callback({"i": i, "denoised": torch.full((1, 2), float(i)), "x": None})
+        return torch.arange(n)
+
+    def slow(self, seconds, trace, callback=None):
+        time.sleep(seconds)
+        return os.getpid()
+
+    def fail(self, trace, callback=None):
+        raise ValueError("bad input")
+
+
+def test_weights_are_shared_not_copied():
+    target = Target()
+    pool = CpuWorkerPool(target, workers=2, threads=1)
+    try:
+        assert target.model.weight.is_shared()
+        before = pool.call("weight_sum")
+        # A write after the fork is visible to the workers: same pages
+        with torch.no_grad():
+            target.model.weight.add_(1.0)
+        assert abs(pool.call("weight_sum") - (before + 16)) < 1e-4
+    finally:
+        pool.close()
+
+
+def test_parallel_calls_and_broadcast():
+    pool = CpuWorkerPool(Target(), workers=2, threads=1)
+    try:
+        pool.broadcast("slow", 0.0)
+        results = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=lambda: results.append(pool.call("slow", 0.5)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.perf_counter() - start < 0.9
+        assert len(set(results)) == 2 and os.getpid() not in results
+        assert pool.busy == 0
+    finally:
+        pool.close()
+
+
+def test_callbacks_spans_and_errors_reach_the_caller():
+    pool = CpuWorkerPool(Target(), workers=1, threads=1)
+    try:
+        seen = []
+        result = pool.call("steps", 3, callback=lambda info: seen.append(info["denoised"][0, 0].item()))
+        assert result.tolist() == [0, 1, 2] and seen == [0.0, 1.0, 2.0]
+
+        # A callback that names its steps only hears about those
+        def preview(info):
+            seen.append(info["i"])
+        preview.steps = frozenset({1, 4})
+        seen.clear()
+        pool.call("steps", 6, callback=preview)
+        assert seen == [1, 4]
+
+        trace = RequestTrace()
+        pool.call("weight_sum", trace=trace)
+        (span,) = trace.spans
+        assert span["name"] == "sum" and span["worker"] == 0
+        assert 0 <= span["offset"] < trace.elapsed()
+
+        try:
+            pool.call("fail")
+        except ValueError as e:
+            assert "bad input" in str(e)
+        else:
+            raise AssertionError("expected ValueError")
+        # The worker is still usable afterwards
+        assert isinstance(pool.call("weight_sum"), float)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    print("🧪 CPU worker pool tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
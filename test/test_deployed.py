@@ -52,7 +52,9 @@ def generate_audio(description: str, duration: int = 1):
         
         print(f"Model output: {output}")
         
-        # The output is a URL to the generated audio file
+        # The output is a list of URLs, one per prompt
+        if isinstance(output, list):
+            output = output[0] if output else None
         if output and isinstance(output, str):
             # Download the audio file
             response = requests.get(output)
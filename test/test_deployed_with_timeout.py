@@ -1,19 +1,16 @@
-import replicate
 import os
+import sys
 import requests
-import time
-import signal
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables from .env file in root directory
-load_dotenv()
+# Add the parent directory to the path so we can import the client
+sys.path.append(str(Path(__file__).parent.parent))
 
-class TimeoutError(Exception):
-    pass
+from replicate_client import MODEL_VERSION, PredictionTimeout, run_blocking
 
-def timeout_handler(signum, frame):
-    raise TimeoutError("Request timed out")
+# Load environment variables from .env file in root directory
+load_dotenv()
 
 def generate_audio_with_timeout(description: str, duration: int = 1, timeout_seconds: int = 600):
     """
@@ -45,31 +42,25 @@ def generate_audio_with_timeout(description: str, duration: int = 1, timeout_sec
         print(f"⏱️  Timeout set to {timeout_seconds} seconds")
         print("🔄 Starting audio generation (this may take a few minutes for the first run)...")
         
-        # Set up timeout
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout_seconds)
-        
         try:
-            # Use the model version directly
-            prediction = replicate.predictions.create(
-                version="mgysel/stable-audio-open:d90a0c38317e1c4316732753a632dbc9757f4bcae7c16b0128e85e457014da71",
-                input={
+            # The deadline works from any thread, and a prediction that
+            # misses it is cancelled on Replicate instead of left running
+            print("⏳ Waiting for prediction to complete...")
+            output = run_blocking(
+                MODEL_VERSION,
+                {
                     "description": description,
                     "duration": duration
-                }
+                },
+                timeout=timeout_seconds,
             )
             
-            print("⏳ Waiting for prediction to complete...")
-            prediction.wait()
-            output = prediction.output
-            
-            # Cancel the alarm
-            signal.alarm(0)
-            
             print("✅ Audio generation completed!")
             print(f"Model output: {output}")
             
-            # The output is a URL to the generated audio file
+            # The output is a list of URLs, one per prompt
+            if isinstance(output, list):
+                output = output[0] if output else None
             if output and isinstance(output, str):
                 # Download the audio file
                 response = requests.get(output)
@@ -94,12 +85,9 @@ def generate_audio_with_timeout(description: str, duration: int = 1, timeout_sec
                 print("No output received from model")
                 return None
                 
-        except TimeoutError:
-            print(f"❌ Request timed out after {timeout_seconds} seconds")
+        except PredictionTimeout:
+            print(f"❌ Request timed out after {timeout_seconds} seconds (prediction cancelled)")
             return None
-        finally:
-            # Make sure to cancel the alarm
-            signal.alarm(0)
             
     except Exception as e:
         print(f"Error generating audio: {e}")
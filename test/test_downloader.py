@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Tests for downloader.py against a local file server that can drop
+connections mid-transfer and switch Range support on and off. Runs under
+pytest or directly.
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+# Add the parent directory to the path so we can import the downloader
+sys.path.append(str(Path(__file__).parent.parent))
+
+from downloader import DownloadError, download, download_file
+
+PAYLOAD = os.urandom(1 << 20)
+
+
+class FileServer:
+    """Serves PAYLOAD; the first `drops` responses are cut off after `drop_after` bytes."""
+
+    def __init__(self, ranges=True, drops=0, drop_after=100_000):
+        self.ranges = ranges
+        self.drops = drops
+        self.drop_after = drop_after
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                server.handle(self, head=True)
+
+            def do_GET(self):
+                server.handle(self, head=False)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/output.wav"
+
+    def handle(self, handler, head):
+        requested = handler.headers.get("Range")
+        with self.lock:
+            if not head:
+                self.requests.append(requested)
+            drop = not head and self.drops > 0
+            if drop:
+                self.drops -= 1
+
+        start, end = 0, len(PAYLOAD) - 1
+        if requested and self.ranges and not head:
+            first, _, last = requested.removeprefix("bytes=").partition("-")
+            start, end = int(first), int(last) if last else end
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            handler.send_response(200)
+        if self.ranges:
+            handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(end - start + 1))
+        handler.end_headers()
+        if head:
+            return
+        body = PAYLOAD[start:end + 1]
+        if drop:
+            handler.wfile.write(body[:self.drop_after])
+            handler.close_connection = True
+            return
+        handler.wfile.write(body)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def _download(server, **options):
+    path = Path(tempfile.mkdtemp()) / "output.wav"
+    options = {"backoff": 0.01, **options}
+    return download_file(server.url, path, **options), path
+
+
+def test_streams_whole_file():
+    server = FileServer()
+    try:
+        result, path = _download(server)
+        assert result == path and path.read_bytes() == PAYLOAD
+        assert not path.with_name("output.wav.part").exists()
+        assert server.requests == [None]
+    finally:
+        server.close()
+
+
+def test_resumes_with_range_after_drop():
+    server = FileServer(drops=2, drop_after=300_000)
+    try:
+        _, path = _download(server)
+        assert path.read_bytes() == PAYLOAD
+        # Each retry picks up past what the dropped response delivered
+        offsets = [int(r.removeprefix("bytes=").rstrip("-")) for r in server.requests[1:]]
+        assert server.requests[0] is None and len(offsets) == 2
+        assert 0 < offsets[0] <= 300_000 < offsets[1] <= 600_000
+    finally:
+        server.close()
+
+
+def test_restarts_without_range_support():
+    server = FileServer(ranges=False, drops=1)
+    try:
+        _, path = _download(server)
+        assert path.read_bytes() == PAYLOAD
+    finally:
+        server.close()
+
+
+def test_parallel_ranges():
+    server = FileServer(drops=2, drop_after=50_000)
+    try:
+        _, path = _download(server, parallel_threshold=1 << 19, parts=4)
+        assert path.read_bytes() == PAYLOAD
+        assert all(r and r.startswith("bytes=") for r in server.requests)
+        assert len(server.requests) == 6
+    finally:
+        server.close()
+
+
+def test_failed_range_stops_the_others():
+    server = FileServer(drops=1, drop_after=50_000)
+    path = Path(tempfile.mkdtemp()) / "output.wav"
+
+    async def go():
+        async with httpx.AsyncClient() as http:
+            try:
+                await download(http, server.url, path, parallel_threshold=1 << 19,
+                               parts=4, max_retries=0, chunk_size=1024)
+            except DownloadError:
+                pass
+            else:
+                raise AssertionError("expected DownloadError")
+            # Every other range was stopped before the file was closed
+            return asyncio.all_tasks() - {asyncio.current_task()}
+
+    try:
+        assert asyncio.run(go()) == set()
+        assert list(path.parent.iterdir()) == []
+    finally:
+        server.close()
+
+
+def test_hash_mismatch_leaves_nothing_behind():
+    server = FileServer()
+    try:
+        path = Path(tempfile.mkdtemp()) / "output.wav"
+        try:
+            download_file(server.url, path, sha256="0" * 64)
+        except DownloadError:
+            pass
+        else:
+            raise AssertionError("expected DownloadError")
+        assert not path.exists() and not path.with_name("output.wav.part").exists()
+
+        download_file(server.url, path, sha256=hashlib.sha256(PAYLOAD).hexdigest())
+        assert path.read_bytes() == PAYLOAD
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Downloader tests (local file server)")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
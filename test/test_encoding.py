@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for encoding.py: every output format decodes back to the source
+audio with the requested bit depth (wav/flac) or bitrate (mp3/opus).
+The lossy formats need FFmpeg, as in the Cog image. Runs under pytest or
+directly.
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import soundfile
+import torch
+from torchcodec.decoders import AudioDecoder
+
+# Add the parent directory to the path so we can import the encoder
+sys.path.append(str(Path(__file__).parent.parent))
+
+from encoding import OPUS_SAMPLE_RATE, encode
+
+SAMPLE_RATE = 44100
+SECONDS = 4
+
+
+def _audio():
+    generator = torch.Generator().manual_seed(0)
+    return (torch.rand(2, SAMPLE_RATE * SECONDS, generator=generator) * 2 - 1) * 0.5
+
+
+def test_lossless_round_trip_keeps_bit_depth():
+    audio = _audio()
+    for fmt in ("wav", "flac"):
+        for bit_depth, subtype in ((16, "PCM_16"), (24, "PCM_24")):
+            data = encode(audio, SAMPLE_RATE, fmt, bit_depth=bit_depth)
+            info = soundfile.info(io.BytesIO(data))
+            assert info.format == fmt.upper() and info.subtype == subtype
+            assert info.samplerate == SAMPLE_RATE and info.channels == 2
+            decoded, _ = soundfile.read(io.BytesIO(data), dtype="float32")
+            decoded = torch.from_numpy(decoded.T)
+            assert decoded.shape == audio.shape
+            # Quantisation error stays within one step of the bit depth
+            assert (decoded - audio).abs().max() <= 2.0 ** (1 - bit_depth)
+
+
+def test_mp3_round_trip_keeps_bitrate():
+    audio = _audio()
+    for bitrate in (64, 192):
+        decoder = AudioDecoder(encode(audio, SAMPLE_RATE, "mp3", bitrate=bitrate))
+        metadata = decoder.metadata
+        assert metadata.codec == "mp3" and metadata.bit_rate == bitrate * 1000
+        assert metadata.sample_rate == SAMPLE_RATE and metadata.num_channels == 2
+        assert decoder.get_all_samples().data.shape == audio.shape
+
+
+def test_opus_round_trip_keeps_bitrate():
+    audio = _audio()
+    sizes = {}
+    for bitrate in (64, 192):
+        data = encode(audio, SAMPLE_RATE, "opus", bitrate=bitrate)
+        assert data[:4] == b"OggS"
+        decoder = AudioDecoder(data)
+        metadata = decoder.metadata
+        assert metadata.codec == "opus" and metadata.num_channels == 2
+        assert metadata.sample_rate == OPUS_SAMPLE_RATE
+        assert decoder.get_all_samples().data.shape == (2, OPUS_SAMPLE_RATE * SECONDS)
+        # Ogg carries no nominal bitrate, so measure it from the payload
+        sizes[bitrate] = len(data) * 8 / SECONDS / 1000
+        assert abs(sizes[bitrate] - bitrate) <= 0.2 * bitrate
+    assert sizes[192] > 2 * sizes[64]
+
+
+def test_unsupported_options_raise():
+    audio = _audio()
+    for fmt, options in (("aac", {}), ("wav", {"bit_depth": 8})):
+        try:
+            encode(audio, SAMPLE_RATE, fmt, **options)
+        except ValueError:
+            continue
+        raise AssertionError(f"{fmt} {options} should raise")
+
+
+if __name__ == "__main__":
+    print("🧪 Encoding tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Quality-vs-speed harness for the latency tiers in tiers.py.
+
+Renders each prompt with every tier from the same seed, times the run and
+scores the result against the 100-step `high` reference:
+  mel_similarity   cosine similarity of log-mel spectrograms (1.0 = identical)
+  lsd_db           log-spectral distance in dB (0.0 = identical)
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+import torchaudio
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import predict
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Load environment variables
+load_dotenv()
+
+PROMPTS = [
+    "heavenly flowing pad",
+    "A quick drum beat",
+    "Noisia style neuro dnb bass at 170bpm",
+]
+
+
+def log_mel(audio, sample_rate):
+    mel = torchaudio.transforms.MelSpectrogram(sample_rate, n_fft=2048, hop_length=512, n_mels=128)
+    return torch.log(mel(audio.to(torch.float32).mean(0)) + 1e-5)
+
+
+def mel_similarity(audio, reference, sample_rate):
+    a, b = log_mel(audio, sample_rate).flatten(), log_mel(reference, sample_rate).flatten()
+    return torch.nn.functional.cosine_similarity(a, b, dim=0).item()
+
+
+def log_spectral_distance(audio, reference):
+    def power_db(x):
+        spec = torch.stft(x.to(torch.float32).mean(0), n_fft=2048, hop_length=512,
+                          window=torch.hann_window(2048), return_complex=True)
+        return 10 * torch.log10(spec.abs().pow(2) + 1e-10)
+    diff = power_db(audio) - power_db(reference)
+    return diff.pow(2).mean(0).sqrt().mean().item()
+
+
+def timed_generate(predictor, prompt, duration, seed, tier):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    audio = predictor.generate([prompt], [duration], [seed], tier=tier)[0]
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return audio, time.perf_counter() - start
+
+
+def run_harness(duration, seed, reference_tier="high"):
+    """Return one result row per (prompt, tier)."""
+    from predict import Predictor
+
+    print("🔄 Loading model...")
+    predictor = Predictor()
+    predictor.setup()
+
+    # Warm up so the first timed run does not pay for lazy initialisation
+    predictor.generate([PROMPTS[0]], [1], [seed], tier="draft")
+
+    rows = []
+    for prompt in PROMPTS:
+        reference, ref_time = timed_generate(predictor, prompt, duration, seed, reference_tier)
+        print(f"🎵 '{prompt}' — {reference_tier}: {ref_time:.2f}s (reference)")
+        for name in predictor.tiers:
+            if name == reference_tier:
+                audio, elapsed = reference, ref_time
+            else:
+                audio, elapsed = timed_generate(predictor, prompt, duration, seed, name)
+            row = {
+                "prompt": prompt,
+                "tier": name,
+                "steps": predictor.tiers[name].steps,
+                "sampler_type": predictor.tiers[name].sampler_type,
+                "seconds": elapsed,
+                "speedup": ref_time / elapsed,
+                "mel_similarity": mel_similarity(audio, reference, predictor.sample_rate),
+                "lsd_db": log_spectral_distance(audio, reference),
+            }
+            print(f"   {name:>10}: {elapsed:6.2f}s  x{row['speedup']:.2f}  "
+                  f"mel={row['mel_similarity']:.3f}  lsd={row['lsd_db']:.2f}dB")
+            rows.append(row)
+    return rows
+
+
+def summarize(rows):
+    by_tier = {}
+    for row in rows:
+        by_tier.setdefault(row["tier"], []).append(row)
+    return {
+        tier: {key: sum(r[key] for r in items) / len(items)
+               for key in ("seconds", "speedup", "mel_similarity", "lsd_db")}
+        for tier, items in by_tier.items()
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--duration", type=int, default=10, help="Duration in seconds")
+    p.add_argument("--seed", type=int, default=1234, help="Seed shared by every tier")
+    p.add_argument("--output-path", default="tiers_report.json", help="JSON report path")
+    args = p.parse_args()
+
+    print("🧪 Latency Tier Harness")
+    print("=" * 50)
+    rows = run_harness(args.duration, args.seed)
+    summary = summarize(rows)
+
+    print("\n📊 Mean per tier:")
+    for tier, stats in summary.items():
+        print(f"   {tier:>10}: {stats['seconds']:6.2f}s  x{stats['speedup']:.2f}  "
+              f"mel={stats['mel_similarity']:.3f}  lsd={stats['lsd_db']:.2f}dB")
+
+    Path(args.output_path).write_text(json.dumps({"rows": rows, "summary": summary}, indent=2))
+    print(f"\n💾 Report saved to: {args.output_path}")
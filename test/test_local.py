@@ -10,7 +10,7 @@ from pathlib import Path
 # Add the parent directory to the path so we can import the predictor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from predict import Predictor
+from predict import Predictor, run_prediction
 
 def test_local_model():
     """
@@ -25,7 +25,9 @@ def test_local_model():
         description = "heavenly flowing pad"
         duration = 2
         
-        output_path = predictor.predict(description, duration)
+        output_path = run_prediction(
+            predictor, description=description, duration=duration
+        )[-1]
         
         print(f"✅ Success! Audio file created at: {output_path.absolute()}")
         return str(output_path)
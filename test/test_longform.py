@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for longform.py: segment planning, the crossfade, and that the
+sample/decode pipeline overlaps without letting work pile up. Uses fake
+sample and decode functions, so no model is needed. Runs under pytest
+or directly.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import longform
+sys.path.append(str(Path(__file__).parent.parent))
+
+from longform import Stitcher, plan_segments, render
+
+
+def test_plan_covers_total_with_overlap():
+    for total in (10, 100, 101, 107, 1000):
+        plan = plan_segments(total, segment=30, overlap=5)
+        assert plan[0][0] == 0 and sum(plan[-1]) == total
+        for (start, length), (next_start, _) in zip(plan, plan[1:]):
+            assert length == 30 and next_start == start + 25
+        assert plan[-1][1] > 5 or len(plan) == 1
+    assert plan_segments(20, 30, 5) == [(0, 20)]
+    try:
+        plan_segments(100, 10, 10)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_stitch_length_and_equal_power():
+    total, overlap = 1000, 40
+    plan = plan_segments(total, 300, overlap)
+    stitcher = Stitcher(overlap)
+    for _, length in plan:
+        stitcher.add(torch.ones(2, length))
+    audio = stitcher.finish()
+    assert audio.shape == (2, total)
+    # sin + cos peaks at sqrt(2) mid-fade and never drops below 1
+    assert audio.min() >= 1 - 1e-6 and audio.max() <= 2 ** 0.5 + 1e-6
+
+    stitcher = Stitcher(0)
+    stitcher.add(torch.zeros(1, 5))
+    stitcher.add(torch.ones(1, 5))
+    assert stitcher.finish().tolist() == [[0] * 5 + [1] * 5]
+
+
+def test_pipeline_overlaps_and_stays_bounded():
+    plan = plan_segments(100, 20, 4)
+    events, live, peak = [], set(), [0]
+    lock = threading.Lock()
+
+    def sample(k):
+        with lock:
+            events.append(("sample", k))
+            live.add(k)
+            peak[0] = max(peak[0], len(live))
+        time.sleep(0.02)
+        return torch.full((1, 1, plan[k][1] + 3), float(k))
+
+    def decode(latents, k):
+        assert threading.current_thread() is not threading.main_thread()
+        time.sleep(0.03)
+        with lock:
+            events.append(("decoded", k))
+            live.discard(k)
+        return latents[0]
+
+    audio = render(sample, decode, plan, overlap=4)
+    assert audio.shape == (1, 100)
+    # Segment k+1 starts sampling before segment k is decoded
+    assert events.index(("sample", 1)) < events.index(("decoded", 0))
+    # ...but never more than one segment waits on the decoder
+    assert peak[0] <= 2
+
+
+def test_pipeline_surfaces_decode_errors():
+    def decode(latents, k):
+        raise RuntimeError("decoder failed")
+    try:
+        render(lambda k: torch.zeros(1, 1, 10), decode, plan_segments(30, 10, 2), 2)
+    except RuntimeError as e:
+        assert "decoder failed" in str(e)
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+if __name__ == "__main__":
+    print("🧪 Long-form tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for metrics.py: Histogram and ServingMetrics render valid
+Prometheus text, with counter totals, cumulative `_bucket{le=...}` counts
+and `_sum`/`_count` per series. Runs under pytest or directly.
+"""
+
+import math
+import sys
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the metrics
+sys.path.append(str(Path(__file__).parent.parent))
+
+from metrics import LATENCY_BUCKETS, RATE_BUCKETS, Histogram, ServingMetrics
+from tracing import RequestTrace
+
+
+class _Trace(RequestTrace):
+    """A finished trace with a fixed wall-clock time."""
+
+    def __init__(self, seconds, spans, **attributes):
+        super().__init__()
+        self.seconds = seconds
+        for name, span_seconds, extra in spans:
+            self.add(name, self.start, span_seconds, **extra)
+        self.attributes.update(attributes)
+
+    def elapsed(self):
+        return self.seconds
+
+
+def _samples(text):
+    """{'name{labels}': value} for every sample line, checking the format."""
+    assert text.endswith("\n")
+    samples, typed = {}, set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram"), line
+            typed.add(name)
+        elif not line.startswith("# HELP "):
+            series, value = line.rsplit(" ", 1)
+            name = series.split("{")[0]
+            # Every sample belongs to a family declared above it
+            assert name in typed or name.rsplit("_", 1)[0] in typed, line
+            assert series not in samples, f"duplicate series {series}"
+            samples[series] = float(value)
+    return samples
+
+
+def _buckets(samples, name, labels=""):
+    prefix = f"{name}_bucket{{{labels}"
+    return [value for series, value in samples.items() if series.startswith(prefix)]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("h_seconds", "Some help.", [1, 5, 10])
+    for value in (0.5, 1, 3, 7, 20):
+        histogram.observe(value)
+    histogram.observe(2, duration="10-30")
+    assert histogram.render() == [
+        "# HELP h_seconds Some help.",
+        "# TYPE h_seconds histogram",
+        # Bucket edges are inclusive, as Prometheus expects
+        'h_seconds_bucket{le="1"} 2',
+        'h_seconds_bucket{le="5"} 3',
+        'h_seconds_bucket{le="10"} 4',
+        'h_seconds_bucket{le="+Inf"} 5',
+        "h_seconds_sum 31.5",
+        "h_seconds_count 5",
+        'h_seconds_bucket{duration="10-30",le="1"} 0',
+        'h_seconds_bucket{duration="10-30",le="5"} 1',
+        'h_seconds_bucket{duration="10-30",le="10"} 1',
+        'h_seconds_bucket{duration="10-30",le="+Inf"} 1',
+        'h_seconds_sum{duration="10-30"} 2.0',
+        'h_seconds_count{duration="10-30"} 1',
+    ]
+
+
+def test_serving_metrics_render():
+    metrics = ServingMetrics()
+    metrics.record_setup({"load": 3.5, "warmup": 1.25})
+    metrics.add_source("result_cache", lambda: {"hits": 1, "misses": 3})
+    # A rendered prediction and a cache hit
+    metrics.observe(_Trace(2.0, [("queue", 0.02, {}),
+                                 ("sampling", 0.5, {"steps": 8, "max_steps": 10,
+                                                    "peak_bytes": 4096})],
+                           items=2, audio_seconds=16, longest=8))
+    metrics.observe(_Trace(0.1, [("queue", 0.2, {})], items=1, audio_seconds=8))
+    samples = _samples(metrics.render())
+
+    expected = {
+        "predictions_total": 2, "items_total": 3, "audio_seconds_total": 24,
+        "rendered_total": 1, "sampler_steps_total": 8, "sampler_steps_saved_total": 2,
+        "peak_memory_bytes": 4096,
+        "result_cache_hits": 1, "result_cache_misses": 3, "result_cache_hit_rate": 0.25,
+        'setup_seconds{phase="load"}': 3.5, 'setup_seconds{phase="warmup"}': 1.25,
+    }
+    for series, value in expected.items():
+        assert samples[series] == value, (series, samples.get(series))
+    assert samples["uptime_seconds"] >= 0
+
+    # queue 0.02s and 0.2s
+    assert _buckets(samples, "queue_wait_seconds") == [
+        0, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2]
+    assert math.isclose(samples["queue_wait_seconds_sum"], 0.22)
+    assert samples["queue_wait_seconds_count"] == 2
+    # 2s and 0.1s predictions; 0.1 lands in its own le="0.1" bucket
+    assert _buckets(samples, "prediction_seconds") == [
+        0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2]
+    assert samples["prediction_seconds_sum"] == 2.1
+    assert len(_buckets(samples, "prediction_seconds")) == len(LATENCY_BUCKETS) + 1
+    # Only the rendered prediction: 8 steps in 0.5s, 16 audio seconds in 2s
+    assert _buckets(samples, "sampler_steps_per_second") == [0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1]
+    assert samples["sampler_steps_per_second_sum"] == 16
+    assert _buckets(samples, "real_time_factor", 'duration="0-10",') == [
+        0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1]
+    assert len(_buckets(samples, "real_time_factor")) == len(RATE_BUCKETS) + 1
+    assert samples['real_time_factor_sum{duration="0-10"}'] == 8
+    assert samples['real_time_factor_count{duration="0-10"}'] == 1
+    assert samples['real_time_factor_bucket{duration="0-10",le="+Inf"}'] == 1
+
+
+def test_empty_metrics_render():
+    samples = _samples(ServingMetrics().render())
+    assert samples["predictions_total"] == 0
+    # Histograms without observations have no series yet
+    assert not any(series.startswith("queue_wait_seconds") for series in samples)
+
+
+if __name__ == "__main__":
+    print("🧪 Metrics tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
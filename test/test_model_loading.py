@@ -38,7 +38,7 @@ def test_model_loading():
         predictor.setup()
         
         print("✅ Model loaded successfully!")
-        print(f"✅ Model config: {type(predictor.cfg)}")
+        print(f"✅ Model config: {type(predictor.model_config)}")
         print(f"✅ Model instance: {type(predictor.model)}")
         
         return True
@@ -56,13 +56,15 @@ def test_quick_generation():
     print("=" * 50)
     
     try:
-        from predict import Predictor
+        from predict import Predictor, run_prediction
         
         predictor = Predictor()
         predictor.setup()
         
         print("🔄 Generating 1-second audio sample...")
-        output_path = predictor.predict("soft piano melody", duration=1)
+        output_path = run_prediction(
+            predictor, description="soft piano melody", duration=1
+        )[-1]
         
         if output_path and output_path.exists():
             print(f"✅ Audio generated successfully: {output_path}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for precision.py on the tiny stand-in model: bf16/fp16 autocast and
+CPU int8 convert each component on its own, keep its drift from fp32
+within the module's default tolerance, and unknown precisions are
+rejected. Runs under pytest or directly.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import precision
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from precision import COMPONENTS, apply_precision, settings_from_env
+from tiny_model import build_tiny_model
+
+# apply_precision's own default tolerance
+TOLERANCE = float(os.getenv("PRECISION_MAX_DRIFT", 0.05))
+
+
+def _module(model, component):
+    return {"t5": model.conditioner.conditioners["prompt"].model,
+            "dit": model.model, "vae": model.pretransform}[component]
+
+
+def _has_quantized_linear(module):
+    return any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in module.modules())
+
+
+def test_autocast_precisions_stay_within_tolerance():
+    for dtype, precision in ((torch.bfloat16, "bf16"), (torch.float16, "fp16")):
+        for component in COMPONENTS:
+            model, _ = build_tiny_model()
+            drift = apply_precision(model, "cpu", {component: precision})
+            assert set(drift) == {component}, (precision, drift)
+            assert drift[component] <= TOLERANCE, (component, precision, drift)
+            assert next(_module(model, component).parameters()).dtype == dtype
+            # The other components are left at fp32
+            for other in set(COMPONENTS) - {component}:
+                assert next(_module(model, other).parameters()).dtype == torch.float32
+
+
+def test_int8_stays_within_tolerance():
+    for component in COMPONENTS:
+        model, _ = build_tiny_model()
+        drift = apply_precision(model, "cpu", {component: "int8"})
+        assert set(drift) == {component} and drift[component] <= TOLERANCE, drift
+    # t5 and the DiT have Linear layers to quantize (the VAE is convolutional)
+    for component in ("t5", "dit"):
+        model, _ = build_tiny_model()
+        apply_precision(model, "cpu", {component: "int8"})
+        assert _has_quantized_linear(_module(model, component))
+
+
+def test_fp32_is_left_alone():
+    model, _ = build_tiny_model()
+    assert apply_precision(model, "cpu", {c: "fp32" for c in COMPONENTS}) == {}
+    assert all(p.dtype == torch.float32 for p in model.parameters())
+
+
+def test_drift_above_tolerance_raises():
+    model, _ = build_tiny_model()
+    try:
+        apply_precision(model, "cpu", {"dit": "bf16"}, tolerance=0.0)
+    except RuntimeError as e:
+        assert "dit=bf16" in str(e)
+    else:
+        raise AssertionError("zero tolerance should reject bf16")
+
+
+def test_unknown_precision_raises():
+    model, _ = build_tiny_model()
+    try:
+        apply_precision(model, "cpu", {"dit": "fp8"})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("fp8 should be rejected")
+    # Nothing was converted before the check
+    assert all(p.dtype == torch.float32 for p in model.parameters())
+
+    os.environ["PRECISION_VAE"] = "int4"
+    try:
+        settings_from_env()
+    except ValueError as e:
+        assert "PRECISION_VAE=int4" in str(e)
+    else:
+        raise AssertionError("PRECISION_VAE=int4 should be rejected")
+    finally:
+        del os.environ["PRECISION_VAE"]
+
+
+if __name__ == "__main__":
+    print("🧪 Precision tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Tests for replicate_client.py against a local stub of the predictions API.
+
+The stub runs in a background thread and can be told to answer with 429s
+(with Retry-After), 5xx errors or slow predictions, so pacing and retry
+behaviour is checked without a token or network access. Runs under
+pytest or directly.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the client
+sys.path.append(str(Path(__file__).parent.parent))
+
+from replicate_client import (PredictionTimeout, ReplicateClient, ReplicateError,
+                              TokenBucket, final_output, generate_many,
+                              parse_retry_after, run_blocking)
+
+AUDIO = b"RIFF" + b"\0" * 1020
+PREVIEW = b"RIFF" + b"\1" * 1020
+
+
+class StubAPI:
+    """Minimal predictions API. `failures` maps "METHOD /path" to queued statuses."""
+
+    def __init__(self, polls_until_done=2):
+        self.polls_until_done = polls_until_done
+        self.failures = {}
+        self.retry_after = "1"
+        self.log = []
+        self.predictions = {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.handle(self, "POST")
+
+            def do_GET(self):
+                stub.handle(self, "GET")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def outputs(self, pid, input):
+        """Output URLs in predict's order: previews, the final file, the profile."""
+        fmt = input.get("output_format", "wav")
+        suffix = {"opus": "ogg"}.get(fmt, fmt)
+        files = [f"{self.base_url}/files/{pid}"]
+        if input.get("preview_every"):
+            files = [f"{self.base_url}/files/{pid}/preview_{step:03d}_0.{suffix}"
+                     for step in (1, 3)] + files
+        files[-1] += f".{suffix}"
+        if input.get("profile"):
+            files.append(f"{self.base_url}/files/{pid}/profile.json")
+        return files
+
+    def fail(self, route, *statuses):
+        self.failures.setdefault(route, []).extend(statuses)
+
+    def _send(self, handler, status, body=b"", headers=None, content_type="application/json"):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle(self, handler, method):
+        path = handler.path
+        route = f"{method} {path.rsplit('/', 1)[0] if path.count('/') > 2 else path}"
+        with self.lock:
+            self.log.append((time.monotonic(), method, path))
+            queued = self.failures.get(route)
+            status = queued.pop(0) if queued else None
+        if status is not None:
+            headers = {"Retry-After": self.retry_after} if status == 429 else None
+            self._send(handler, status, b'{"detail": "stub failure"}', headers)
+            return
+
+        if method == "POST" and path == "/v1/predictions":
+            length = int(handler.headers["Content-Length"])
+            payload = json.loads(handler.rfile.read(length))
+            with self.lock:
+                pid = f"p{len(self.predictions)}"
+                self.predictions[pid] = {"polls": 0, "input": payload["input"]}
+            self._send(handler, 201, json.dumps({"id": pid, "status": "starting"}).encode())
+        elif method == "POST" and path.endswith("/cancel"):
+            pid = path.split("/")[3]
+            with self.lock:
+                self.predictions[pid]["canceled"] = True
+            self._send(handler, 200, json.dumps({"id": pid, "status": "canceled"}).encode())
+        elif method == "GET" and path.startswith("/v1/predictions/"):
+            pid = path.rsplit("/", 1)[1]
+            with self.lock:
+                prediction = self.predictions[pid]
+                prediction["polls"] += 1
+                done = prediction["polls"] >= self.polls_until_done
+            if prediction.get("canceled"):
+                body = {"id": pid, "status": "canceled"}
+            elif done:
+                body = {"id": pid, "status": "succeeded",
+                        "output": self.outputs(pid, prediction["input"])}
+            else:
+                body = {"id": pid, "status": "processing"}
+            self._send(handler, 200, json.dumps(body).encode())
+        elif method == "GET" and path.startswith("/v1/files/"):
+            name = path.rsplit("/", 1)[1]
+            body = AUDIO
+            if name.startswith("preview_"):
+                body = PREVIEW
+            elif name.endswith(".json"):
+                body = b"{}"
+            self._send(handler, 200, body, content_type="audio/wav")
+        else:
+            self._send(handler, 404)
+
+    def count(self, method, prefix):
+        return sum(1 for _, m, p in self.log if m == method and p.startswith(prefix))
+
+    def close(self):
+        self.server.shutdown()
+
+
+def client_for(stub, **options):
+    defaults = dict(token="test", base_url=stub.base_url, rate=200, burst=50,
+                    poll_interval=0.01, backoff=0.01, max_backoff=0.05)
+    return ReplicateClient(**{**defaults, **options})
+
+
+def test_run_many_and_download():
+    stub = StubAPI()
+    try:
+        async def go():
+            async with client_for(stub, max_concurrency=4) as client:
+                outputs = await client.run_many("owner/model:abc", [
+                    {"description": f"prompt {i}"} for i in range(12)
+                ])
+                out_dir = Path(tempfile.mkdtemp())
+                paths = await asyncio.gather(*(
+                    client.download(o[0], out_dir / f"{i}.wav") for i, o in enumerate(outputs)
+                ))
+                return outputs, paths
+        outputs, paths = asyncio.run(go())
+        assert all(isinstance(o, list) for o in outputs)
+        assert all(p.read_bytes() == AUDIO for p in paths)
+        assert stub.count("POST", "/v1/predictions") == 12
+    finally:
+        stub.close()
+
+
+def test_generate_many_downloads_as_predictions_finish():
+    stub = StubAPI()
+    try:
+        paths = asyncio.run(generate_many(
+            ["a", "b", "c"], 4, tempfile.mkdtemp(), token="test", base_url=stub.base_url,
+            max_concurrency=1, poll_interval=0.01))
+        assert all(p.read_bytes() == AUDIO for p in paths)
+        first_download = next(t for t, m, p in stub.log if p.startswith("/v1/files/"))
+        last_create = [t for t, m, p in stub.log if m == "POST" and p == "/v1/predictions"][-1]
+        # The first output was fetched while later predictions still ran
+        assert first_download < last_create
+    finally:
+        stub.close()
+
+
+def test_retry_after_pauses_every_request():
+    stub = StubAPI()
+    stub.fail("POST /v1/predictions", 429)
+    try:
+        async def go():
+            async with client_for(stub) as client:
+                first = asyncio.create_task(client.create_prediction("abc", {"description": "a"}))
+                while not stub.log:
+                    await asyncio.sleep(0.005)
+                await asyncio.sleep(0.05)
+                # Started after the 429 arrived, so it has to wait out the pause too
+                second = asyncio.create_task(client.create_prediction("abc", {"description": "b"}))
+                await asyncio.gather(first, second)
+                return client.retries
+        retries = asyncio.run(go())
+        first_429 = next(t for t, m, _ in stub.log if m == "POST")
+        # Nothing reaches the server while the bucket is paused
+        assert all(t - first_429 >= 0.95 for t, _, _ in stub.log[1:])
+        assert retries == 1
+    finally:
+        stub.close()
+
+
+def test_transient_get_errors_are_retried():
+    stub = StubAPI(polls_until_done=1)
+    stub.fail("GET /v1/predictions", 502, 503)
+    try:
+        async def go():
+            async with client_for(stub) as client:
+                return await client.run("abc", {"description": "a"}), client.retries
+        output, retries = asyncio.run(go())
+        assert output and retries == 2
+    finally:
+        stub.close()
+
+
+def test_create_is_not_retried_on_500():
+    stub = StubAPI()
+    stub.fail("POST /v1/predictions", 500)
+    try:
+        async def go():
+            async with client_for(stub) as client:
+                await client.create_prediction("abc", {"description": "a"})
+        try:
+            asyncio.run(go())
+        except ReplicateError as e:
+            assert e.status == 500
+        else:
+            raise AssertionError("expected ReplicateError")
+        # A 500 may have created the prediction, so it must not be resent
+        assert stub.count("POST", "/v1/predictions") == 1
+    finally:
+        stub.close()
+
+
+def test_deadline_cancels_on_server():
+    stub = StubAPI(polls_until_done=1000)
+    try:
+        async def go():
+            async with client_for(stub) as client:
+                await client.run("abc", {"description": "a"}, timeout=0.3)
+        try:
+            asyncio.run(go())
+        except PredictionTimeout:
+            pass
+        else:
+            raise AssertionError("expected PredictionTimeout")
+        assert stub.predictions["p0"].get("canceled")
+    finally:
+        stub.close()
+
+
+def test_caller_cancellation_cancels_on_server():
+    stub = StubAPI(polls_until_done=1000)
+    try:
+        async def go():
+            async with client_for(stub) as client:
+                task = asyncio.create_task(client.run("abc", {"description": "a"}))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        asyncio.run(go())
+        assert stub.predictions["p0"].get("canceled")
+    finally:
+        stub.close()
+
+
+def test_polling_backs_off():
+    stub = StubAPI(polls_until_done=8)
+    try:
+        run_blocking("abc", {"description": "a"}, **{
+            "token": "test", "base_url": stub.base_url,
+            "poll_interval": 0.01, "poll_growth": 2.0, "max_poll_interval": 0.16})
+        polls = [t for t, m, p in stub.log if m == "GET" and "/predictions/" in p]
+        gaps = [b - a for a, b in zip(polls, polls[1:])]
+        assert gaps[-1] > gaps[0] * 4
+    finally:
+        stub.close()
+
+
+def test_deadline_from_worker_thread():
+    stub = StubAPI(polls_until_done=1000)
+    errors = []
+
+    def worker():
+        try:
+            run_blocking("abc", {"description": "a"}, timeout=0.2, token="test",
+                         base_url=stub.base_url, poll_interval=0.01)
+        except PredictionTimeout as e:
+            errors.append(e)
+
+    try:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join(10)
+        assert len(errors) == 1 and stub.predictions["p0"].get("canceled")
+    finally:
+        stub.close()
+
+
+def test_token_bucket_paces_requests():
+    async def go():
+        bucket = TokenBucket(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        return time.monotonic() - start
+    assert asyncio.run(go()) >= 0.45
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:05 GMT", now=1445412480) == 5.0
+    assert parse_retry_after("garbage") is None
+
+
+
+def test_final_output_skips_previews_and_profile():
+    stub = StubAPI()
+    try:
+        output = stub.outputs("p7", {"preview_every": 2, "profile": True,
+                                     "output_format": "opus"})
+        assert len(output) == 4 and output[0].endswith("/preview_001_0.ogg")
+        assert final_output(output) == f"{stub.base_url}/files/p7.ogg"
+        assert final_output(stub.outputs("p8", {})) == f"{stub.base_url}/files/p8.wav"
+        assert final_output("https://x/files/a.wav") == "https://x/files/a.wav"
+        try:
+            final_output([f"{stub.base_url}/files/p9/profile.json"])
+        except ReplicateError:
+            pass
+        else:
+            raise AssertionError("an output without audio should raise")
+    finally:
+        stub.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Replicate client tests (local stub API)")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
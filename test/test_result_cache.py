@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for result_cache.py: identical requests share one render, a
+cached result is served without rendering, and a waiting request takes
+over a render whose owner was cancelled. Renders are fake text files, so
+no model is needed. Runs under pytest or directly.
+"""
+
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the cache
+sys.path.append(str(Path(__file__).parent.parent))
+
+from result_cache import ResultCache
+
+
+def _request(cache, out_dir, name, keys, renders, delay=0.05):
+    outputs = [Path(out_dir) / f"{name}-{n}.txt" for n in range(len(keys))]
+
+    async def compute(indices):
+        renders.append((name, [keys[i] for i in indices]))
+        await asyncio.sleep(delay)
+        for i in indices:
+            outputs[i].write_text(f"audio for {keys[i]}")
+
+    return cache.get_or_compute(keys, outputs, compute)
+
+
+def test_identical_requests_share_a_render():
+    async def go(directory):
+        cache, renders = ResultCache(Path(directory) / "cache"), []
+        first, second = await asyncio.gather(
+            _request(cache, directory, "a", ["k1", "k2"], renders),
+            _request(cache, directory, "b", ["k2", None], renders),
+        )
+        assert renders == [("a", ["k1", "k2"]), ("b", [None])]
+        assert second[0].read_text() == "audio for k2"
+        assert cache.coalesced == 1
+
+        # Now it is on disk
+        third = await _request(cache, directory, "c", ["k1"], renders)
+        assert third[0].read_text() == "audio for k1" and len(renders) == 2
+        assert cache.hits == 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(go(directory))
+
+
+def test_waiter_takes_over_a_cancelled_render():
+    async def go(directory):
+        cache, renders = ResultCache(Path(directory) / "cache"), []
+        owner = asyncio.create_task(_request(cache, directory, "a", ["k"], renders))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(_request(cache, directory, name, ["k"], renders))
+                   for name in ("b", "c")]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        results = await asyncio.gather(*waiters)
+        assert [r[0].read_text() for r in results] == ["audio for k"] * 2
+        # One waiter rendered it again, the other waited for that
+        assert [name for name, _ in renders] == ["a", "b"]
+        assert owner.cancelled() and not cache._inflight
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(go(directory))
+
+
+if __name__ == "__main__":
+    print("🧪 Result cache tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
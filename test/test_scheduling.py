@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the cost model in scheduling.py and the shortest-job-first,
+priority and aging order of the micro-batcher in batching.py. Uses a
+fake batch runner, so no model is needed. Runs under pytest or directly.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the scheduler
+sys.path.append(str(Path(__file__).parent.parent))
+
+from batching import MicroBatcher
+from scheduling import CostModel
+
+
+def test_cost_model_learns_per_bucket():
+    costs = CostModel(alpha=0.5)
+    assert costs.estimate(100, 50) is None
+
+    costs.observe(100, steps=10, sampling_seconds=1.0, other_seconds=0.5)
+    assert abs(costs.estimate(100, 50) - (0.5 + 50 * 0.1)) < 1e-9
+    # Unmeasured lengths scale from the nearest measured one
+    assert abs(costs.estimate(200, 50) - 2 * (0.5 + 50 * 0.1)) < 1e-9
+
+    costs.observe(100, steps=10, sampling_seconds=2.0, other_seconds=0.5)
+    assert abs(costs.step_seconds[100] - 0.15) < 1e-9
+    costs.observe(400, steps=10, sampling_seconds=8.0, other_seconds=1.0)
+    assert abs(costs.estimate(400, 10) - 9.0) < 1e-9
+    assert costs.snapshot()["runs"] == 3
+
+
+def _run(submissions, aging=0.0, probe=(0.0, 0.0)):
+    """Submit (name, priority, cost) behind a blocking job.
+
+    Returns the run order and the backlog `probe` saw once all were queued.
+    """
+    order = []
+
+    def run_batch(key, prompts, durations, seeds, callback, trace):
+        order.extend(prompts)
+        time.sleep(0.05 if prompts == ["blocker"] else 0.001)
+        return prompts
+
+    async def go():
+        batcher = MicroBatcher(run_batch, 1, max_wait_ms=0, max_batch_size=1, aging=aging)
+        blocker = asyncio.create_task(batcher.submit("k", ["blocker"], [1], [0]))
+        await asyncio.sleep(0.01)
+        tasks = [asyncio.create_task(batcher.submit("k", [name], [1], [0],
+                                                    priority=priority, cost=cost))
+                 for name, priority, cost in submissions]
+        await asyncio.sleep(0)
+        backlog = batcher.backlog(*probe)
+        await asyncio.gather(blocker, *tasks)
+        return backlog
+
+    backlog = asyncio.run(go())
+    return order[1:], backlog
+
+
+def test_shortest_job_first_within_a_class():
+    order, _ = _run([("long", 0, 60.0), ("short", 0, 5.0), ("medium", 0, 20.0)])
+    assert order == ["short", "medium", "long"]
+
+
+def test_priority_class_beats_cost_and_ties_are_fifo():
+    order, _ = _run([("batch", 300, 1.0), ("standard", 30, 10.0),
+                     ("interactive", 0, 20.0), ("first", 0, 0.0), ("second", 0, 0.0)])
+    assert order == ["first", "second", "interactive", "standard", "batch"]
+    # The penalty is in seconds, so a long enough interactive job yields
+    order, _ = _run([("interactive", 0, 60.0), ("standard", 30, 10.0)])
+    assert order == ["standard", "interactive"]
+
+
+def test_aging_lets_old_work_through():
+    # Costs differ by 0.01 s and the long job is ~0.02 s older at 10 s/s aging
+    async def staggered():
+        order = []
+
+        def run_batch(key, prompts, durations, seeds, callback, trace):
+            order.extend(prompts)
+            time.sleep(0.05 if prompts == ["blocker"] else 0.001)
+            return prompts
+
+        batcher = MicroBatcher(run_batch, 1, max_wait_ms=0, max_batch_size=1, aging=10.0)
+        blocker = asyncio.create_task(batcher.submit("k", ["blocker"], [1], [0]))
+        await asyncio.sleep(0.005)
+        old = asyncio.create_task(batcher.submit("k", ["old"], [1], [0], cost=0.11))
+        await asyncio.sleep(0.02)
+        new = asyncio.create_task(batcher.submit("k", ["new"], [1], [0], cost=0.10))
+        await asyncio.gather(blocker, old, new)
+        return order[1:]
+
+    assert asyncio.run(staggered()) == ["old", "new"]
+    order, _ = _run([("old", 0, 0.11), ("new", 0, 0.10)])
+    assert order == ["new", "old"]
+
+
+def test_backlog_counts_work_ranked_ahead():
+    _, backlog = _run([("a", 0, 2.0), ("b", 0, 3.0), ("later", 300, 50.0)],
+                      probe=(0.0, 10.0))
+    # A 10 s interactive request waits for a and b but not the batch job
+    assert abs(backlog - 5.0) < 1e-3
+    _, backlog = _run([("a", 0, 2.0), ("b", 0, 3.0)])
+    # ...and a cost-free one would jump the whole queue
+    assert backlog == 0.0
+
+
+if __name__ == "__main__":
+    print("🧪 Scheduling tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for variations.py: a variation runs only the tail of its tier's
+schedule, and the latent cache stays within its bounds. Runs under
+pytest or directly.
+"""
+
+import sys
+from pathlib import Path
+
+import torch
+
+# Add the parent directory to the path so we can import the variations
+sys.path.append(str(Path(__file__).parent.parent))
+
+from tiers import TIERS
+from variations import LatentCache, variation_tier
+
+
+def test_strength_picks_the_tail_of_the_schedule():
+    high = TIERS["high"]
+    half = variation_tier(high, 0.5)
+    assert half.steps == 50 and half.sampler_type == high.sampler_type
+    # Halfway between sigma_min and sigma_max on a log scale
+    assert abs(half.sigma_max - (high.sigma_min * high.sigma_max) ** 0.5) < 1e-9
+
+    full = variation_tier(high, 1.0)
+    assert full.steps == high.steps and abs(full.sigma_max - high.sigma_max) < 1e-9
+    assert variation_tier(TIERS["draft"], 0.01).steps == 1
+    for bad in (0, -0.5, 1.5):
+        try:
+            variation_tier(high, bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {bad}")
+
+
+def test_latent_cache_is_bounded_lru():
+    cache = LatentCache(max_entries=2, max_bytes=2**20)
+    for name in ("a", "b"):
+        cache.put(name, torch.zeros(4, 8), f"prompt {name}", 3)
+    assert cache.get("a").prompt == "prompt a"
+    cache.put("c", torch.zeros(4, 8), "prompt c", 3)
+    # "b" was the least recently used
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert len(cache) == 2 and cache.hits == 2 and cache.misses == 1
+
+    small = LatentCache(max_entries=10, max_bytes=3 * 4 * 8 * 4)
+    for n in range(5):
+        small.put(str(n), torch.zeros(4, 8), "p", 1)
+    assert len(small) == 3 and small.get("0") is None
+    small.put("huge", torch.zeros(64, 64), "p", 1)
+    assert small.get("huge") is None and len(small) == 3
+
+    assert not LatentCache(max_entries=0).enabled
+
+
+def test_outputs_of_one_render_share_its_latents():
+    cache = LatentCache(max_entries=3, max_bytes=2**20)
+    cache.put("render", torch.ones(4, 8), "pad", 3, key="k")
+    assert cache.alias("hit", "k")
+    assert not cache.alias("other", "unknown")
+
+    # The key outlives the render's own entry while an alias holds it
+    for name in ("a", "b"):
+        cache.put(name, torch.zeros(4, 8), "p", 1)
+    assert cache.get("render") is None and cache.get("hit").prompt == "pad"
+    assert cache.alias("again", "k") and cache.get("again") is cache.get("hit")
+    for name in ("c", "d", "e"):
+        cache.put(name, torch.zeros(4, 8), "p", 1)
+    assert not cache.alias("late", "k")
+
+
+if __name__ == "__main__":
+    print("🧪 Variation tests")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            try:
+                test()
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+A tiny, randomly initialised stand-in for Stable Audio Open.
+
+Same config shape as the real model: an Oobleck VAE with the same strides
+(so one latent frame is still 2048 samples at 44.1 kHz), the same
+conditioning ids and a continuous-transformer DiT, just with every width
+and depth cut down so it runs in milliseconds on a CPU.
+
+The T5 prompt conditioner is replaced by a hashed word embedding, so
+nothing is downloaded. Weights are seeded and deterministic, which makes
+the model usable for timing and plumbing tests but not for listening.
+"""
+
+import zlib
+
+import torch
+from torch import nn
+
+TEXT_VOCAB = 1024
+TEXT_MAX_LENGTH = 16
+
+
+def tiny_config(sample_rate=44100, sample_size=2097152):
+    """A model_config.json-shaped dict for the stand-in model."""
+    latent_dim = 8
+    cond_dim = 32
+    return {
+        "model_type": "diffusion_cond",
+        "sample_size": sample_size,
+        "sample_rate": sample_rate,
+        "audio_channels": 2,
+        "model": {
+            "pretransform": {
+                "type": "autoencoder",
+                "iterate_batch": True,
+                "config": {
+                    "encoder": {
+                        "type": "oobleck",
+                        "config": {
+                            "in_channels": 2,
+                            "channels": 4,
+                            "c_mults": [1, 2, 2, 2, 2],
+                            "strides": [2, 4, 4, 8, 8],
+                            "latent_dim": latent_dim * 2,
+                            "use_snake": True,
+                        },
+                    },
+                    "decoder": {
+                        "type": "oobleck",
+                        "config": {
+                            "out_channels": 2,
+                            "channels": 4,
+                            "c_mults": [1, 2, 2, 2, 2],
+                            "strides": [2, 4, 4, 8, 8],
+                            "latent_dim": latent_dim,
+                            "use_snake": True,
+                            "final_tanh": False,
+                        },
+                    },
+                    "bottleneck": {"type": "vae"},
+                    "latent_dim": latent_dim,
+                    "downsampling_ratio": 2048,
+                    "io_channels": 2,
+                },
+            },
+            # "prompt" is attached after construction, see TinyTextConditioner
+            "conditioning": {
+                "configs": [
+                    {"id": "seconds_start", "type": "number",
+                     "config": {"min_val": 0, "max_val": 512}},
+                    {"id": "seconds_total", "type": "number",
+                     "config": {"min_val": 0, "max_val": 512}},
+                ],
+                "cond_dim": cond_dim,
+            },
+            "diffusion": {
+                "cross_attention_cond_ids": ["prompt", "seconds_start", "seconds_total"],
+                "global_cond_ids": ["seconds_start", "seconds_total"],
+                "type": "dit",
+                "config": {
+                    "io_channels": latent_dim,
+                    "embed_dim": 64,
+                    "depth": 2,
+                    "num_heads": 2,
+                    "cond_token_dim": cond_dim,
+                    "global_cond_dim": cond_dim * 2,
+                    "project_cond_tokens": False,
+                    "transformer_type": "continuous_transformer",
+                },
+            },
+            "io_channels": latent_dim,
+        },
+    }
+
+
+class TinyTextConditioner(nn.Module):
+    """Prompt conditioner that embeds hashed words instead of running T5.
+
+    Returns `[embeddings, mask]` like T5Conditioner, so the rest of the
+    pipeline (and ConditioningCache) cannot tell the difference. The
+    encoder sits under `.model` as in T5Conditioner, with a Linear layer
+    so precision.py can convert and quantize it.
+    """
+
+    def __init__(self, output_dim, vocab=TEXT_VOCAB, max_length=TEXT_MAX_LENGTH):
+        super().__init__()
+        self.max_length = max_length
+        self.vocab = vocab
+        self.model = nn.Sequential(nn.Embedding(vocab, output_dim),
+                                   nn.Linear(output_dim, output_dim))
+
+    def forward(self, texts, device):
+        ids = torch.zeros(len(texts), self.max_length, dtype=torch.long)
+        mask = torch.zeros(len(texts), self.max_length, dtype=torch.bool)
+        for row, text in enumerate(texts):
+            words = text.lower().split()[:self.max_length]
+            for col, word in enumerate(words):
+                ids[row, col] = zlib.crc32(word.encode()) % self.vocab
+                mask[row, col] = True
+        ids, mask = ids.to(device), mask.to(device)
+        embeddings = self.model(ids) * mask.unsqueeze(-1)
+        return [embeddings, mask]
+
+
+def build_tiny_model(seed=0, sample_rate=44100, sample_size=2097152):
+    """Return `(model, model_config)` with deterministic random weights."""
+    from stable_audio_tools.models.factory import create_model_from_config
+
+    config = tiny_config(sample_rate, sample_size)
+    torch.manual_seed(seed)
+    model = create_model_from_config(config)
+    cond_dim = config["model"]["conditioning"]["cond_dim"]
+    model.conditioner.conditioners["prompt"] = TinyTextConditioner(cond_dim)
+    return model.eval(), config
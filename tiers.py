@@ -0,0 +1,62 @@
+# --- tiers.py ----------------------------------------------------------------
+"""Named latency tiers: sampler, step count and sigma schedule presets.
+
+`high` reproduces the original fixed settings (100 steps of
+dpmpp-3m-sde). The cheaper tiers trade fidelity for latency; measure
+the tradeoff with test/test_latency_tiers.py.
+
+Set LATENCY_TIERS to a JSON file to override or add tiers, e.g.
+    {"draft": {"steps": 16}, "preview": {"steps": 30, "sampler_type": "dpmpp-2m-sde"}}
+"""
+
+import json
+import os
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    steps: int
+    sampler_type: str = "dpmpp-3m-sde"
+    sigma_min: float = 0.3
+    sigma_max: float = 500
+    rho: float = 1.0
+    cfg_scale: float = 7
+
+    def sampler_kwargs(self):
+        """Keyword arguments for `sample_k`."""
+        return {
+            "sampler_type": self.sampler_type,
+            "sigma_min": self.sigma_min,
+            "sigma_max": self.sigma_max,
+            "rho": self.rho,
+        }
+
+
+DEFAULT_TIER = "high"
+
+TIERS = {
+    "draft": Tier("draft", steps=20, sampler_type="dpmpp-2m-sde"),
+    "standard": Tier("standard", steps=50),
+    "high": Tier("high", steps=100),
+}
+
+
+def load_tiers(path=None):
+    """Built-in tiers merged with the overrides in `path` (or $LATENCY_TIERS)."""
+    tiers = dict(TIERS)
+    path = path or os.getenv("LATENCY_TIERS")
+    if not path:
+        return tiers
+
+    with open(path) as f:
+        overrides = json.load(f)
+    for name, fields in overrides.items():
+        base = tiers.get(name)
+        if base is None:
+            if "steps" not in fields:
+                raise ValueError(f"New tier '{name}' needs at least 'steps'.")
+            base = Tier(name, steps=fields["steps"])
+        tiers[name] = replace(base, name=name, **fields)
+    return tiers
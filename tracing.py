@@ -0,0 +1,172 @@
+# --- tracing.py --------------------------------------------------------------
+"""Per-request stage spans and on-demand torch profiler capture.
+
+Every prediction carries a RequestTrace. Each stage it passes through
+(queue wait, conditioning, sampling, VAE decode, the transfer back to
+the CPU, encoding, file write) is recorded as a span with its wall-clock
+time and peak memory. Stages that run once for a whole batch are
+recorded into the trace of every request in that batch.
+
+At the end of `predict` the trace is printed as a single JSON log line
+and, when running under cog, its stage totals are reported as
+prediction metrics.
+
+On GPU, each span records peak memory (`peak_bytes`): the CUDA
+allocator's high-water mark during the span. The span ends with a
+device synchronize so queued kernels are charged to the right stage.
+CPU-side spans and CPU hosts report no memory, since the process's peak
+RSS covers its whole lifetime rather than the stage.
+"""
+
+import json
+import threading
+import time
+import uuid
+import warnings
+from contextlib import contextmanager
+
+import torch
+
+
+def _reset_peak(cpu_only):
+    if torch.cuda.is_available() and not cpu_only:
+        torch.cuda.reset_peak_memory_stats()
+
+
+def _peak_memory(cpu_only):
+    """`peak_bytes` of the device, or nothing for CPU work."""
+    if torch.cuda.is_available() and not cpu_only:
+        # Queued kernels belong to the span that launched them
+        torch.cuda.synchronize()
+        return {"peak_bytes": torch.cuda.max_memory_allocated()}
+    return {}
+
+
+class RequestTrace:
+    """Spans recorded for one prediction. Safe to use from worker threads."""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, start, seconds, **attributes):
+        """Record a span measured elsewhere; `start` is a perf_counter value."""
+        span = {"name": name, "offset": start - self.start, "seconds": seconds}
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, cpu_only=False, **attributes):
+        """Time the block as stage `name`.
+
+        `cpu_only` spans leave the device alone: they run next to the
+        sampler on other threads and must neither wait for it nor reset
+        its peak memory counter. The block gets the span's attributes as a
+        dict it may update, e.g. with counts only known at the end.
+        """
+        _reset_peak(cpu_only)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            memory = _peak_memory(cpu_only)
+            self.add(name, start, time.perf_counter() - start, **memory, **attributes)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def stages(self):
+        """Total seconds per stage name."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = totals.get(span["name"], 0) + span["seconds"]
+        return totals
+
+    def to_json(self):
+        with self._lock:
+            spans = list(self.spans)
+        return json.dumps({
+            "event": "prediction_trace",
+            "request_id": self.request_id,
+            "total_seconds": self.elapsed(),
+            "stages": self.stages(),
+            "spans": spans,
+            **self.attributes,
+        })
+
+    def emit(self):
+        """Print the trace as one JSON line and report it as cog metrics."""
+        print(self.to_json(), flush=True)
+        record_metrics({f"{name}_time": s for name, s in self.stages().items()})
+
+
+class TraceGroup:
+    """Fans spans out to the traces of every request in a batch."""
+
+    def __init__(self, traces, **attributes):
+        self.traces = traces
+        self.attributes = attributes
+
+    def including(self, trace):
+        """This group plus one more trace, e.g. a private probe."""
+        return TraceGroup([*self.traces, trace], **self.attributes)
+
+    def add(self, name, start, seconds, **attributes):
+        for trace in self.traces:
+            trace.add(name, start, seconds, **{**self.attributes, **attributes})
+
+    @contextmanager
+    def span(self, name, cpu_only=False, **attributes):
+        _reset_peak(cpu_only)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            memory = _peak_memory(cpu_only)
+            self.add(name, start, time.perf_counter() - start, **memory, **attributes)
+
+
+class _NullTrace:
+    def including(self, trace):
+        return TraceGroup([trace])
+
+    def add(self, name, start, seconds, **attributes):
+        pass
+
+    @contextmanager
+    def span(self, name, cpu_only=False, **attributes):
+        yield attributes
+
+
+NULL_TRACE = _NullTrace()
+
+
+def record_metrics(metrics):
+    """Report metrics on the current cog prediction, if there is one."""
+    try:
+        from cog.server.scope import current_scope
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            scope = current_scope()
+    except (ImportError, RuntimeError):
+        return False
+    for name, value in metrics.items():
+        scope.record_metric(name, value)
+    return True
+
+
+@contextmanager
+def profile(path):
+    """Capture a torch profiler trace of the block to `path` (Chrome trace JSON)."""
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    with torch.profiler.profile(activities=activities, record_shapes=True,
+                                profile_memory=True) as prof:
+        yield prof
+    prof.export_chrome_trace(str(path))
@@ -0,0 +1,136 @@
+# --- variations.py -----------------------------------------------------------
+"""Variations: re-noise a recent result part-way and denoise from there.
+
+A fresh render starts from pure noise at the tier's sigma_max and runs
+every step of the schedule. A variation starts from the final latents of
+an earlier generation instead. They are noised to an intermediate sigma,
+and only the rest of the schedule runs from there. `strength` picks that
+sigma on a log scale between the tier's sigma_min (0) and sigma_max (1):
+
+    sigma = sigma_min * (sigma_max / sigma_min) ** strength
+
+The default polyexponential schedule (rho=1) is log-linear in sigma. So a
+variation runs about `strength` of the tier's steps and costs about that
+fraction of a fresh render. Low strengths keep the source's structure,
+and high ones keep little beyond its key and tempo.
+
+The LatentCache keeps the final latents of recent generations in memory.
+They are keyed by the generation id that `predict` returns as each
+output's file name. Every output gets a fresh id. An output served from
+the result cache is aliased to the latents of the render that produced
+it, found by its result-cache key. The cache is per process, so a
+variation has to reach the replica that rendered its source.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+
+
+@dataclass(eq=False)
+class Source:
+    """What a variation starts from. Compared by identity, so it can sit in a batch key."""
+    latents: object = field(repr=False)
+    prompt: str
+    duration: int
+    key: str = field(default=None, repr=False)
+
+
+def variation_tier(tier, strength):
+    """`tier` cut down to the tail of its schedule that starts at `strength`."""
+    if not 0 < strength <= 1:
+        raise ValueError(f"Variation strength must be in (0, 1], got {strength}.")
+    return replace(
+        tier,
+        steps=max(1, math.ceil(tier.steps * strength)),
+        sigma_max=tier.sigma_min * (tier.sigma_max / tier.sigma_min) ** strength,
+    )
+
+
+def _size(source):
+    return source.latents.numel() * source.latents.element_size()
+
+
+class LatentCache:
+    """LRU map of generation id -> Source, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries=64, max_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_key = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured by VARIATION_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("VARIATION_CACHE_ENTRIES", 64)),
+            max_bytes=int(float(os.getenv("VARIATION_CACHE_MB", 256)) * 2**20),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, generation_id, latents, prompt, duration, key=None):
+        """Keep `latents` (channels, length) on the CPU under `generation_id`.
+
+        With a result-cache `key`, later outputs of the same key can be
+        aliased to these latents (see `alias`).
+        """
+        if not self.enabled:
+            return
+        latents = latents.detach().cpu()
+        if latents.numel() * latents.element_size() > self.max_bytes:
+            return
+        with self._lock:
+            source = Source(latents, prompt, duration, key)
+            self._insert(generation_id, source)
+            if key is not None:
+                self._by_key[key] = source
+
+    def alias(self, generation_id, key):
+        """Store the latents last put under `key` as `generation_id` too.
+
+        Returns False when they have been evicted. An alias counts toward
+        the byte budget like a copy.
+        """
+        with self._lock:
+            source = self._by_key.get(key)
+            if source is None:
+                return False
+            self._insert(generation_id, source)
+            return True
+
+    def _insert(self, generation_id, source):
+        old = self._entries.pop(generation_id, None)
+        if old is not None:
+            self._bytes -= _size(old)
+        self._entries[generation_id] = source
+        self._bytes += _size(source)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            if (self._by_key.get(evicted.key) is evicted
+                    and all(s is not evicted for s in self._entries.values())):
+                del self._by_key[evicted.key]
+
+    def get(self, generation_id):
+        """The Source stored under `generation_id`, or None once evicted."""
+        with self._lock:
+            source = self._entries.get(generation_id)
+            if source is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(generation_id)
+            self.hits += 1
+            return source